@@ -26,6 +26,7 @@ from app.sync.product_sync import (
     sync_preview,
 )
 from app.config import settings
+from app.http_client import get_ssl_context
 from app.woo.woocommerce import purge_wc_bin_products  # optional purge support
 
 logger = logging.getLogger("uvicorn.error")
@@ -102,7 +103,7 @@ async def admin_integration_health():
         return {"ok": resp.status_code in allow_status, "status": resp.status_code}
 
     timeout = httpx.Timeout(10.0, connect=10.0, read=10.0)
-    async with httpx.AsyncClient(timeout=timeout, verify=False) as client:
+    async with httpx.AsyncClient(timeout=timeout, verify=get_ssl_context()) as client:
         # ERPNext ping endpoint
         erp_resp = None
         try:
@@ -227,7 +228,7 @@ async def admin_deletes_run(req: Request):
         params = {"force": "true" if force else "false"}
         try:
             logger.info(f"[DELETE] Requesting DELETE {url} params={params}")
-            async with httpx.AsyncClient(timeout=30.0, verify=False, auth=auth) as client:
+            async with httpx.AsyncClient(timeout=30.0, verify=get_ssl_context(), auth=auth) as client:
                 r = await client.delete(url, params=params)
                 logger.info(f"[DELETE] Response status={r.status_code} body={r.text[:500]}")
                 data: Dict[str, Any] = {}
@@ -12,6 +12,7 @@ from fastapi import APIRouter, Body, Path, Query
 
 from app.workers.jobs_worker import enqueue_job
 from app.config import settings
+from app.http_client import get_ssl_context
 
 logger = logging.getLogger("uvicorn.error")
 
@@ -61,7 +62,7 @@ def _wc_params(extra: Dict[str, Any] | None = None) -> Dict[str, Any]:
 
 async def _wc_get_list(path: str, params: Dict[str, Any]) -> List[Dict[str, Any]]:
     url = f"{_wc_base()}/wp-json/wc/v3{path}"
-    async with httpx.AsyncClient(timeout=45.0, verify=False) as client:
+    async with httpx.AsyncClient(timeout=45.0, verify=get_ssl_context()) as client:
         r = await client.get(url, params=_wc_params(params))
         r.raise_for_status()
         data = r.json()
@@ -71,7 +72,7 @@ async def _wc_get_list(path: str, params: Dict[str, Any]) -> List[Dict[str, Any]
 
 async def _wc_get_one(path: str, params: Dict[str, Any] | None = None) -> Optional[Dict[str, Any]]:
     url = f"{_wc_base()}/wp-json/wc/v3{path}"
-    async with httpx.AsyncClient(timeout=45.0, verify=False) as client:
+    async with httpx.AsyncClient(timeout=45.0, verify=get_ssl_context()) as client:
         r = await client.get(url, params=_wc_params(params or {}))
         if r.status_code == 404:
             return None
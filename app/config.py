@@ -39,6 +39,9 @@ class Settings:
     ERP_PASS: str = os.getenv("ERP_PASS", "")
     ERP_SELLING_PRICE_LIST: str = os.getenv("ERP_SELLING_PRICE_LIST", "Standard Selling")
 
+    # Secret of the ERPNext Webhook (Item / Item Price → /webhooks/erpnext/item)
+    ERP_WEBHOOK_SECRET: str = os.getenv("ERP_WEBHOOK_SECRET", "")
+
     # Common company/warehouse hints (optional)
     ERP_COMPANY: str = os.getenv("ERP_COMPANY", "")  # leave empty to let ERPNext choose default
     ERP_DEFAULT_WAREHOUSE: str = os.getenv("ERP_DEFAULT_WAREHOUSE", "")
@@ -90,6 +93,10 @@ class Settings:
     # Comma-separated list in .env, e.g. "https://example.com, https://foo.bar"
     CORS_ORIGINS: list[str] = [o.strip() for o in os.getenv("CORS_ORIGINS", "*").split(",") if o.strip()]
 
+    # ── Outbound HTTP ────────────────────────────────────────────────────────
+    # TLS certificate verification for the shared ERP/Woo client; set 0 only for self-signed dev hosts
+    HTTP_VERIFY_TLS: bool = _get_bool("HTTP_VERIFY_TLS", True)
+
     # ── Paths ────────────────────────────────────────────────────────────────
     SHIPPING_PARAMS_PATH: str = os.getenv("SHIPPING_PARAMS_PATH", "app/mapping/shipping_params.json")
     MAPPING_STORE_PATH: str = os.getenv("MAPPING_STORE_PATH", "app/mapping/mapping_store.json")
@@ -7,6 +7,7 @@ from typing import Any, Dict, List, Optional
 import httpx
 
 from app.config import settings
+from app.http_client import get_ssl_context
 
 logger = logging.getLogger("uvicorn.error")
 
@@ -122,7 +123,7 @@ def _addr_fields_from(src: Dict[str, Any]) -> Dict[str, Any]:
                     "Accept": "application/json",
                 }
                 try:
-                    with httpx.Client(timeout=15.0, headers=headers, verify=False) as client:
+                    with httpx.Client(timeout=15.0, headers=headers, verify=get_ssl_context()) as client:
                         iso_map = {}
                         limit = 200
                         start = 0
@@ -226,7 +227,7 @@ async def upsert_customer_from_woo(cust: Dict[str, Any]) -> tuple[str, Optional[
     billing = cust.get("billing") or {}
     shipping = cust.get("shipping") or {}
 
-    async with httpx.AsyncClient(timeout=45.0, headers=_auth_headers(), verify=False) as client:
+    async with httpx.AsyncClient(timeout=45.0, headers=_auth_headers(), verify=get_ssl_context()) as client:
         cust_name = await _find_customer(client, email=email, customer_name=display_name)
         if cust_name:
             cust_name = await _update_customer(client, cust_name, email=email, phone=phone)
@@ -13,6 +13,7 @@ from typing import Any, Dict, List, Optional, Tuple
 import httpx
 
 from app.config import settings
+from app.http_client import get_ssl_context
 
 logger = logging.getLogger("uvicorn.error")
 
@@ -148,7 +149,7 @@ def _lower(s: str | None) -> str:
 
 async def get_sales_order_status(so_name: str) -> int:
     """Return 0 if Draft, 1 if Submitted, 2 if Cancelled."""
-    async with httpx.AsyncClient(timeout=30.0, headers=_auth_headers(), verify=False) as client:
+    async with httpx.AsyncClient(timeout=30.0, headers=_auth_headers(), verify=get_ssl_context()) as client:
         resp = await client.get(f"{_erp_base()}/api/resource/Sales Order/{so_name}")
         if resp.status_code >= 400:
             logger.error(f"[ERPNext] get_sales_order_status failed for {so_name}: {resp.text}")
@@ -158,7 +159,7 @@ async def get_sales_order_status(so_name: str) -> int:
 
 async def submit_sales_order(so_name: str) -> None:
     """Submit a Sales Order if in draft."""
-    async with httpx.AsyncClient(timeout=30.0, headers=_auth_headers(), verify=False) as client:
+    async with httpx.AsyncClient(timeout=30.0, headers=_auth_headers(), verify=get_ssl_context()) as client:
         resp = await client.post(f"{_erp_base()}/api/resource/Sales Order/{so_name}/submit")
         if resp.status_code >= 400:
             logger.error(f"[ERPNext] submit_sales_order failed for {so_name}: {resp.text}")
@@ -288,7 +289,7 @@ async def upsert_sales_order_from_woo(norm: Any) -> Tuple[str, str | None, str |
     billing = _as_dict(n.get("billing") or n.get("billing_address"))
     shipping = _as_dict(n.get("shipping") or n.get("shipping_address"))
 
-    async with httpx.AsyncClient(timeout=30.0, headers=_auth_headers(), verify=False) as client:
+    async with httpx.AsyncClient(timeout=30.0, headers=_auth_headers(), verify=get_ssl_context()) as client:
         # 1) Customer (find by email if available, else by exact name)
         customer_docname = await _ensure_customer(client, customer_name, email, phone)
 
@@ -344,7 +345,7 @@ async def upsert_sales_order_from_woo(norm: Any) -> Tuple[str, str | None, str |
     billing = _as_dict(n.get("billing") or n.get("billing_address"))
     shipping = _as_dict(n.get("shipping") or n.get("shipping_address"))
 
-    async with httpx.AsyncClient(timeout=30.0, headers=_auth_headers(), verify=False) as client:
+    async with httpx.AsyncClient(timeout=30.0, headers=_auth_headers(), verify=get_ssl_context()) as client:
         # 1) Customer (find by email if available, else by exact name)
         customer_docname = await _ensure_customer(client, customer_name, email, phone)
 
@@ -388,7 +389,7 @@ async def create_sales_invoice_from_so(norm: Any, so_name: str) -> str:
 
     discount_total = float(n.get("discount_total") or 0.0)
 
-    async with httpx.AsyncClient(timeout=60.0, headers=_auth_headers(), verify=False) as client:
+    async with httpx.AsyncClient(timeout=60.0, headers=_auth_headers(), verify=get_ssl_context()) as client:
         # Reuse if an SI already exists for this PO No
         existing = await _find_one(client, "Sales Invoice", [["po_no", "=", po_no]])
         if existing:
@@ -441,7 +442,7 @@ async def create_payment_entry(norm: Any, si_name: str) -> str:
     ref_date = _iso_date(getattr(norm, "paid_at", None) or getattr(norm, "created_at", None))
 
     gen_url = f"{base}/api/method/erpnext.accounts.doctype.payment_entry.payment_entry.get_payment_entry"
-    async with httpx.AsyncClient(timeout=30.0, verify=False, headers=_auth_headers()) as client:
+    async with httpx.AsyncClient(timeout=30.0, verify=get_ssl_context(), headers=_auth_headers()) as client:
         gen = await client.post(gen_url, json={"dt": "Sales Invoice", "dn": si_name})
         gen.raise_for_status()
         payload = gen.json() or {}
@@ -504,7 +505,7 @@ async def create_delivery_note_from_si(norm_or_si: Any, maybe_si_name: Optional[
         order_id = norm.get("order_id") if isinstance(norm, dict) else None
         po_no = f"WOO-{order_id}" if order_id is not None else None
 
-    async with httpx.AsyncClient(timeout=60.0, headers=_auth_headers(), verify=False) as client:
+    async with httpx.AsyncClient(timeout=60.0, headers=_auth_headers(), verify=get_ssl_context()) as client:
         # If we don't have a po_no from norm, try to fetch it off the SI
         if not po_no:
             try:
@@ -535,19 +536,19 @@ async def create_delivery_note_from_si(norm_or_si: Any, maybe_si_name: Optional[
 # ======== Phase 5: Refunds & Cancellations – helpers and APIs ================
 
 async def get_sales_invoice(si_name: str) -> Dict[str, Any]:
-    async with httpx.AsyncClient(timeout=30.0, headers=_auth_headers(), verify=False) as client:
+    async with httpx.AsyncClient(timeout=30.0, headers=_auth_headers(), verify=get_ssl_context()) as client:
         data = await _get(client, f"/api/resource/Sales Invoice/{si_name}", params={"fields": '["*"]'})
         return (data or {}).get("data") or data or {}
 
 
 async def find_sales_invoice_by_po_no(po_no: str) -> Optional[str]:
-    async with httpx.AsyncClient(timeout=30.0, headers=_auth_headers(), verify=False) as client:
+    async with httpx.AsyncClient(timeout=30.0, headers=_auth_headers(), verify=get_ssl_context()) as client:
         existing = await _find_one(client, "Sales Invoice", [["po_no", "=", po_no]])
         return existing["name"] if existing else None
 
 
 async def find_sales_order_by_po_no(po_no: str) -> Optional[str]:
-    async with httpx.AsyncClient(timeout=30.0, headers=_auth_headers(), verify=False) as client:
+    async with httpx.AsyncClient(timeout=30.0, headers=_auth_headers(), verify=get_ssl_context()) as client:
         existing = await _find_one(client, "Sales Order", [["po_no", "=", po_no]])
         return existing["name"] if existing else None
 
@@ -629,7 +630,7 @@ async def create_sales_invoice_return(
     if po_no:
         doc["po_no"] = po_no
 
-    async with httpx.AsyncClient(timeout=60.0, headers=_auth_headers(), verify=False) as client:
+    async with httpx.AsyncClient(timeout=60.0, headers=_auth_headers(), verify=get_ssl_context()) as client:
         created = await _insert_doc(client, doc)
         submitted = await _submit_doc(client, "Sales Invoice", created["name"])
         return submitted["name"]
@@ -647,7 +648,7 @@ async def create_refund_payment_entry(
     """
     base = _erp_base()
     gen_url = f"{base}/api/method/erpnext.accounts.doctype.payment_entry.payment_entry.get_payment_entry"
-    async with httpx.AsyncClient(timeout=30.0, verify=False, headers=_auth_headers()) as client:
+    async with httpx.AsyncClient(timeout=30.0, verify=get_ssl_context(), headers=_auth_headers()) as client:
         gen = await client.post(gen_url, json={"dt": "Sales Invoice", "dn": si_return_name})
         gen.raise_for_status()
         payload = gen.json() or {}
@@ -689,7 +690,7 @@ async def create_refund_payment_entry(
 
 async def cancel_sales_invoice(name: str) -> str:
     """Cancel SI if submitted; idempotent if already cancelled."""
-    async with httpx.AsyncClient(timeout=30.0, headers=_auth_headers(), verify=False) as client:
+    async with httpx.AsyncClient(timeout=30.0, headers=_auth_headers(), verify=get_ssl_context()) as client:
         try:
             # Preferred method
             out = await _post(client, "/api/method/frappe.client.cancel", {"doctype": "Sales Invoice", "name": name})
@@ -702,7 +703,7 @@ async def cancel_sales_invoice(name: str) -> str:
 
 async def cancel_sales_order(name: str) -> str:
     """Cancel SO if submitted; idempotent if already cancelled."""
-    async with httpx.AsyncClient(timeout=30.0, headers=_auth_headers(), verify=False) as client:
+    async with httpx.AsyncClient(timeout=30.0, headers=_auth_headers(), verify=get_ssl_context()) as client:
         try:
             out = await _post(client, "/api/method/frappe.client.cancel", {"doctype": "Sales Order", "name": name})
             _ = out
@@ -9,12 +9,14 @@ from __future__ import annotations
 import asyncio
 import json
 import logging
+import orjson
 from typing import Any, Dict, List, Optional
 from urllib.parse import quote
 
 import httpx
 
 from app.config import settings
+from app.http_client import get_erp_client
 from app.mapping.field_mapping import get_erp_sync_fields
 
 # --- Settings / globals ----------------------------------------------------
@@ -35,9 +37,6 @@ logger = logging.getLogger("uvicorn.error")
 
 # --- Helpers ---------------------------------------------------------------
 
-def _headers() -> Dict[str, str]:
-    return {"Authorization": f"token {ERP_API_KEY}:{ERP_API_SECRET}"}
-
 def _abs_url(u: str | None) -> str | None:
     if not u:
         return None
@@ -74,13 +73,11 @@ def _build_item_filters() -> List[list]:
 
 async def _http_get(path: str, params: Optional[Dict[str, Any]] = None, timeout: float = 30.0) -> httpx.Response:
     url = path if path.startswith("http") else f"{ERP_URL}{path}"
-    async with httpx.AsyncClient(timeout=timeout, verify=False) as client:
-        return await client.get(url, headers=_headers(), params=params or {})
+    return await get_erp_client().get(url, params=params or {}, timeout=timeout)
 
 async def _http_post(path: str, payload: Dict[str, Any], timeout: float = 30.0) -> httpx.Response:
     url = path if path.startswith("http") else f"{ERP_URL}{path}"
-    async with httpx.AsyncClient(timeout=timeout, verify=False) as client:
-        return await client.post(url, headers=_headers(), json=payload)
+    return await get_erp_client().post(url, json=payload, timeout=timeout)
 
 # Small concurrency limiter for per-item fetches
 class _Limiter:
@@ -103,96 +100,97 @@ async def get_price_map(price_list: str | None = None, return_name: bool = False
 
     Returns (map, name) if return_name=True, else just the map.
     """
-    headers = {"Authorization": f"token {ERP_API_KEY}:{ERP_API_SECRET}"}
-    async with httpx.AsyncClient(timeout=20.0, verify=False) as client:
-        explicit = price_list or settings.ERP_SELLING_PRICE_LIST
+    client = get_erp_client()
+    explicit = price_list or settings.ERP_SELLING_PRICE_LIST
 
-        # Fetch all price lists so we can partition by enabled flag
-        params = {
-            "fields": '["name","enabled","selling"]',
-            "order_by": "creation desc",
-            "limit_page_length": 200,
-        }
-        r = await client.get(f"{ERP_URL}/api/resource/Price%20List", headers=headers, params=params)
-        data = r.json().get("data", []) if r.status_code == 200 else []
+    # Fetch all price lists so we can partition by enabled flag
+    params = {
+        "fields": '["name","enabled","selling"]',
+        "order_by": "creation desc",
+        "limit_page_length": 200,
+    }
+    r = await client.get("/api/resource/Price%20List", params=params)
+    data = r.json().get("data", []) if r.status_code == 200 else []
 
-        list_info = {
-            row["name"]: {
-                "enabled": 1 if (row.get("enabled", 1) in (1, True)) else 0,
-                "selling": 1 if (row.get("selling", 0) in (1, True)) else 0,
-            }
-            for row in data if row.get("name")
+    list_info = {
+        row["name"]: {
+            "enabled": 1 if (row.get("enabled", 1) in (1, True)) else 0,
+            "selling": 1 if (row.get("selling", 0) in (1, True)) else 0,
         }
+        for row in data if row.get("name")
+    }
 
-        # Candidate order: explicit (if any), all discovered, then a safety "Standard Selling"
-        candidates: list[str] = []
-        def add(name: str | None):
-            if name and name not in candidates:
-                candidates.append(name)
+    # Candidate order: explicit (if any), all discovered, then a safety "Standard Selling"
+    candidates: list[str] = []
+    def add(name: str | None):
+        if name and name not in candidates:
+            candidates.append(name)
 
-        add(explicit)
-        for n in list_info.keys():
-            add(n)
-        add("Standard Selling")
+    add(explicit)
+    for n in list_info.keys():
+        add(n)
+    add("Standard Selling")
 
-        # Count Item Price rows per candidate
-        counts: dict[str, int] = {}
-        for pl in candidates:
-            try:
-                count_url = (
-                    f"{ERP_URL}/api/method/frappe.client.get_count"
-                    f"?doctype=Item%20Price&filters={json.dumps([['price_list','=',pl]])}"
-                )
-                rc = await client.get(count_url, headers=headers)
-                counts[pl] = int((rc.json().get("message") if rc.status_code == 200 else 0) or 0)
-            except Exception:
-                counts[pl] = 0
-
-        # Prefer enabled lists first
-        enabled_first = [pl for pl in candidates if list_info.get(pl, {}).get("enabled", 1) == 1]
-        disabled_then = [pl for pl in candidates if pl not in enabled_first]
-
-        def pick_best(group: list[str]) -> tuple[str | None, int]:
-            best, maxc = None, 0
-            for pl in group:
-                c = counts.get(pl, 0)
-                if c > maxc:
-                    best, maxc = pl, c
-            return best, maxc
-
-        chosen, max_count = pick_best(enabled_first)
-        if not chosen or max_count == 0:
-            chosen, max_count = pick_best(disabled_then)
-        if not chosen:
-            chosen = explicit or "Standard Selling"
-
-        # Fetch actual prices for the chosen list
-        params = {
-            "fields": '["item_code","price_list_rate"]',
-            "filters": json.dumps([["price_list", "=", chosen]]),
-            "limit_page_length": 5000,
-        }
-        r = await client.get(f"{ERP_URL}/api/resource/Item%20Price", headers=headers, params=params)
-        rows = r.json().get("data", []) if r.status_code == 200 else []
+    # Count Item Price rows per candidate (independent calls → one concurrent burst)
+    async def _count(pl: str) -> int:
+        try:
+            count_url = (
+                f"{ERP_URL}/api/method/frappe.client.get_count"
+                f"?doctype=Item%20Price&filters={json.dumps([['price_list','=',pl]])}"
+            )
+            rc = await client.get(count_url)
+            return int((rc.json().get("message") if rc.status_code == 200 else 0) or 0)
+        except Exception:
+            return 0
+
+    counts: dict[str, int] = dict(zip(candidates, await asyncio.gather(*(_count(pl) for pl in candidates))))
+
+    # Prefer enabled lists first
+    enabled_first = [pl for pl in candidates if list_info.get(pl, {}).get("enabled", 1) == 1]
+    disabled_then = [pl for pl in candidates if pl not in enabled_first]
+
+    def pick_best(group: list[str]) -> tuple[str | None, int]:
+        best, maxc = None, 0
+        for pl in group:
+            c = counts.get(pl, 0)
+            if c > maxc:
+                best, maxc = pl, c
+        return best, maxc
+
+    chosen, max_count = pick_best(enabled_first)
+    if not chosen or max_count == 0:
+        chosen, max_count = pick_best(disabled_then)
+    if not chosen:
+        chosen = explicit or "Standard Selling"
+
+    # Fetch actual prices for the chosen list
+    params = {
+        "fields": '["item_code","price_list_rate"]',
+        "filters": json.dumps([["price_list", "=", chosen]]),
+        "limit_page_length": 5000,
+    }
+    r = await client.get("/api/resource/Item%20Price", params=params)
+    rows = orjson.loads(r.content).get("data", []) if r.status_code == 200 else []
 
-        pm: dict[str, float] = {}
-        for row in rows:
-            code, rate = row.get("item_code"), row.get("price_list_rate")
-            if code is None or rate is None:
-                continue
-            try:
-                pm[str(code)] = float(rate)
-            except Exception:
-                pass
+    pm: dict[str, float] = {}
+    for row in rows:
+        code, rate = row.get("item_code"), row.get("price_list_rate")
+        if code is None or rate is None:
+            continue
+        try:
+            pm[str(code)] = float(rate)
+        except Exception:
+            pass
 
-        globals()["LAST_PRICE_LIST_USED"] = chosen
-        return (pm, chosen) if return_name else pm
+    globals()["LAST_PRICE_LIST_USED"] = chosen
+    return (pm, chosen) if return_name else pm
 
 # --- Items -----------------------------------------------------------------
-async def get_erpnext_items():
+async def get_erpnext_items(modified_since: str | None = None):
     """
     Fetch sales-enabled, not-disabled Items in one call using the mapping fields.
     Avoid fields that aren't permitted in list queries (e.g. website_image).
+    If `modified_since` (ERPNext datetime string) is given, only Items modified after it are returned.
     """
     try:
         erp_fields = get_erp_sync_fields()
@@ -213,7 +211,7 @@ async def get_erpnext_items():
             seen.add(f)
             safe_fields.append(f)
         # Ensure we at least have these basics:
-        for must in ("name", "item_code", "item_group", "brand", "has_variants", "image"):
+        for must in ("name", "item_code", "item_group", "brand", "has_variants", "image", "modified"):
             if must not in seen:
                 safe_fields.append(must)
 
@@ -241,22 +239,23 @@ async def get_erpnext_items():
             except Exception as e:
                 logger.warning("Ignoring ERP_ITEM_FILTERS_JSON parse error: %s", e)
 
+        # Delta fetch: only rows changed after the last successful sync
+        if modified_since:
+            filters.append(["modified", ">", modified_since])
+
         params = {
             "fields": json.dumps(safe_fields),
             "filters": json.dumps(filters),
             "order_by": "modified desc",
             "limit_page_length": 5000,
         }
-        headers = {"Authorization": f"token {ERP_API_KEY}:{ERP_API_SECRET}"}
-
-        async with httpx.AsyncClient(timeout=30.0, verify=False) as client:
-            r = await client.get(f"{ERP_URL}/api/resource/Item", headers=headers, params=params)
+        r = await get_erp_client().get("/api/resource/Item", params=params, timeout=30.0)
 
         if r.status_code != 200:
             logger.error("get_erpnext_items failed status=%s body=%s", r.status_code, r.text)
             return []
 
-        data = r.json().get("data", []) or []
+        data = orjson.loads(r.content).get("data", []) or []
         logger.info("Fetched %d ERP Items", len(data))
         return data
 
@@ -319,8 +318,9 @@ async def get_stock_map() -> Dict[tuple, float]:
     params = {"fields": json.dumps(fields), "limit_page_length": 5000}
     r = await _http_get("/api/resource/Bin", params)
     stock_map: Dict[tuple, float] = {}
-    if r.status_code == 200 and r.json().get("data"):
-        for row in r.json()["data"]:
+    rows = orjson.loads(r.content).get("data") if r.status_code == 200 else None
+    if rows:
+        for row in rows:
             key = (row.get("item_code"), row.get("warehouse"))
             if key[0] and key[1]:
                 try:
@@ -347,18 +347,21 @@ async def _get_featured_image(item_code: str) -> Optional[str]:
         logger.debug("Featured image lookup failed for %s: %s", item_code, e)
     return None
 
+# Constant File field list, encoded once
+_ITEM_FILE_FIELDS = orjson.dumps(["file_url", "attached_to_field", "attached_to_name"]).decode()
+
 async def _get_item_files(item_code: str) -> List[Dict[str, Any]]:
     """
     Get File rows attached to this Item (ordered by creation asc).
     """
     params = {
-        "fields": json.dumps(["file_url", "attached_to_field", "attached_to_name"]),
-        "filters": json.dumps([["attached_to_doctype", "=", "Item"], ["attached_to_name", "=", item_code]]),
+        "fields": _ITEM_FILE_FIELDS,
+        "filters": orjson.dumps([["attached_to_doctype", "=", "Item"], ["attached_to_name", "=", item_code]]).decode(),
         "order_by": "creation asc",
         "limit_page_length": 1000,
     }
     r = await _http_get("/api/resource/File", params)
-    return r.json().get("data", []) if r.status_code == 200 else []
+    return orjson.loads(r.content).get("data", []) if r.status_code == 200 else []
 
 async def get_erp_images(item_or_code: str | Dict[str, Any]) -> Dict[str, Any]:
     """
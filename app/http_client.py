@@ -0,0 +1,104 @@
+#=================================================================
+# app/http_client.py
+# Shared, long-lived httpx.AsyncClients for ERPNext / WooCommerce / WP calls.
+# - One keep-alive pool per process (no TCP+TLS handshake per call)
+# - Per-service clients carry base_url + auth, so helpers pass only a path
+# - HTTP/2 multiplexing when the h2 package is installed (httpx[http2])
+# - TLS verification on by default (settings.HTTP_VERIFY_TLS), one SSLContext
+#   built at import and shared by every client
+# - Explicit pool limits so gather() bursts queue for a connection instead of
+#   opening sockets until ConnectError
+# - Closed from the FastAPI lifespan shutdown (see app/main_app.py)
+#=================================================================
+
+import importlib.util
+import ssl
+
+import httpx
+
+from app.config import settings
+
+_DEFAULT_TIMEOUT = 20.0
+_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=30)
+_HTTP2 = importlib.util.find_spec("h2") is not None
+
+
+def _build_ssl_context() -> ssl.SSLContext:
+    ctx = ssl.create_default_context()
+    if not settings.HTTP_VERIFY_TLS:
+        # Self-signed dev hosts only
+        ctx.check_hostname = False
+        ctx.verify_mode = ssl.CERT_NONE
+    return ctx
+
+
+_SSL_CTX = _build_ssl_context()
+
+
+def get_ssl_context() -> ssl.SSLContext:
+    """The shared SSLContext, for the few call sites that still build their own client."""
+    return _SSL_CTX
+
+_clients: dict[str, httpx.AsyncClient] = {}
+
+
+def _build(**kwargs) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        timeout=_DEFAULT_TIMEOUT,
+        verify=_SSL_CTX,
+        http2=_HTTP2,
+        limits=_LIMITS,
+        **kwargs,
+    )
+
+
+def _get(name: str, **kwargs) -> httpx.AsyncClient:
+    """Return the named client, creating it lazily (binds to the running loop, not import time)."""
+    client = _clients.get(name)
+    if client is None or client.is_closed:
+        client = _clients[name] = _build(**kwargs)
+    return client
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Process-wide client with no base_url/auth (arbitrary absolute URLs, e.g. media).
+    Per-call auth/headers/timeout are passed on each request.
+    """
+    return _get("default")
+
+
+def get_erp_client() -> httpx.AsyncClient:
+    """ERPNext client: base_url=ERP_URL, token auth header preset."""
+    return _get(
+        "erp",
+        base_url=settings.ERP_URL.rstrip("/"),
+        headers={"Authorization": f"token {settings.ERP_API_KEY}:{settings.ERP_API_SECRET}"},
+    )
+
+
+def get_wc_client() -> httpx.AsyncClient:
+    """WooCommerce REST client: base_url=WC_BASE_URL, consumer key/secret as basic auth."""
+    return _get(
+        "wc",
+        base_url=settings.WC_BASE_URL.rstrip("/"),
+        auth=(settings.WC_API_KEY, settings.WC_API_SECRET),
+    )
+
+
+def get_wp_client() -> httpx.AsyncClient:
+    """WP REST client (media, product_brand, …): base_url=WC_BASE_URL, WP app-password auth."""
+    return _get(
+        "wp",
+        base_url=settings.WC_BASE_URL.rstrip("/"),
+        auth=(settings.WP_USERNAME, settings.WP_PASSWORD),
+    )
+
+
+async def aclose_clients() -> None:
+    """Close every shared client. Safe to call more than once."""
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        if not client.is_closed:
+            await client.aclose()
@@ -12,6 +12,7 @@ from fastapi.security import HTTPBasic, HTTPBasicCredentials
 
 # Public webhooks (no auth)
 from app.webhooks.woo import router as woo_webhooks_router
+from app.webhooks.erpnext import router as erpnext_webhooks_router
 
 # Public API under /api/*
 from app.routes import router as api_router
@@ -32,6 +33,7 @@ from app.backfill.backfill_api import router as backfill_router
 from app.workers.jobs_worker import worker_loop
 from app.db import init_db
 from app.config import settings
+from app.http_client import aclose_clients
 
 ADMIN_USER = settings.ADMIN_USER
 ADMIN_PASS = settings.ADMIN_PASS
@@ -56,6 +58,7 @@ async def lifespan(app):
             await asyncio.wait_for(_worker_task, timeout=5.0)
         except Exception:
             _worker_task.cancel()
+    await aclose_clients()
 
 app = FastAPI(
     title="ERPNext WooCommerce Integration Middleware",
@@ -100,6 +103,7 @@ def verify_admin(credentials: HTTPBasicCredentials = Depends(security)):
 
 # Webhooks (public)
 app.include_router(woo_webhooks_router)  # /webhooks/woo
+app.include_router(erpnext_webhooks_router)  # /webhooks/erpnext
 
 # Public API
 app.include_router(api_router)           # /api/*
@@ -27,11 +27,13 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 from app.config import settings
+from app.http_client import get_ssl_context
 
 # NEW pipeline (keep)
 from app.sync.product_sync import (
     sync_products_full,     # full sync with categories, prices, brand, variants, images
     sync_products_partial,  # partial sync by SKUs
+    sync_products_delta,    # partial sync of ERP Items modified since the last run
     sync_preview,           # dry-run preview of new pipeline
 )
 
@@ -290,6 +292,17 @@ async def api_sync_partial(request: Request):
     }
     return JSONResponse(content=result)
 
+@router.post("/sync/delta", dependencies=[Depends(verify_admin)])
+async def api_sync_delta(request: Request):
+    """
+    Delta sync (admin-only): only ERP Items modified since the last successful run.
+    Body: { "dry_run" | "dryRun": bool }
+    """
+    payload = await _safe_json(request)
+    dry_run = _get_bool(payload, "dry_run", "dryRun", default=False)
+    result = await sync_products_delta(dry_run=dry_run)
+    return JSONResponse(content=result)
+
 # ----------------------------------------------------------------------
 # COMPATIBILITY ALIASES (root-level) — same handlers & auth
 # These let the UI call /sync/* instead of /api/sync/*
@@ -383,7 +396,7 @@ async def api_health():
         "woocommerce": {},
     }
 
-    async with httpx.AsyncClient(timeout=10.0, verify=False) as client:
+    async with httpx.AsyncClient(timeout=10.0, verify=get_ssl_context()) as client:
         # ---- ERPNext ping ----
         if not erp_url:
             result["erpnext"] = {"ok": False, "error": "ERP_URL not set"}
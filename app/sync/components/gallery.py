@@ -7,6 +7,7 @@ import httpx
 from typing import List, Dict, Any, Optional
 from urllib.parse import urlparse, urljoin
 from app.config import settings
+from app.http_client import get_client
 from app.sync.sync_utils import get_erp_image_list  # tolerant wrapper around ERP item image(s)
 from app.erp.erpnext import get_erp_images         # fallback direct fetch
 
@@ -96,16 +97,16 @@ async def _enrich_gallery_with_sizes(gallery: List[Dict[str, Any]]) -> List[Dict
     if not gallery:
         return []
     out: List[Dict[str, Any]] = []
-    async with httpx.AsyncClient(timeout=20.0, verify=False) as client:
-        for item in gallery:
-            url = (item.get("url") or "").strip()
-            if not url:
-                continue
-            size = int(item.get("size") or 0)
-            full = _full_url(url)
-            if size <= 0:
-                size = await _fetch_content_length(client, full, use_erp_auth=_is_erp_url(url))
-            out.append({"url": full, "size": size})
+    client = get_client()
+    for item in gallery:
+        url = (item.get("url") or "").strip()
+        if not url:
+            continue
+        size = int(item.get("size") or 0)
+        full = _full_url(url)
+        if size <= 0:
+            size = await _fetch_content_length(client, full, use_erp_auth=_is_erp_url(url))
+        out.append({"url": full, "size": size})
     return out
 
 def normalize_gallery_from_wc_product(wc_prod: Dict[str, Any]) -> List[Dict[str, Any]]:
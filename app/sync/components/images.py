@@ -10,6 +10,7 @@ import re
 from typing import Callable, Awaitable
 from urllib.parse import urlparse, urljoin
 from app.config import settings
+from app.http_client import get_client
 from app.sync.components.util import maybe_await
 
 logger = logging.getLogger(__name__)
@@ -304,29 +305,29 @@ async def _head_size(url: str, *, timeout: float = 8.0) -> int | None:
             pass
         return None
 
-    async with httpx.AsyncClient(follow_redirects=True, timeout=timeout) as client:
-        # HEAD
-        try:
-            r = await client.head(url, headers=_headers_for(url))
-            cl = r.headers.get("Content-Length") or r.headers.get("content-length")
-            if cl and cl.isdigit():
-                return int(cl)
-        except Exception as e:
-            logger.debug("HEAD failed for %s: %s", url, e)
+    client = get_client()
+    # HEAD
+    try:
+        r = await client.head(url, headers=_headers_for(url), follow_redirects=True, timeout=timeout)
+        cl = r.headers.get("Content-Length") or r.headers.get("content-length")
+        if cl and cl.isdigit():
+            return int(cl)
+    except Exception as e:
+        logger.debug("HEAD failed for %s: %s", url, e)
 
-        # Range GET 0-0
-        try:
-            r = await client.get(url, headers={**(_headers_for(url) or {}), "Range": "bytes=0-0"})
-            cr = r.headers.get("Content-Range") or r.headers.get("content-range")
-            if cr and "/" in cr:
-                total = cr.split("/")[-1].strip()
-                if total.isdigit():
-                    return int(total)
-            cl = r.headers.get("Content-Length") or r.headers.get("content-length")
-            if cl and cl.isdigit():
-                return int(cl)
-        except Exception as e:
-            logger.debug("Range GET failed for %s: %s", url, e)
+    # Range GET 0-0
+    try:
+        r = await client.get(url, headers={**(_headers_for(url) or {}), "Range": "bytes=0-0"}, follow_redirects=True, timeout=timeout)
+        cr = r.headers.get("Content-Range") or r.headers.get("content-range")
+        if cr and "/" in cr:
+            total = cr.split("/")[-1].strip()
+            if total.isdigit():
+                return int(total)
+        cl = r.headers.get("Content-Length") or r.headers.get("content-length")
+        if cl and cl.isdigit():
+            return int(cl)
+    except Exception as e:
+        logger.debug("Range GET failed for %s: %s", url, e)
 
     return None
 
@@ -11,7 +11,11 @@
 from __future__ import annotations
 
 import html as _html
+import hashlib
+import json
 import logging, httpx, asyncio, os, re, unicodedata
+import functools
+from contextvars import ContextVar
 from urllib.parse import urlparse, urlunparse, quote
 from typing import List, Dict, Any, Optional
 from collections import defaultdict, Counter
@@ -20,6 +24,7 @@ from app.erp.erp_variant_matrix import build_variant_matrix
 from app.sync.components.price import resolve_price_map
 from app.sync.components.attributes import collect_used_attribute_values
 from app.config import settings
+from app.http_client import get_client, get_erp_client, get_wp_client
 from app.erp.erpnext import (
     get_erpnext_items,
     get_erpnext_categories,
@@ -28,9 +33,12 @@ from app.erp.erpnext import (
 )
 from app.woo.woocommerce import (
     get_wc_products,
+    get_wc_products_by_skus,
     get_wc_categories,
     ensure_wc_attributes_and_terms,
     ensure_wp_image_uploaded,
+    get_wc_media_sizes,
+    reset_wc_media_index,
     purge_wc_bin_products,
 )
 from app.sync.sync_utils import (
@@ -38,8 +46,13 @@ from app.sync.sync_utils import (
     normalize_category_name,
     sync_categories,
     save_preview_to_file,
+    load_preview_targets,
     reconcile_woocommerce_brands,
     _mapping_dir,
+    _atomic_write_json,
+    etag_head_size,
+    remember_image_size,
+    flush_img_size_cache,
 )
 from app.erp.erp_attribute_loader import (
     get_erpnext_attribute_order,
@@ -57,6 +70,7 @@ from app.sync.components.matrix import (
     build_fallback_variant_matrix,
     build_fallback_variant_matrix_by_base,
     infer_global_attribute_order_from_skus,
+    guess_parent_code_from_sku,
 )
 from app.sync.components.brands import (
     extract_brand,
@@ -66,11 +80,31 @@ from app.sync.components.brands import (
 logger = logging.getLogger("uvicorn.error")
 
 MAPPING_STORE_PATH = os.path.join(_mapping_dir(), "mapping_store.json")
+LAST_SYNC_PATH = os.path.join(_mapping_dir(), "last_sync.json")
+SKU_CACHE_PATH = os.path.join(_mapping_dir(), "wc_sku_cache.json")
+_SKU_CACHE_VERSION = 3
 ERP_URL = settings.ERP_URL
 ERP_API_KEY = settings.ERP_API_KEY
 ERP_API_SECRET = settings.ERP_API_SECRET
 WC_BASE_URL = settings.WC_BASE_URL
 _SIZE_CACHE: Dict[str, int] = {}
+# Caps concurrent HEAD/ranged-GET probes against ERP + Woo across all rows of a sync
+_HEAD_SEM = asyncio.Semaphore(20)
+# Uploads are heavier (download + WP media insert); keep this cap low
+_UPLOAD_SEM = asyncio.Semaphore(5)
+
+# ---- Precompiled patterns for the per-row diff helpers in sync_all_templates_and_variants
+_RE_SCRIPT_STYLE = re.compile(r"(?is)<(script|style)[^>]*>.*?</\1>")
+_RE_BR = re.compile(r"(?is)<br\s*/?>")
+_RE_P_CLOSE = re.compile(r"(?is)</p\s*>")
+_RE_TAG = re.compile(r"(?is)<[^>]+>")
+_RE_DASH_SPACING = re.compile(r"\s*-\s*")
+_RE_WS = re.compile(r"\s+")
+_RE_SIZE_X = re.compile(r"\s*[xX×]\s*")
+_RE_WP_SIZE_SUFFIX = re.compile(r"-(?:\d+x\d+)(?=\.[a-z0-9]+$)")
+_RE_WP_SCALED = re.compile(r"-scaled(?=\.[a-z0-9]+$)")
+_RE_WP_DUP_SUFFIX = re.compile(r"-(\d+)(?=\.[a-z0-9]+$)")
+_RE_NON_ALNUM = re.compile(r"[^a-z0-9]")
 
 # ---- Normalize text consistently and pick the ERP source after normalization
 
@@ -131,14 +165,16 @@ def _norm_variation_desc_for_compare(s: str | None) -> str:
 
 # ---- host rewrite for image sizing ----
 
+# Resolved once at import: the rewrite runs for every media URL during a size-probe pass
+_WP_BASE = os.getenv("WC_BASE_URL") or os.getenv("WP_BASE_URL") or os.getenv("WORDPRESS_BASE_URL")
+try:
+    _WP_BASE_HOST = urlparse(_WP_BASE).netloc if _WP_BASE else None
+except Exception:
+    _WP_BASE_HOST = None
+_WC_BASE_SCHEME = urlparse(os.getenv("WC_BASE_URL") or "").scheme or None
+
 def _wp_base_host() -> str | None:
-    base = os.getenv("WC_BASE_URL") or os.getenv("WP_BASE_URL") or os.getenv("WORDPRESS_BASE_URL")
-    if not base:
-        return None
-    try:
-        return urlparse(base).netloc
-    except Exception:
-        return None
+    return _WP_BASE_HOST
 
 def _rewrite_wp_media_host(url: str) -> str:
     """
@@ -154,8 +190,7 @@ def _rewrite_wp_media_host(url: str) -> str:
             return url
         rewrite_hosts = {"techniclad.local", "localhost", "127.0.0.1"}
         if u.netloc in rewrite_hosts or u.netloc.endswith(".local"):
-            base = os.getenv("WC_BASE_URL")
-            scheme = urlparse(base).scheme if base else (u.scheme or "https")
+            scheme = _WC_BASE_SCHEME or (u.scheme or "https")
             return urlunparse((scheme, base_host, u.path, u.params, u.query, u.fragment))
         return url
     except Exception:
@@ -166,22 +201,22 @@ def _rewrite_wp_media_host(url: str) -> str:
 async def head_content_length(client: httpx.AsyncClient, url: str) -> int:
     """
     Return the byte size for a URL using HEAD; if blocked/missing, fall back to a ranged GET.
+    HEADs go through the persistent ETag size cache (fresh entries cost no request).
     """
     try:
-        r = await client.head(url)
-        if r.status_code < 400:
-            val = r.headers.get("Content-Length") or r.headers.get("content-length")
-            if val and val.isdigit():
-                return int(val)
+        size = await etag_head_size(client, url)
+        if size:
+            return size
 
         # Fallback: some servers block HEAD; try a 1-byte ranged GET
-        r = await client.get(url, headers={"Range": "bytes=0-0"})
+        r = await client.get(url, headers={"Range": "bytes=0-0"}, timeout=15.0, follow_redirects=True)
         if r.status_code < 400:
             # Prefer Content-Range total (bytes 0-0/12345)
             cr = r.headers.get("Content-Range") or r.headers.get("content-range")
             if cr and "/" in cr:
                 total = cr.split("/")[-1]
                 if total.isdigit():
+                    remember_image_size(url, int(total), r.headers.get("etag"))
                     return int(total)
             # Last resort: Content-Length (often 1 for ranged GETs)
             val = r.headers.get("Content-Length") or r.headers.get("content-length")
@@ -195,28 +230,50 @@ async def head_content_length(client: httpx.AsyncClient, url: str) -> int:
 async def _head_sizes_for_urls(urls: list[str]) -> list[int]:
     """
     Return Content-Length for each URL (0 if missing/error). Rewrites local hosts so DNS doesn’t fail.
-    Memoized per-URL and rate-limited concurrency.
+    Memoized per-URL and rate-limited concurrency (shared _HEAD_SEM).
     """
     if not urls:
         return []
-    sem = asyncio.Semaphore(12)
 
     async def _probe(client, u: str) -> int:
         tgt = _rewrite_wp_media_host(u)
         if tgt in _SIZE_CACHE:
             return _SIZE_CACHE[tgt]
-        async with sem:
+        async with _HEAD_SEM:
             sz = await head_content_length(client, tgt)
         _SIZE_CACHE[tgt] = sz
         return sz
 
     try:
-        async with httpx.AsyncClient(timeout=15.0, verify=False, follow_redirects=True) as client:
-            return await asyncio.gather(*(_probe(client, u) for u in urls))
+        client = get_client()
+        return await asyncio.gather(*(_probe(client, u) for u in urls))
     except Exception as e:
         logger.debug("HEAD client error: %s", e)
         return [0] * len(urls)
 
+# --- Gallery signature (stored on Woo products/variations as meta) ---------
+
+IMG_SIG_META_KEY = "_erp_img_sig"
+
+def _gallery_signature(urls: list[str]) -> str:
+    """Stable fingerprint of the ERP image list (order matters: featured first)."""
+    if not urls:
+        return ""
+    return hashlib.sha1("\n".join(urls).encode("utf-8")).hexdigest()
+
+def _meta_value(wc_obj: Optional[dict], key: str) -> Optional[str]:
+    for m in ((wc_obj or {}).get("meta_data") or []):
+        if isinstance(m, dict) and m.get("key") == key:
+            return m.get("value")
+    return None
+
+def _wc_image_ids(wc_obj: Optional[dict]) -> list:
+    """WP media ids of a Woo product's images (or a variation's single image)."""
+    imgs = (wc_obj or {}).get("images")
+    if not (isinstance(imgs, list) and imgs):
+        imgs = [(wc_obj or {}).get("image")]
+    return [img["id"] for img in imgs if isinstance(img, dict) and img.get("id")]
+
 def _abs_erp_file_url(file_url: str) -> str:
     """Turn '/files/…' into a fully-qualified URL; leave absolute URLs alone."""
     if not file_url:
@@ -226,18 +283,43 @@ def _abs_erp_file_url(file_url: str) -> str:
         return file_url
     return ERP_URL.rstrip("/") + quote(file_url, safe="/:%()[]&=+,-._")
 
+# Per-run memo for ERP image lookups (featured + File rows). The same codes are
+# asked for by the family gallery pass, the per-row pass and the post-sync preview
+# refresh; ERP images don't change mid-run, so each lookup is made once per run.
+_erp_img_cache: ContextVar[Optional[dict]] = ContextVar("_erp_img_cache", default=None)
+
+def _with_erp_image_cache(fn):
+    """Run a sync entry point with a fresh ERP image memo (dropped on return)."""
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        token = _erp_img_cache.set({})
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            _erp_img_cache.reset(token)
+    return wrapper
+
 async def _erp_get_featured(item_code: str) -> Optional[str]:
-    """Item.image for a given item_code (uses the exact API pattern you tested)."""
+    """Item.image for a given item_code (memoized per sync run)."""
     if not item_code:
         return None
-    headers = {"Authorization": f"token {ERP_API_KEY}:{ERP_API_SECRET}"}
+    cache = _erp_img_cache.get()
+    key = ("featured", item_code)
+    if cache is not None and key in cache:
+        return cache[key]
+    featured = await _erp_fetch_featured(item_code)
+    if cache is not None:
+        cache[key] = featured
+    return featured
+
+async def _erp_fetch_featured(item_code: str) -> Optional[str]:
+    """Item.image for a given item_code (uses the exact API pattern you tested)."""
     filters = quote('{"name":"%s"}' % item_code, safe="/:%()[]&=+,-._{}\"")
-    url = f"{ERP_URL}/api/method/frappe.client.get_value?doctype=Item&fieldname=image&filters={filters}"
+    url = f"/api/method/frappe.client.get_value?doctype=Item&fieldname=image&filters={filters}"
     try:
-        async with httpx.AsyncClient(timeout=20.0, verify=False) as client:
-            r = await client.get(url, headers=headers)
-            if r.status_code == 200:
-                return (r.json().get("message") or {}).get("image") or None
+        r = await get_erp_client().get(url)
+        if r.status_code == 200:
+            return (r.json().get("message") or {}).get("image") or None
     except Exception as e:
         logger.error(f"Failed to fetch featured image for {item_code}: {e}")
     return None
@@ -246,22 +328,31 @@ async def _erp_get_file_rows_for_items(item_codes: list[str]) -> list[dict]:
     """
     All File rows for given Item codes, ordered by creation asc.
     Returns [{file_url, attached_to_field, attached_to_name, creation}, ...]
+    Memoized per sync run (keyed by the code tuple).
     """
     if not item_codes:
         return []
-    headers = {"Authorization": f"token {ERP_API_KEY}:{ERP_API_SECRET}"}
+    cache = _erp_img_cache.get()
+    key = ("files", tuple(item_codes))
+    if cache is not None and key in cache:
+        return cache[key]
+    rows = await _erp_fetch_file_rows(item_codes)
+    if cache is not None:
+        cache[key] = rows
+    return rows
+
+async def _erp_fetch_file_rows(item_codes: list[str]) -> list[dict]:
     fields = quote('["file_url","attached_to_field","attached_to_name","creation"]')
     # [["attached_to_doctype","=","Item"],["attached_to_name","in",[...]]]
     filt = quote(
         '[["attached_to_doctype","=","Item"],["attached_to_name","in",%s]]'
         % str(item_codes).replace("'", '"')
     )
-    url = f"{ERP_URL}/api/resource/File?fields={fields}&filters={filt}&order_by=creation%20asc&limit_page_length=1000"
+    url = f"/api/resource/File?fields={fields}&filters={filt}&order_by=creation%20asc&limit_page_length=1000"
     try:
-        async with httpx.AsyncClient(timeout=30.0, verify=False) as client:
-            r = await client.get(url, headers=headers)
-            if r.status_code == 200:
-                return r.json().get("data", []) or []
+        r = await get_erp_client().get(url, timeout=30.0)
+        if r.status_code == 200:
+            return r.json().get("data", []) or []
     except Exception as e:
         logger.error(f"Failed to fetch File rows for {item_codes}: {e}")
     return []
@@ -283,8 +374,21 @@ async def purge_woo_bin_if_needed(auto_purge: bool = True):
 # 2. Shared prep
 # =========================
 
-async def _prepare_context(*, dry_run: bool, skus: Optional[List[str]] = None) -> Dict[str, Any]:
-    """Fetch ERP/Woo state, build matrices, ensure taxonomies, and return everything needed for the core sync."""
+async def _prepare_context(
+    *,
+    dry_run: bool,
+    skus: Optional[List[str]] = None,
+    prefetched: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Fetch ERP/Woo state, build matrices, ensure taxonomies, and return everything needed for the core sync.
+    `prefetched` carries ERP reads the caller already made this run ("erp_items", "price" as the
+    resolve_price_map tuple, "stock_map"); those are reused instead of fetched again. "erp_items" may
+    be just the changed families, with "all_erp_items" kept for the global attribute order.
+    """
+    prefetched = prefetched or {}
+    reset_wc_media_index()  # fresh WP media listing per run
+
     # Categories: need Woo cat IDs
     await get_erpnext_categories()
     await get_wc_categories()
@@ -292,16 +396,23 @@ async def _prepare_context(*, dry_run: bool, skus: Optional[List[str]] = None) -
     wc_categories = await get_wc_categories()  # refresh after potential creation
 
     # ERP items, prices, stock
-    erp_items = await get_erpnext_items()
+    erp_items = prefetched.get("erp_items")
+    if erp_items is None:
+        erp_items = await get_erpnext_items()
 
-    price_map, price_list_name, price_count = await resolve_price_map(get_price_map, settings.ERP_SELLING_PRICE_LIST)
+    if "price" in prefetched and "stock_map" in prefetched:
+        (price_map, price_list_name, price_count), stock_map = prefetched["price"], prefetched["stock_map"]
+    else:
+        # Price and stock are independent ERP reads; overlap them
+        (price_map, price_list_name, price_count), stock_map = await asyncio.gather(
+            resolve_price_map(get_price_map, settings.ERP_SELLING_PRICE_LIST),
+            get_stock_map(),
+        )
     if price_list_name:
         logger.info("Using price list: %s with %d prices", price_list_name, price_count)
     else:
         logger.info("Using price list with %d prices", price_count)
 
-    stock_map = await get_stock_map()
-
     # Attributes & variant matrix
     erp_attr_order = await maybe_await(get_erpnext_attribute_order())
     attribute_map = await maybe_await(get_erpnext_attribute_map(erp_attr_order))
@@ -322,7 +433,7 @@ async def _prepare_context(*, dry_run: bool, skus: Optional[List[str]] = None) -
 
     # Attribute order for preview (based on real SKUs)
     attribute_order_for_preview = infer_global_attribute_order_from_skus(
-        erp_items, attribute_map, erp_attr_order
+        prefetched.get("all_erp_items") or erp_items, attribute_map, erp_attr_order
     )
 
     # Attributes/Brand taxonomy ensure or preview
@@ -349,8 +460,11 @@ async def _prepare_context(*, dry_run: bool, skus: Optional[List[str]] = None) -
             brands, delete_missing=False, dry_run=False
         )
 
-    # Woo state + category map
-    wc_products = await get_wc_products()
+    # Woo state + category map (targeted lookup when only some SKUs are in play)
+    if skus:
+        wc_products = await get_wc_products_by_skus(set(skus) | set(variant_matrix.keys()))
+    else:
+        wc_products = await get_wc_products()
     wc_cat_map = build_wc_cat_map(wc_categories)
 
     return {
@@ -368,11 +482,44 @@ async def _prepare_context(*, dry_run: bool, skus: Optional[List[str]] = None) -
         "variant_matrix": variant_matrix,
     }
 
+async def _run_core(
+    ctx: Dict[str, Any],
+    *,
+    dry_run: bool,
+    preserve_parent_attrs_on_update: bool,
+    variant_matrix: Optional[Dict[str, Dict[str, Any]]] = None,
+    wc_products: Optional[List[dict]] = None,
+    force_gallery: bool = False,
+) -> Dict[str, Any]:
+    """Single preview/apply pass over a prepared context (dry_run decides whether Woo is written)."""
+    try:
+        return await sync_all_templates_and_variants(
+            variant_matrix=ctx["variant_matrix"] if variant_matrix is None else variant_matrix,
+            wc_products=ctx["wc_products"] if wc_products is None else wc_products,
+            wc_cat_map=ctx["wc_cat_map"],
+            price_map=ctx["price_map"],
+            attribute_map=ctx["attribute_map"],
+            stock_map=ctx["stock_map"],
+            attribute_order=ctx["attribute_order_for_preview"],
+            dry_run=dry_run,
+            preserve_parent_attrs_on_update=preserve_parent_attrs_on_update,
+            erp_items=ctx.get("erp_items"),
+            force_gallery=force_gallery,
+        )
+    finally:
+        flush_img_size_cache()
+
 # =========================
 # 3. Sync Entry Points
 # =========================
 
-async def sync_products_full(dry_run: bool = False, purge_bin: bool = True) -> Dict[str, Any]:
+@_with_erp_image_cache
+async def sync_products_full(
+    dry_run: bool = False,
+    purge_bin: bool = True,
+    *,
+    prefetched: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
     sync_type = "Preview" if dry_run else "Full"
     logger.info(f"🔁 [SYNC] Starting {sync_type} ERPNext → Woo sync (dry_run=%s)", dry_run)
 
@@ -387,7 +534,7 @@ async def sync_products_full(dry_run: bool = False, purge_bin: bool = True) -> D
     # Log: about to prepare context
     logger.debug("[SYNC] Preparing context for job registration...")
     try:
-        ctx = await _prepare_context(dry_run=dry_run, skus=None)
+        ctx = await _prepare_context(dry_run=dry_run, skus=None, prefetched=prefetched)
     except Exception as e:
         logger.error(f"[SYNC][ERROR] Failed during context preparation: {e}")
         raise
@@ -395,43 +542,26 @@ async def sync_products_full(dry_run: bool = False, purge_bin: bool = True) -> D
     # Log: about to start sync_all_templates_and_variants
     logger.debug("[SYNC] Context prepared, starting sync_all_templates_and_variants...")
     try:
-        sync_report = await sync_all_templates_and_variants(
-            variant_matrix=ctx["variant_matrix"],
-            wc_products=ctx["wc_products"],
-            wc_cat_map=ctx["wc_cat_map"],
-            price_map=ctx["price_map"],
-            attribute_map=ctx["attribute_map"],
-            stock_map=ctx["stock_map"],
-            attribute_order=ctx["attribute_order_for_preview"],
-            dry_run=dry_run,
-            preserve_parent_attrs_on_update=False,
-            erp_items=ctx["erp_items"],
-        )
+        sync_report = await _run_core(ctx, dry_run=dry_run, preserve_parent_attrs_on_update=False)
     except Exception as e:
         logger.error(f"[SYNC][ERROR] Failed during sync_all_templates_and_variants: {e}")
         raise
 
-    # Save Sync Preview (products_to_sync.json)
+    # Save Sync Preview (products_to_sync.ndjson)
     try:
         if dry_run:
-            logger.debug("[SYNC] Saving preview to products_to_sync.json (dry_run)")
+            logger.debug("[SYNC] Saving preview to products_to_sync.ndjson (dry_run)")
             save_preview_to_file(sync_report, source="full", dry_run=True, skus=None)
         else:
             logger.debug("[SYNC] Starting post-sync preview refresh (background task)")
             async def _refresh():
                 try:
-                    ctx2 = await _prepare_context(dry_run=True, skus=None)
-                    snap = await sync_all_templates_and_variants(
-                        variant_matrix=ctx2["variant_matrix"],
-                        wc_products=ctx2["wc_products"],
-                        wc_cat_map=ctx2["wc_cat_map"],
-                        price_map=ctx2["price_map"],
-                        attribute_map=ctx2["attribute_map"],
-                        stock_map=ctx2["stock_map"],
-                        attribute_order=ctx2["attribute_order_for_preview"],
+                    # ERP side is unchanged by the write pass; only Woo needs re-reading
+                    snap = await _run_core(
+                        ctx,
                         dry_run=True,
                         preserve_parent_attrs_on_update=True,
-                        erp_items=ctx2["erp_items"],
+                        wc_products=await get_wc_products(),
                         force_gallery=True,
                     )
                     save_preview_to_file(snap, source="post-full", dry_run=True, skus=None)
@@ -439,7 +569,7 @@ async def sync_products_full(dry_run: bool = False, purge_bin: bool = True) -> D
                     logger.warning(f"[FULL] post-sync preview refresh failed: {ie}")
             asyncio.create_task(_refresh())
     except Exception as e:
-        logger.error(f"Failed to write products_to_sync.json: {e}")
+        logger.error(f"Failed to write products_to_sync.ndjson: {e}")
 
     logger.info(f"✅ [SYNC] {sync_type} sync complete (dry_run=%s)", dry_run)
     return {
@@ -457,25 +587,25 @@ async def sync_preview() -> Dict[str, Any]:
 
 # --- PARTIAL SYNC ---
 
+@_with_erp_image_cache
 async def sync_products_partial(
     skus_to_sync: List[str],
     dry_run: bool = False,
     *,
-    respect_preview: bool = True
+    respect_preview: bool = True,
+    prefetched: Optional[Dict[str, Any]] = None,
     ) -> Dict[str, Any]:
     """
     Partial sync:
       - If `skus_to_sync` is provided, use those.
-        • When respect_preview=True (default), intersect with products_to_sync.json targets.
+        • When respect_preview=True (default), intersect with products_to_sync.ndjson targets.
         • When respect_preview=False, the user list is authoritative (no intersection).
-      - If `skus_to_sync` is empty, fall back to products_to_sync.json.
+      - If `skus_to_sync` is empty, fall back to products_to_sync.ndjson.
       - Filter the ERP context to ONLY those SKUs.
       - Preserve parent attributes/images when parent already exists (avoid shrinking).
+      - `prefetched` ERP reads (see _prepare_context) are reused instead of fetched again.
     """
-    import os, json
-
     logger.info("🔁 [SYNC] Starting PARTIAL ERPNext → Woo sync (dry_run=%s)", dry_run)
-    PREVIEW_PATH = "/app/mapping/products_to_sync.json"
 
     if not dry_run:
         await purge_woo_bin_if_needed(True)
@@ -483,27 +613,8 @@ async def sync_products_partial(
     def _is_variation(s: str) -> bool:
         return len([p for p in (s or "").split("-") if p]) >= 3
 
-    def _load_preview_targets() -> set[str]:
-        if not os.path.exists(PREVIEW_PATH):
-            logger.warning("[PARTIAL] Preview file %s not found; falling back to provided skus_to_sync.", PREVIEW_PATH)
-            return set()
-        try:
-            with open(PREVIEW_PATH, "r", encoding="utf-8") as f:
-                j = json.load(f) or {}
-        except Exception as e:
-            logger.warning("[PARTIAL] Failed to read preview file: %s; falling back to provided SKUs.", e)
-            return set()
-
-        targets = set()
-        for key in ("to_create", "to_update", "variant_to_create", "variant_to_update"):
-            for row in (j.get(key) or []):
-                sku = (row or {}).get("sku")
-                if sku:
-                    targets.add(sku)
-        return targets
-
     # 1) Decide target SKUs
-    preview_targets = _load_preview_targets()
+    preview_targets = load_preview_targets()
     user_targets = set((skus_to_sync or []))
 
     if user_targets:
@@ -546,7 +657,7 @@ async def sync_products_partial(
                 len(targets), ", ".join(targets[:10]), (" …" if len(targets) > 10 else ""))
 
     # 2) Prepare ERP/Woo context (ERP loads enough to resolve families & attrs)
-    ctx = await _prepare_context(dry_run=dry_run, skus=list(targets))
+    ctx = await _prepare_context(dry_run=dry_run, skus=list(targets), prefetched=prefetched)
 
     # 3) Filter the variant_matrix down to ONLY the selected SKUs
     filtered_matrix: Dict[str, Dict[str, Any]] = {}
@@ -583,17 +694,12 @@ async def sync_products_partial(
             wc_products_filtered.append(p)
 
     # 5) Run the sync on the filtered subset; tell sync_all to preserve parent attrs/images on update
-    sync_report = await sync_all_templates_and_variants(
-        variant_matrix=filtered_matrix,
-        wc_products=wc_products_filtered,
-        wc_cat_map=ctx["wc_cat_map"],
-        price_map=ctx["price_map"],
-        attribute_map=ctx["attribute_map"],
-        stock_map=ctx["stock_map"],
-        attribute_order=ctx["attribute_order_for_preview"],
+    sync_report = await _run_core(
+        ctx,
         dry_run=dry_run,
         preserve_parent_attrs_on_update=True,   # avoid shrinking options/images in partial
-        erp_items=ctx.get("erp_items"),         # keep shipping_params complete
+        variant_matrix=filtered_matrix,
+        wc_products=wc_products_filtered,
     )
 
     # 6) Optionally refresh preview in the background (OFF by default to avoid double-runs in logs)
@@ -602,17 +708,7 @@ async def sync_products_partial(
         async def _refresh():
             try:
                 ctx2 = await _prepare_context(dry_run=True, skus=None)
-                snap = await sync_all_templates_and_variants(
-                    variant_matrix=ctx2["variant_matrix"],
-                    wc_products=ctx2["wc_products"],
-                    wc_cat_map=ctx2["wc_cat_map"],
-                    price_map=ctx2["price_map"],
-                    attribute_map=ctx2["attribute_map"],
-                    stock_map=ctx2["stock_map"],
-                    attribute_order=ctx2["attribute_order_for_preview"],
-                    dry_run=True,
-                    preserve_parent_attrs_on_update=True,
-                )
+                snap = await _run_core(ctx2, dry_run=True, preserve_parent_attrs_on_update=True)
                 save_preview_to_file(snap, source="post-partial", dry_run=True, skus=None)
             except Exception as ie:
                 logger.warning("[PARTIAL] post-sync preview refresh failed: %s", ie)
@@ -633,6 +729,146 @@ async def sync_products_partial(
         },
     }
 
+# --- DELTA SYNC ---
+
+def _load_last_sync_ts() -> Optional[str]:
+    try:
+        with open(LAST_SYNC_PATH, "r", encoding="utf-8") as f:
+            return (json.load(f) or {}).get("erp_items_modified") or None
+    except Exception:
+        return None
+
+def _save_last_sync_ts(ts: str) -> None:
+    _atomic_write_json(LAST_SYNC_PATH, {"erp_items_modified": ts})
+
+def _load_sku_cache() -> Dict[str, str]:
+    """{sku: erp_fingerprint} from the last successful delta run ({} on version mismatch)."""
+    try:
+        with open(SKU_CACHE_PATH, "r", encoding="utf-8") as f:
+            obj = json.load(f) or {}
+    except Exception:
+        return {}
+    if obj.get("version") != _SKU_CACHE_VERSION:
+        logger.info("[DELTA] SKU cache version %s != %s; rebuilding", obj.get("version"), _SKU_CACHE_VERSION)
+        return {}
+    return obj.get("items") or {}
+
+def _save_sku_cache(items: Dict[str, str]) -> None:
+    _atomic_write_json(SKU_CACHE_PATH, {"version": _SKU_CACHE_VERSION, "items": items})
+
+def _erp_fingerprint(price: Any, qty: float) -> str:
+    """Hash of the ERP values that drive a Woo write without bumping Item.modified (price, stock)."""
+    raw = json.dumps([price, qty], default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+def _item_code(it: dict) -> Optional[str]:
+    return it.get("item_code") or it.get("name")
+
+def _changed_families(erp_items: List[dict], changed_codes: set) -> List[dict]:
+    """Rows of `erp_items` sharing a template or SKU base with any changed code (list order kept)."""
+    families, bases = set(), set()
+    for it in erp_items:
+        code = _item_code(it)
+        if code in changed_codes:
+            families.add(it.get("variant_of") or code)
+            bases.add(guess_parent_code_from_sku(it.get("item_code") or ""))
+    bases.discard(None)
+    return [
+        it for it in erp_items
+        if _item_code(it) in changed_codes
+        or _item_code(it) in families
+        or it.get("variant_of") in families
+        or guess_parent_code_from_sku(it.get("item_code") or "") in bases
+    ]
+
+async def sync_products_delta(dry_run: bool = False) -> Dict[str, Any]:
+    """
+    Delta sync driven by ERPNext Item.modified plus a per-SKU price/stock fingerprint cache:
+      - Read the last watermark (max Item.modified seen on the previous successful run).
+      - No watermark yet → run a full sync and seed watermark + cache.
+      - Otherwise only Items modified past the watermark are listed from ERP; a SKU is changed
+        when it is in that list OR its price/stock fingerprint differs from wc_sku_cache.json
+        (Item Price / Bin edits don't bump Item.modified).
+      - Only when something changed is the full Item list read, once, to pull in each changed
+        SKU's family (template, siblings, SKU base); that subset goes through a partial sync
+        with the reads passed along (Woo looked up by SKU, no full catalog listing).
+      - Watermark and cache advance only on real runs; SKUs that errored keep their old entry.
+    An empty / outdated cache falls back to the watermark alone for that run and is rebuilt.
+    """
+    last_ts = _load_last_sync_ts()
+    logger.info("🔁 [SYNC] Starting DELTA ERPNext → Woo sync (since=%s, dry_run=%s)", last_ts or "-", dry_run)
+
+    # No watermark → modified_since=None lists every Item
+    modified_items, (price, stock_map) = await asyncio.gather(
+        get_erpnext_items(modified_since=last_ts),
+        asyncio.gather(
+            resolve_price_map(get_price_map, settings.ERP_SELLING_PRICE_LIST),
+            get_stock_map(),
+        ),
+    )
+    price_map = price[0]
+    qty_by_code: Dict[str, float] = defaultdict(float)
+    for (code, _wh), qty in stock_map.items():
+        qty_by_code[code] += qty or 0
+
+    def _fp(code: str) -> str:
+        return _erp_fingerprint(price_map.get(code), qty_by_code.get(code, 0.0))
+
+    sku_cache = _load_sku_cache()
+    new_ts = max((str(it.get("modified")) for it in modified_items if it.get("modified")), default=last_ts)
+
+    if not last_ts:
+        erp_items = modified_items
+        result = await sync_products_full(
+            dry_run=dry_run,
+            prefetched={"erp_items": erp_items, "price": price, "stock_map": stock_map},
+        )
+    else:
+        changed_codes = {_item_code(it) for it in modified_items}
+        changed_codes.update(c for c, fp in sku_cache.items() if fp != _fp(c))
+        changed_codes.discard(None)
+        if not changed_codes:
+            if not dry_run and not sku_cache:
+                _save_sku_cache({c: _fp(c) for c in filter(None, map(_item_code, await get_erpnext_items()))})
+            logger.info("[DELTA] No ERP Items changed since %s. Nothing to do.", last_ts)
+            return {"since": last_ts, "changed": [], "dry_run": dry_run}
+
+        erp_items = await get_erpnext_items()
+        known = {_item_code(it) for it in erp_items}
+        changed_codes &= known  # cached SKUs no longer listed (disabled / deleted) are dropped
+        subset = _changed_families(erp_items, changed_codes)
+        logger.info("[DELTA] %d changed SKU(s), %d family row(s) (cache=%d entries)",
+                    len(changed_codes), len(subset), len(sku_cache))
+        result = await sync_products_partial(
+            sorted(changed_codes),
+            dry_run=dry_run,
+            respect_preview=False,
+            prefetched={"erp_items": subset, "all_erp_items": erp_items, "price": price, "stock_map": stock_map},
+        )
+
+    sync_report = result.get("sync_report") or {}
+    errors = sync_report.get("errors") or []
+
+    if not dry_run:
+        failed = {e.get("sku") for e in errors if isinstance(e, dict)}
+        items: Dict[str, str] = {}
+        for it in erp_items:
+            code = _item_code(it)
+            if not code:
+                continue
+            if code in failed:
+                if code in sku_cache:
+                    items[code] = sku_cache[code]
+                continue
+            items[code] = _fp(code)
+        _save_sku_cache(items)
+        if not errors and new_ts:
+            _save_last_sync_ts(new_ts)
+
+    result["since"] = last_ts
+    result["watermark"] = new_ts
+    return result
+
 # =========================
 # 4. Core preview/sync
 # =========================
@@ -680,10 +916,23 @@ async def sync_all_templates_and_variants(
     # -------------------------
     # Helpers (local, no import)
     # -------------------------
-    import json, asyncio, re, os, unicodedata, httpx, html
+    import json, asyncio, re, os, unicodedata, html
     from collections import Counter, defaultdict
     from os.path import basename
 
+    # SKU → total qty across warehouses, built once (the per-SKU scan of stock_map was O(N²))
+    stock_by_code: Dict[str, float] = {}
+    try:
+        if isinstance(stock_map, dict):
+            for (code, _wh), q in stock_map.items():
+                try:
+                    q = float(q or 0)
+                except Exception:
+                    q = 0.0
+                stock_by_code[code] = stock_by_code.get(code, 0.0) + q
+    except Exception:
+        stock_by_code = {}
+
     # ---- Text normalization helpers ----
     def _samp(s: str, n: int = 120) -> str:
         try:
@@ -694,18 +943,18 @@ async def sync_all_templates_and_variants(
         return (t[:n] + "…") if len(t) > n else t
 
     def _strip_html(text: str) -> str:
-        t = re.sub(r"(?is)<(script|style)[^>]*>.*?</\1>", " ", text or "")
-        t = re.sub(r"(?is)<br\s*/?>", " ", t)
-        t = re.sub(r"(?is)</p\s*>", " ", t)
-        t = re.sub(r"(?is)<[^>]+>", " ", t)
+        t = _RE_SCRIPT_STYLE.sub(" ", text or "")
+        t = _RE_BR.sub(" ", t)
+        t = _RE_P_CLOSE.sub(" ", t)
+        t = _RE_TAG.sub(" ", t)
         return t
 
     def _normalize_punct(text: str) -> str:
         t = html.unescape(text or "")
         t = t.replace("–", "-").replace("—", "-")
         t = t.replace("\u00A0", " ")
-        t = re.sub(r"\s*-\s*", " - ", t)
-        t = re.sub(r"\s+", " ", t).strip()
+        t = _RE_DASH_SPACING.sub(" - ", t)
+        t = _RE_WS.sub(" ", t).strip()
         return t
 
     def _norm_long(text: str) -> str:
@@ -756,8 +1005,8 @@ async def sync_all_templates_and_variants(
 
     def _normalize_size_label(val: str) -> str:
         s = str(val or "")
-        s = re.sub(r"\s*[xX×]\s*", " x ", s)
-        s = re.sub(r"\s+", " ", s).strip()
+        s = _RE_SIZE_X.sub(" x ", s)
+        s = _RE_WS.sub(" ", s).strip()
         return s
 
     def _now_iso():
@@ -799,17 +1048,11 @@ async def sync_all_templates_and_variants(
         last_exc = None
         for attempt in range(1, max_attempts + 1):
             try:
-                async with httpx.AsyncClient(timeout=timeout, verify=False, auth=auth) as client:
-                    if method == "GET":
-                        return await client.get(url)
-                    elif method == "POST":
-                        return await client.post(url, json=json)
-                    elif method == "PUT":
-                        return await client.put(url, json=json)
-                    elif method == "DELETE":
-                        return await client.delete(url, json=json)
-                    else:
-                        raise ValueError(f"Unsupported method: {method}")
+                if method not in ("GET", "POST", "PUT", "DELETE"):
+                    raise ValueError(f"Unsupported method: {method}")
+                return await get_client().request(
+                    method, url, auth=auth, json=None if method == "GET" else json, timeout=timeout
+                )
             except Exception as e:
                 last_exc = e
                 delay = 0.5 * (2 ** (attempt - 1))
@@ -874,6 +1117,19 @@ async def sync_all_templates_and_variants(
                 await asyncio.sleep(delay)
         raise last_exc
 
+    async def _upload_many(urls: list[str], log_tag: str) -> list[int]:
+        """Upload/resolve media for urls with bounded concurrency; returns ids in input order (failures dropped)."""
+        async def _one(u: str) -> Optional[int]:
+            async with _UPLOAD_SEM:
+                try:
+                    mid = await _upload_with_retry(u, basename(u))
+                    return int(mid) if mid else None
+                except Exception as e:
+                    logger.error(f"[IMG]{log_tag} upload failed for {u}: {e}")
+                    return None
+        results = await asyncio.gather(*(_one(u) for u in urls))
+        return [mid for mid in results if mid]
+
     # ---------- Image key normalization (robust) ----------
     def _media_key_from_url(u: str) -> str:
         """
@@ -892,15 +1148,15 @@ async def sync_all_templates_and_variants(
             name = unicodedata.normalize("NFKD", name)
 
             # strip WP size/duplicate suffixes before punctuation removal
-            name = re.sub(r"-(?:\d+x\d+)(?=\.[a-z0-9]+$)", "", name)  # -1536x1024
-            name = re.sub(r"-scaled(?=\.[a-z0-9]+$)", "", name)       # -scaled
-            name = re.sub(r"-(\d+)(?=\.[a-z0-9]+$)", "", name)        # -1, -2, ...
+            name = _RE_WP_SIZE_SUFFIX.sub("", name)  # -1536x1024
+            name = _RE_WP_SCALED.sub("", name)       # -scaled
+            name = _RE_WP_DUP_SUFFIX.sub("", name)   # -1, -2, ...
 
             name = name.replace("(", "").replace(")", "")
-            name = re.sub(r"\s+", " ", name)
+            name = _RE_WS.sub(" ", name)
 
             # collapse to alphanumerics so hyphens/underscores/spaces don't matter
-            name = re.sub(r"[^a-z0-9]", "", name)
+            name = _RE_NON_ALNUM.sub("", name)
             return name
         except Exception:
             return ""
@@ -955,24 +1211,23 @@ async def sync_all_templates_and_variants(
     async def _load_brand_id_cache():
         if brand_id_cache:
             return
-        auth = (settings.WP_USERNAME, settings.WP_PASSWORD)
+        client = get_wp_client()
         page = 1
-        async with httpx.AsyncClient(timeout=20.0, verify=False, auth=auth) as client:
-            while True:
-                r = await client.get(f"{WP_BRAND_API}?per_page=100&page={page}")
-                if r.status_code != 200:
-                    break
-                arr = r.json() or []
-                if not arr:
-                    break
-                for b in arr:
-                    name = (b.get("name") or "").strip()
-                    bid = b.get("id")
-                    if name and bid:
-                        brand_id_cache[name.lower()] = int(bid)
-                if len(arr) < 100:
-                    break
-                page += 1
+        while True:
+            r = await client.get(f"{WP_BRAND_API}?per_page=100&page={page}")
+            if r.status_code != 200:
+                break
+            arr = r.json() or []
+            if not arr:
+                break
+            for b in arr:
+                name = (b.get("name") or "").strip()
+                bid = b.get("id")
+                if name and bid:
+                    brand_id_cache[name.lower()] = int(bid)
+            if len(arr) < 100:
+                break
+            page += 1
 
     def _brand_payload(brand_name: Optional[str]) -> list[dict]:
         if not brand_name:
@@ -1168,6 +1423,12 @@ async def sync_all_templates_and_variants(
     shipping_existing = _load_json_or_empty(SHIPPING_PARAMS_PATH)
     await _load_brand_id_cache()
 
+    # Woo image sizes come from WP media metadata, looked up only once some compared image
+    # has an unknown size (include=<ids>, or one library listing for big runs);
+    # images missing a filesize there fall back to HEAD probes.
+    wc_media_sizes: Dict[str, tuple] = {}
+    wc_media_seeded = False
+
     # -----------------
     # Main family loop
     # -----------------
@@ -1313,15 +1574,9 @@ async def sync_all_templates_and_variants(
 
             if not dry_run and parent_gallery_rel:
                 # Upload to WP, build payload
-                media_ids = []
-                for fu in parent_gallery_rel:
-                    absu = _abs_erp_file_url(fu)
-                    try:
-                        mid = await _upload_with_retry(absu, basename(absu))
-                        if mid:
-                            media_ids.append(int(mid))
-                    except Exception as e:
-                        logger.error(f"[IMG][PARENT][UPLOAD] {template_code} failed: {e}")
+                media_ids = await _upload_many(
+                    [_abs_erp_file_url(fu) for fu in parent_gallery_rel], f"[PARENT][UPLOAD] {template_code}"
+                )
                 parent_media_ids = media_ids[:]
                 parent_images_payload = [{"id": mid, "position": idx} for idx, mid in enumerate(media_ids)]
                 logger.info(f"[IMG][PARENT][UPLOAD OK] {template_code} uploaded={len(parent_images_payload)} ids={parent_media_ids}")
@@ -1392,7 +1647,6 @@ async def sync_all_templates_and_variants(
 
             # CATEGORY
             categories = [normalize_category_name(variant.get("item_group") or template_item.get("item_group") or "Products")]
-            _ = [wc_cat_map.get(cat) for cat in categories if cat in wc_cat_map]
 
             # DESCRIPTION (ERP side for comparison + payloads)
             if is_variable:
@@ -1429,9 +1683,6 @@ async def sync_all_templates_and_variants(
                 if absu and absu not in erp_urls_abs:
                     erp_urls_abs.append(absu)
 
-            erp_sizes = await _head_sizes_for_urls(erp_urls_abs) if erp_urls_abs else []
-            erp_gallery = [{"url": u, "size": (erp_sizes[idx] if idx < len(erp_sizes) else 0)} for idx, u in enumerate(erp_urls_abs)]
-
             # For PREVIEW on variations: use existing variation object if available
             if is_variable and not wc_prod and existing_var_map_preview:
                 size_opt = (attributes_values.get("Sheet Size") or "").lower()
@@ -1449,11 +1700,42 @@ async def sync_all_templates_and_variants(
                     vimg = wc_prod.get("image")
                     if isinstance(vimg, dict) and vimg.get("src"):
                         wc_urls.append(vimg["src"])
-            wc_sizes = await _head_sizes_for_urls(wc_urls) if wc_urls else []
+
+            # Unchanged ERP gallery since our last write ⇒ no need to probe any sizes
+            img_sig = _gallery_signature(erp_urls_abs)
+            sig_match = bool(img_sig) and not force_gallery and _meta_value(wc_prod, IMG_SIG_META_KEY) == img_sig
+            if sig_match:
+                erp_sizes, wc_sizes = [0] * len(erp_urls_abs), []
+            else:
+                if any(u not in wc_media_sizes for u in wc_urls):
+                    media_ids = _wc_image_ids(wc_prod)
+                    if not wc_media_seeded:
+                        # first miss: resolve every in-scope Woo product's images in one go
+                        wc_media_seeded = True
+                        for prod in wc_products or []:
+                            media_ids.extend(_wc_image_ids(prod))
+                    try:
+                        wc_media_sizes.update(await get_wc_media_sizes(media_ids))
+                    except Exception as e:
+                        logger.warning("[IMG] WP media sizes unavailable, falling back to HEAD probes: %s", e)
+                    for u in wc_urls:
+                        wc_media_sizes.setdefault(u, (None, 0))
+                wc_missing = [u for u in wc_urls if not wc_media_sizes[u][1]]
+                # ERP + remaining Woo size probes are independent; run them together
+                erp_sizes, wc_probed = await asyncio.gather(
+                    _head_sizes_for_urls(erp_urls_abs),
+                    _head_sizes_for_urls(wc_missing),
+                )
+                wc_probed_by_url = dict(zip(wc_missing, wc_probed))
+                wc_sizes = [wc_media_sizes[u][1] or wc_probed_by_url.get(u, 0) for u in wc_urls]
+            erp_gallery = [{"url": u, "size": (erp_sizes[idx] if idx < len(erp_sizes) else 0)} for idx, u in enumerate(erp_urls_abs)]
             wc_gallery_for_compare = [{"url": u, "size": (wc_sizes[idx] if idx < len(wc_sizes) else 0)} for idx, u in enumerate(wc_urls)]
 
             # -------------- VARIATION image compare (tolerant) --------------
-            if is_variable:
+            if sig_match:
+                gallery_diff = False
+                logger.debug("[IMG][PREVIEW] sku=%s gallery signature unchanged; size probes skipped", sku)
+            elif is_variable:
                 if force_gallery:
                     gallery_diff = True
                     ek = _media_key_from_url(_erp_variation_primary_url(erp_gallery) or "")
@@ -1493,21 +1775,7 @@ async def sync_all_templates_and_variants(
                     logger.info("[IMG][PREVIEW] sku=%s gallery differs (erp=%d, woo=%d)", sku, len(erp_gallery), len(wc_gallery_for_compare))
 
             # STOCK
-            stock_q = None
-            try:
-                total = 0.0
-                found = False
-                if isinstance(stock_map, dict):
-                    for (code, _wh), q in stock_map.items():
-                        if code == sku:
-                            try:
-                                total += float(q or 0)
-                            except Exception:
-                                pass
-                            found = True
-                stock_q = total if found else None
-            except Exception:
-                stock_q = None
+            stock_q = stock_by_code.get(sku)
 
             if stock_q is None:
                 for key in ("stock_qty", "actual_qty", "available_qty", "qty", "quantity"):
@@ -1660,8 +1928,8 @@ async def sync_all_templates_and_variants(
                         if parent_images_payload:
                             assigned = pdata.get("images") or []
                             assigned_ids = _trim_ids(assigned)
-                            want_ids = [img["id"] for img in parent_images_payload]
-                            if sorted(assigned_ids) != sorted(want_ids):
+                            want_ids = {img["id"] for img in parent_images_payload}
+                            if set(assigned_ids) != want_ids:
                                 logger.info("[IMG][PARENT][CORRECT] %s have=%s want=%s", parent_sku, assigned_ids, want_ids)
                                 auth_w = (settings.WC_API_KEY, settings.WC_API_SECRET)
                                 _ = await _request_with_retry("PUT", f"{WC_API}/products/{parent_id_for_vars}", auth=auth_w, json={"images": parent_images_payload})
@@ -1669,7 +1937,7 @@ async def sync_all_templates_and_variants(
                             try:
                                 fresh_parent = await _get_product_by_id(parent_id_for_vars)
                                 final_ids = _trim_ids((fresh_parent or {}).get("images") or [])
-                                logger.info("[IMG][PARENT][POST] %s final_ids=%s match=%s", parent_sku, final_ids, sorted(final_ids) == sorted([img["id"] for img in parent_images_payload]))
+                                logger.info("[IMG][PARENT][POST] %s final_ids=%s match=%s", parent_sku, final_ids, set(final_ids) == want_ids)
                             except Exception as ie:
                                 logger.debug("[IMG][PARENT][VERIFY ERR] %s", ie)
 
@@ -1717,6 +1985,7 @@ async def sync_all_templates_and_variants(
 
                     if var_image_id:
                         var_payload["image"] = {"id": var_image_id}
+                        var_payload["meta_data"] = [{"key": IMG_SIG_META_KEY, "value": img_sig}]
 
                     var_ship_rec = (((shipping_existing.get("variables") or {}).get(parent_sku) or {}).get("variations") or {}).get(sku)
                     await _apply_shipping_to_product_payload(var_payload, var_ship_rec, create_class=True)
@@ -1770,13 +2039,7 @@ async def sync_all_templates_and_variants(
                 image_ids = []
                 if erp_gallery:
                     logger.info(f"[IMG][SIMPLE][UPLOAD] sku={sku} count={len(erp_gallery)}")
-                for img in erp_gallery:
-                    try:
-                        mid = await _upload_with_retry(img["url"], basename(img["url"]))
-                        if mid:
-                            image_ids.append(int(mid))
-                    except Exception as e:
-                        logger.error(f"[IMG][SIMPLE] upload failed for {sku}: {e}")
+                    image_ids = await _upload_many([img["url"] for img in erp_gallery], f"[SIMPLE] {sku}")
                 images_payload = [{"id": mid, "position": idx} for idx, mid in enumerate(image_ids)]
 
                 erp_desc_simple = variant.get("description") or template_item.get("description") or ""
@@ -1793,6 +2056,8 @@ async def sync_all_templates_and_variants(
                     "short_description": erp_desc_simple or "",
                     "images": images_payload if images_payload else [],
                 }
+                if image_ids and len(image_ids) == len(erp_gallery):
+                    payload["meta_data"] = [{"key": IMG_SIG_META_KEY, "value": img_sig}]
                 # Price safety: don't zero out prices on updates
                 if price is not None:
                     payload["regular_price"] = _price_str(price)
@@ -1828,8 +2093,8 @@ async def sync_all_templates_and_variants(
                     # Correct and verify images if needed
                     assigned = sdata.get("images") or []
                     assigned_ids = _trim_ids(assigned)
-                    want_ids = [img["id"] for img in images_payload]
-                    if images_payload and sorted(assigned_ids) != sorted(want_ids):
+                    want_ids = {img["id"] for img in images_payload}
+                    if images_payload and set(assigned_ids) != want_ids:
                         logger.info("[IMG][SIMPLE][CORRECT] %s have=%s want=%s", sku, assigned_ids, want_ids)
                         auth_w = (settings.WC_API_KEY, settings.WC_API_SECRET)
                         _ = await _request_with_retry("PUT", f"{WC_API}/products/{sdata['id']}", auth=auth_w, json={"images": images_payload})
@@ -1837,7 +2102,7 @@ async def sync_all_templates_and_variants(
                         try:
                             fresh = await _get_product_by_id(sdata["id"])
                             final_ids = _trim_ids((fresh or {}).get("images") or [])
-                            logger.info("[IMG][SIMPLE][POST] %s final_ids=%s match=%s", sku, final_ids, sorted(final_ids) == sorted(want_ids))
+                            logger.info("[IMG][SIMPLE][POST] %s final_ids=%s match=%s", sku, final_ids, set(final_ids) == want_ids)
                         except Exception as ie:
                             logger.debug("[IMG][SIMPLE][VERIFY ERR] %s", ie)
 
@@ -7,29 +7,41 @@
 # - Attribute parsing (robust to single or multiple forms)
 # ============================
 
+import asyncio
 import html
-import httpx
 import logging
 import json
+import orjson
 import os
+import re
+import time
 
+from collections import defaultdict
+from functools import lru_cache
 from datetime import datetime, timezone
-from typing import Optional, List
+from typing import Dict, Optional, List
 from pathlib import Path
 from decimal import Decimal, ROUND_HALF_UP
 from urllib.parse import urlparse, quote
-from app.erp.erpnext import get_erpnext_categories
+from app.erp.erpnext import get_erpnext_categories, get_price_map, get_stock_map
 from app.woo.woocommerce import (
     get_wc_categories, 
     create_wc_category, 
-    update_wc_product, 
-    create_wc_product,
+    batch_wc_products,
+    fetch_all_pages,
 )
 from app.mapping.field_mapping import (
     get_wc_sync_fields, 
     map_erp_to_wc_product,
 )
 from app.config import settings
+from app.http_client import get_client, get_erp_client, get_wc_client, get_wp_client
+from app.ttl_cache import async_ttl_cache, invalidate
+
+try:  # C-backed HTML → text for description diffs; regex fallback below when missing
+    from selectolax.parser import HTMLParser as _HTMLParser
+except ImportError:  # pragma: no cover
+    _HTMLParser = None
 
 ERP_URL = settings.ERP_URL
 ERP_API_KEY = settings.ERP_API_KEY
@@ -54,10 +66,19 @@ def _mapping_dir() -> Path:
     fallback.mkdir(parents=True, exist_ok=True)
     return fallback
 
-_PREVIEW_PATH = os.path.join(_mapping_dir(), "products_to_sync.json")
+_PREVIEW_PATH = os.path.join(_mapping_dir(), "products_to_sync.ndjson")
+_LEGACY_PREVIEW_PATH = os.path.join(_mapping_dir(), "products_to_sync.json")
 
 # --- Category & Name Utilities ---
 
+# ERP rows carry the SKU under different keys depending on source (API list vs legacy export)
+_SKU_KEYS = ("item_code", "Item Code", "name")
+
+def _sku(item):
+    """First non-empty SKU key of an ERP row, else None."""
+    return next((v for k in _SKU_KEYS if (v := item.get(k))), None)
+
+@lru_cache(maxsize=4096)
 def normalize_category_name(name):
     if not name:
         return ""
@@ -70,6 +91,16 @@ def build_wc_cat_map(wc_categories):
     return {normalize_category_name(cat["name"]): cat["id"] for cat in wc_categories}
 
 def format_wc_price(value) -> str:
+    # Fast paths (the usual ERP price_list_rate shapes): ints, and floats whose repr has at
+    # most 2 decimals, format exactly without building a Decimal
+    if not value:
+        return "0.00"
+    if type(value) is int:
+        return f"{value}.00"
+    if type(value) is float:
+        r = repr(value)
+        if "e" not in r and "n" not in r and len(r.partition(".")[2]) <= 2:
+            return f"{value:.2f}"
     try:
         d = Decimal(str(value or 0)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
         # avoid scientific notation and guarantee 2 decimals
@@ -102,30 +133,119 @@ async def sync_categories(dry_run=False):
 
 # --- Image Utilities ---
 
+# URL bases without trailing slash, so joins below don't strip per call
+_WC_BASE = WC_BASE_URL.rstrip("/")
+_ERP_BASE = ERP_URL.rstrip("/")
+
+@lru_cache(maxsize=8192)
 def normalize_woo_image_url(src):
     """Ensure Woo image URLs are absolute, regardless of how they are stored."""
-    base = WC_BASE_URL.rstrip("/")
-    parsed = urlparse(src)
-    return base + parsed.path
+    return _WC_BASE + urlparse(src).path
+
+_ERP_FILE_HEADERS = {"Authorization": f"token {ERP_API_KEY}:{ERP_API_SECRET}"}
+
+@lru_cache(maxsize=8192)
+def _encode_erp_url(raw: str) -> str:
+    """ERP file URL/path → absolute ERP URL with a percent-encoded path."""
+    parsed = urlparse(raw.strip())
+    return _ERP_BASE + quote(parsed.path, safe="/:")
+
+# --- Persistent image size cache (ETag revalidation) ---
+# {url: {"size": int, "etag": str|None, "exp": epoch}}. Fresh entries skip the HEAD entirely;
+# expired ones are revalidated with If-None-Match (304 → keep size, extend TTL). On network
+# errors a stale entry is served rather than failing the comparison.
+
+IMG_SIZE_CACHE_PATH = os.path.join(_mapping_dir(), "img_size_cache.json")
+_IMG_SIZE_TTL = 24 * 3600
+
+_img_size_cache: Optional[dict] = None
+_img_size_dirty = False
+
+def _load_img_size_cache() -> dict:
+    global _img_size_cache
+    if _img_size_cache is None:
+        try:
+            with open(IMG_SIZE_CACHE_PATH, "r", encoding="utf-8") as f:
+                _img_size_cache = json.load(f) or {}
+        except Exception:
+            _img_size_cache = {}
+    return _img_size_cache
+
+def remember_image_size(url: str, size: int, etag: Optional[str] = None) -> None:
+    """Record a size learned some other way (e.g. ranged GET fallback)."""
+    global _img_size_dirty
+    if not url or not size:
+        return
+    _load_img_size_cache()[url] = {"size": int(size), "etag": etag, "exp": time.time() + _IMG_SIZE_TTL}
+    _img_size_dirty = True
+
+def flush_img_size_cache() -> None:
+    """Persist the size cache if it changed (call once at the end of a sync pass)."""
+    global _img_size_dirty
+    if not _img_size_dirty or _img_size_cache is None:
+        return
+    try:
+        _atomic_write_json(IMG_SIZE_CACHE_PATH, _img_size_cache)
+        _img_size_dirty = False
+    except Exception as e:
+        logger.warning("[IMG] could not persist size cache: %s", e)
+
+# In-flight HEADs by URL: concurrent callers for the same image (variant families share
+# gallery files) await one request instead of each issuing their own
+_head_inflight: Dict[str, asyncio.Future] = {}
+
+async def etag_head_size(client, url: str, headers: Optional[dict] = None) -> Optional[int]:
+    """
+    Content-Length for `url` via the size cache: fresh hit → no request; otherwise HEAD with
+    If-None-Match. Returns None when HEAD gives no size (callers may fall back to a ranged GET).
+    Concurrent misses for the same URL share a single HEAD.
+    """
+    entry = _load_img_size_cache().get(url)
+    if entry and entry.get("exp", 0) > time.time():
+        return entry["size"]
+
+    fut = _head_inflight.get(url)
+    if fut is None:
+        fut = asyncio.ensure_future(_revalidate_size(client, url, headers, entry))
+        _head_inflight[url] = fut
+        fut.add_done_callback(lambda _f: _head_inflight.pop(url, None))
+    # shield: one caller being cancelled must not cancel the HEAD the others wait on
+    return await asyncio.shield(fut)
+
+async def _revalidate_size(client, url: str, headers: Optional[dict], entry: Optional[dict]) -> Optional[int]:
+    global _img_size_dirty
+    req_headers = dict(headers or {})
+    if entry and entry.get("etag"):
+        req_headers["If-None-Match"] = entry["etag"]
+    try:
+        resp = await client.head(url, headers=req_headers, timeout=15.0, follow_redirects=True)
+    except Exception as e:
+        logger.debug("[IMG] HEAD failed for %s: %s", url, e)
+        return entry["size"] if entry else None
+
+    if resp.status_code == 304 and entry:
+        entry["exp"] = time.time() + _IMG_SIZE_TTL
+        _img_size_dirty = True
+        return entry["size"]
+    if resp.status_code == 200:
+        val = resp.headers.get("content-length")
+        if val and val.isdigit() and int(val) > 0:
+            remember_image_size(url, int(val), resp.headers.get("etag"))
+            return int(val)
+    return None
 
 async def get_image_size_with_fallback(erp_url):
     """
     Get image size from ERPNext via HEAD request (auth required for private files).
     Returns (size:int, full_url:str, headers:dict) or (None, None, None) if failed.
     """
-    parsed = urlparse(erp_url.strip())
-    encoded_path = quote(parsed.path, safe="/:")
-    url = ERP_URL + encoded_path
-
-    headers = {
-        "Authorization": f"token {ERP_API_KEY}:{ERP_API_SECRET}"
-    }
+    url = _encode_erp_url(erp_url)
+    headers = _ERP_FILE_HEADERS
 
     try:
-        async with httpx.AsyncClient(timeout=15.0, verify=False) as client:
-            resp = await client.head(url, headers=headers)
-            if resp.status_code == 200 and "content-length" in resp.headers:
-                return int(resp.headers["content-length"]), url, headers
+        size = await etag_head_size(get_client(), url, headers)
+        if size is not None:
+            return size, url, headers
     except Exception as e:
         logger.warning(f"[ERP IMG FETCH] Exception: {e} for {url}")
 
@@ -133,24 +253,53 @@ async def get_image_size_with_fallback(erp_url):
 
 async def get_image_size(url, headers=None):
     """
-    Get image size via HEAD or GET (WooCommerce/public image).
+    Get image size via HEAD, falling back to a 1-byte ranged GET (WooCommerce/public image).
     """
     url = normalize_woo_image_url(url)
+    client = get_client()
     try:
-        async with httpx.AsyncClient(timeout=15.0, verify=False) as client:
-            resp = await client.head(url, headers=headers)
-            if resp.status_code == 200 and "content-length" in resp.headers:
-                return int(resp.headers["content-length"])
-            elif resp.status_code == 200:
-                get_resp = await client.get(url, headers=headers)
-                if get_resp.status_code == 200:
-                    return len(get_resp.content)
+        size = await etag_head_size(client, url, headers)
+        if size is not None:
+            return size
+        get_resp = await client.get(url, headers={**(headers or {}), "Range": "bytes=0-0"}, timeout=15.0)
+        if get_resp.status_code == 206:
+            # Content-Range: bytes 0-0/123456
+            total = get_resp.headers.get("content-range", "").rsplit("/", 1)[-1]
+            if total.isdigit():
+                remember_image_size(url, int(total), get_resp.headers.get("etag"))
+                return int(total)
+        elif get_resp.status_code == 200:
+            # Server ignored Range and sent the whole body
+            remember_image_size(url, len(get_resp.content), get_resp.headers.get("etag"))
+            return len(get_resp.content)
     except Exception:
         pass
     return None
 
 # --- Attribute/Variant Utilities ---
 
+# Woo attribute/term/brand id maps only change through our own creators, which
+# invalidate on success, so they can live for the length of a sync run
+_LOOKUP_TTL = 300
+
+# Caps fan-out of per-attribute / per-term REST calls so gather() doesn't open a connect storm
+_ATTR_FETCH_SEM = asyncio.Semaphore(20)
+
+async def _bounded(coro):
+    async with _ATTR_FETCH_SEM:
+        return await coro
+
+# Woo/WP throttle writes harder than reads; attribute/term/brand creation fans out narrower
+_WRITE_SEM = asyncio.Semaphore(8)
+
+async def _write_bounded(coro):
+    async with _WRITE_SEM:
+        return await coro
+
+# ERP export column pair carrying a single variant attribute
+_ATTR_COL = "Attribute (Variant Attributes)"
+_ATTR_VAL_COL = "Attribute Value (Variant Attributes)"
+
 def parse_variant_attributes(item):
     """
     Robustly parse variant attributes from ERPNext item data.
@@ -162,17 +311,15 @@ def parse_variant_attributes(item):
     attributes = {}
 
     # Check for column pair (legacy/frappe standard)
-    attr_col = "Attribute (Variant Attributes)"
-    val_col = "Attribute Value (Variant Attributes)"
-    if attr_col in item and val_col in item:
-        attr = item[attr_col]
-        val = item[val_col]
-        if attr and val:
-            attributes[attr] = val
+    attr = item.get(_ATTR_COL)
+    val = item.get(_ATTR_VAL_COL)
+    if attr and val:
+        attributes[attr] = val
 
     # Optionally, check for a list (future-proofing)
-    if "variant_attributes" in item and isinstance(item["variant_attributes"], list):
-        for entry in item["variant_attributes"]:
+    rows = item.get("variant_attributes")
+    if type(rows) is list:
+        for entry in rows:
             name = entry.get("attribute")
             value = entry.get("attribute_value")
             if name and value:
@@ -202,115 +349,193 @@ def get_variant_parent_code(item):
     """
     return item.get("Variant Of", "")
 
+# In-flight image lookups by (fetcher, item code): sibling variants gathering the same
+# template's images share one fetch; nothing is kept once it completes
+_image_list_inflight: Dict[tuple, asyncio.Future] = {}
+
 async def get_erp_image_list(item, get_erp_images_func):
     """
     Wraps your get_erp_images to always return a deduped, non-empty list.
+    Concurrent calls for the same item code share a single fetch.
     """
-    images = await get_erp_images_func(item)
-    return list(dict.fromkeys(images or []))
+    code = _sku(item) if isinstance(item, dict) else item
+    if not code:
+        return await _fetch_erp_image_list(item, get_erp_images_func)
+    key = (get_erp_images_func, code)
+    fut = _image_list_inflight.get(key)
+    if fut is None:
+        fut = asyncio.ensure_future(_fetch_erp_image_list(item, get_erp_images_func))
+        _image_list_inflight[key] = fut
+        fut.add_done_callback(lambda _f: _image_list_inflight.pop(key, None))
+    # copy: callers may extend their list; shield: keep the shared fetch alive on cancel
+    return list(await asyncio.shield(fut))
+
+async def _fetch_erp_image_list(item, get_erp_images_func) -> list:
+    images = await get_erp_images_func(item) or []
+    # Galleries are short (<10); a seen-set loop skips the intermediate dict
+    seen, out = set(), []
+    for u in images:
+        if u and u not in seen:  # drop None/"" rows ERP returns for empty image fields
+            seen.add(u)
+            out.append(u)
+    return out
 
 async def ensure_all_erp_attributes_exist_global():
     """
     Ensures ALL Item Attribute names/values from ERPNext exist as Woo global attributes and terms.
     Returns {attr_name: attr_id}, {attr_name: {option_name: term_id}}
     """
-    attr_map = await get_erpnext_item_attributes()
-    attr_id_map = await get_attribute_id_map()
-    # Step 1: create/check attributes
-    for attr in attr_map:
-        if attr not in attr_id_map:
-            attr_id = await create_attribute(attr)
-            if attr_id:
-                attr_id_map[attr] = attr_id
-            else:
-                logger.error(f"Could not create attribute '{attr}'")
-    # Step 2: create/check terms for each attribute
+    # ERP and Woo listings are independent reads
+    attr_map, attr_id_map = await asyncio.gather(get_erpnext_item_attributes(), get_attribute_id_map())
+    # Step 1: create all missing attributes concurrently
+    missing_attrs = [a for a in attr_map if a not in attr_id_map]
+    new_ids = await asyncio.gather(*(_write_bounded(create_attribute(a)) for a in missing_attrs), return_exceptions=True)
+    for attr, attr_id in zip(missing_attrs, new_ids):
+        if attr_id and not isinstance(attr_id, Exception):
+            attr_id_map[attr] = attr_id
+        else:
+            logger.error(f"Could not create attribute '{attr}'")
+    # Step 2: fetch every attribute's term map concurrently
+    attrs = [a for a in attr_map if attr_id_map.get(a)]
+    term_maps = await asyncio.gather(
+        *(_bounded(get_attribute_term_id_map(attr_id_map[a])) for a in attrs), return_exceptions=True
+    )
     attr_term_id_map = {}
-    for attr, options in attr_map.items():
-        attr_id = attr_id_map.get(attr)
-        if not attr_id:
+    for attr, terms in zip(attrs, term_maps):
+        if isinstance(terms, Exception):
+            # Treated as empty: the batch create below resolves existing terms via term_exists
+            logger.warning(f"Could not list terms for attribute '{attr}': {terms}")
+            terms = {}
+        attr_term_id_map[attr] = terms
+
+    # Step 3: create still-missing terms — one batch request per attribute (per 100 terms),
+    # all attributes concurrently
+    missing = {
+        attr: sorted(o for o in attr_map[attr] if o not in attr_term_id_map[attr])
+        for attr in attrs
+    }
+    missing = {a: opts for a, opts in missing.items() if opts}
+    created = await asyncio.gather(
+        *(_write_bounded(create_attribute_terms_batch(attr_id_map[a], opts)) for a, opts in missing.items()),
+        return_exceptions=True,
+    )
+    for attr, new_terms in zip(missing, created):
+        if isinstance(new_terms, Exception):
+            logger.error(f"Could not create terms for attribute '{attr}': {new_terms}")
             continue
-        term_id_map = await get_attribute_term_id_map(attr_id)
-        for option in options:
-            if option not in term_id_map:
-                term_id = await create_attribute_term(attr_id, option)
-                if term_id:
-                    term_id_map[option] = term_id
-        attr_term_id_map[attr] = term_id_map
+        attr_term_id_map[attr].update(new_terms)
     logger.info(f"Attributes ensured: {list(attr_id_map.keys())}")
     return attr_id_map, attr_term_id_map
 
+async def _erp_paged(path: str, params: Optional[dict] = None, page_size: int = 500):
+    """
+    Yield rows of an ERPNext /api/resource list, page by page via limit_start.
+    Stops on a short page, so a listing that fits in one page costs one request.
+    """
+    client = get_erp_client()
+    start = 0
+    while True:
+        resp = await client.get(path, params={**(params or {}), "limit_start": start, "limit_page_length": page_size})
+        if resp.status_code != 200:
+            logger.error(f"ERP list {path} failed at offset {start}: {resp.status_code} {resp.text[:300]}")
+            return
+        rows = orjson.loads(resp.content).get("data", []) or []
+        for row in rows:
+            yield row
+        if len(rows) < page_size:
+            return
+        start += page_size
+
 async def get_erpnext_item_attributes():
     """
     Fetch all global Item Attributes and their possible values from ERPNext.
     Returns dict {attr_name: set([value1, value2, ...])}
     """
-    headers = {"Authorization": f"token {ERP_API_KEY}:{ERP_API_SECRET}"}
+    client = get_erp_client()
 
-    # Step 1: Get all attribute names
-    url = f"{ERP_URL}/api/resource/Item Attribute?fields=[\"name\"]&limit_page_length=100"
-    async with httpx.AsyncClient(timeout=20.0, verify=False) as client:
-        resp = await client.get(url, headers=headers)
-        data = resp.json().get("data", []) if resp.status_code == 200 else []
-        attr_names = [row["name"] for row in data]
+    # Step 1: Get all attribute names (paged; a single 100-row request used to truncate)
+    attr_names = [row["name"] async for row in _erp_paged("/api/resource/Item Attribute", {"fields": '["name"]'})]
 
-    # Step 2: For each attribute, get all values
+    # Step 2: Fetch every attribute's values concurrently
+    responses = await asyncio.gather(
+        *(_bounded(client.get(f"/api/resource/Item Attribute/{quote(a, safe='')}")) for a in attr_names),
+        return_exceptions=True,
+    )
     attr_map = {}
-    for attr in attr_names:
-        url = f"{ERP_URL}/api/resource/Item Attribute/{attr}"
-        async with httpx.AsyncClient(timeout=20.0, verify=False) as client:
-            resp = await client.get(url, headers=headers)
-            doc = resp.json().get("data", {}) if resp.status_code == 200 else {}
-            values = set()
-            for row in doc.get("item_attribute_values", []):
-                v = row.get("attribute_value")
-                if v:
-                    values.add(v)
-            attr_map[attr] = values
+    for attr, resp in zip(attr_names, responses):
+        if isinstance(resp, Exception):
+            # One flaky attribute must not drop the whole map
+            logger.warning(f"Fetching ERP Item Attribute '{attr}' failed: {resp}")
+            attr_map[attr] = set()
+            continue
+        doc = resp.json().get("data", {}) if resp.status_code == 200 else {}
+        values = set()
+        for row in doc.get("item_attribute_values", []):
+            v = row.get("attribute_value")
+            if v:
+                values.add(v)
+        attr_map[attr] = values
     return attr_map
 
+@async_ttl_cache(_LOOKUP_TTL)
 async def get_attribute_id_map():
-    url = f"{WC_BASE_URL}/wp-json/wc/v3/products/attributes?per_page=100"
-    auth = (WC_API_KEY, WC_API_SECRET)
-    async with httpx.AsyncClient(timeout=20.0, verify=False) as client:
-        resp = await client.get(url, auth=auth)
-        if resp.status_code == 200:
-            return {a["name"]: a["id"] for a in resp.json()}
-    return {}
+    attrs = await fetch_all_pages(get_wc_client(), "/wp-json/wc/v3/products/attributes")
+    return {a["name"]: a["id"] for a in attrs}
 
 async def create_attribute(name):
-    url = f"{WC_BASE_URL}/wp-json/wc/v3/products/attributes"
-    auth = (WC_API_KEY, WC_API_SECRET)
-    async with httpx.AsyncClient(timeout=20.0, verify=False) as client:
-        resp = await client.post(url, auth=auth, json={"name": name})
-        if resp.status_code in (200, 201):
-            logger.info(f"Created Woo attribute '{name}' (id={resp.json()['id']})")
-            return resp.json()["id"]
-        else:
-            logger.error(f"Failed to create attribute '{name}': {resp.text}")
+    resp = await get_wc_client().post("/wp-json/wc/v3/products/attributes", json={"name": name})
+    if resp.status_code in (200, 201):
+        invalidate("get_attribute_id_map")
+        logger.info(f"Created Woo attribute '{name}' (id={resp.json()['id']})")
+        return resp.json()["id"]
+    else:
+        logger.error(f"Failed to create attribute '{name}': {resp.text}")
     return None
 
+@async_ttl_cache(_LOOKUP_TTL)
 async def get_attribute_term_id_map(attr_id):
-    url = f"{WC_BASE_URL}/wp-json/wc/v3/products/attributes/{attr_id}/terms?per_page=100"
-    auth = (WC_API_KEY, WC_API_SECRET)
-    async with httpx.AsyncClient(timeout=20.0, verify=False) as client:
-        resp = await client.get(url, auth=auth)
-        if resp.status_code == 200:
-            return {t["name"]: t["id"] for t in resp.json()}
-    return {}
+    terms = await fetch_all_pages(get_wc_client(), f"/wp-json/wc/v3/products/attributes/{attr_id}/terms")
+    return {t["name"]: t["id"] for t in terms}
 
 async def create_attribute_term(attr_id, value):
-    url = f"{WC_BASE_URL}/wp-json/wc/v3/products/attributes/{attr_id}/terms"
-    auth = (WC_API_KEY, WC_API_SECRET)
-    async with httpx.AsyncClient(timeout=20.0, verify=False) as client:
-        resp = await client.post(url, auth=auth, json={"name": value})
-        if resp.status_code in (200, 201):
-            logger.info(f"Created term '{value}' for attribute {attr_id}")
-            return resp.json()["id"]
-        else:
-            logger.error(f"Failed to create term '{value}' for attribute {attr_id}: {resp.text}")
+    resp = await get_wc_client().post(f"/wp-json/wc/v3/products/attributes/{attr_id}/terms", json={"name": value})
+    if resp.status_code in (200, 201):
+        invalidate("get_attribute_term_id_map")
+        logger.info(f"Created term '{value}' for attribute {attr_id}")
+        return resp.json()["id"]
+    else:
+        logger.error(f"Failed to create term '{value}' for attribute {attr_id}: {resp.text}")
     return None
 
+async def create_attribute_terms_batch(attr_id, values, chunk_size=100):
+    """
+    Create many terms for one attribute via POST .../terms/batch (Woo caps a batch at 100).
+    Returns {value: term_id} for the terms that were created; failures are logged.
+    """
+    url = f"/wp-json/wc/v3/products/attributes/{attr_id}/terms/batch"
+    values = list(values)
+    out = {}
+    for i in range(0, len(values), chunk_size):
+        chunk = values[i:i + chunk_size]
+        resp = await get_wc_client().post(url, json={"create": [{"name": v} for v in chunk]}, timeout=60.0)
+        if resp.status_code not in (200, 201):
+            logger.error(f"Failed to batch-create {len(chunk)} terms for attribute {attr_id}: {resp.text}")
+            continue
+        for value, row in zip(chunk, resp.json().get("create") or []):
+            if row.get("id") and not row.get("error"):
+                out[value] = row["id"]
+            else:
+                # term_exists carries the existing id, same as the single-term endpoint
+                existing = ((row.get("error") or {}).get("data") or {}).get("resource_id")
+                if existing:
+                    out[value] = existing
+                else:
+                    logger.error(f"Failed to create term '{value}' for attribute {attr_id}: {row.get('error')}")
+    if out:
+        invalidate("get_attribute_term_id_map")
+        logger.info(f"Created {len(out)} term(s) for attribute {attr_id}")
+    return out
+
 # --- BRAND UTILS (updated) ---
 
 def _norm_brand(s: str) -> str:
@@ -319,32 +544,19 @@ def _norm_brand(s: str) -> str:
 def _norm_key(s: str) -> str:
     return _norm_brand(s).lower()
 
+@async_ttl_cache(_LOOKUP_TTL)
 async def get_brand_id_map():
     """
-    Returns {brand_name: term_id} for ALL brand terms (paginated).
+    Returns {brand_name: term_id} for ALL brand terms (paginated, cached _LOOKUP_TTL).
     Keys are the exact names from WP; compare case-insensitively in callers.
     """
-    base = f"{WC_BASE_URL}/wp-json/wp/v2/product_brand"
-    auth = (WP_USERNAME, WP_PASSWORD)
     out = {}
-    page = 1
-    async with httpx.AsyncClient(timeout=20.0, verify=False, auth=auth) as client:
-        while True:
-            resp = await client.get(f"{base}?per_page=100&page={page}")
-            if resp.status_code != 200:
-                logger.error("[Brand] list failed: %s %s", resp.status_code, resp.text)
-                break
-            batch = resp.json() or []
-            if not batch:
-                break
-            for b in batch:
-                name = _norm_brand(b.get("name"))
-                bid = b.get("id")
-                if name and bid:
-                    out[name] = bid
-            if len(batch) < 100:
-                break
-            page += 1
+    # Only id/name are needed; _fields keeps each page's payload small
+    for b in await fetch_all_pages(get_wp_client(), "/wp-json/wp/v2/product_brand", params={"_fields": "id,name"}):
+        name = _norm_brand(b.get("name"))
+        bid = b.get("id")
+        if name and bid:
+            out[name] = bid
     return out
 
 async def create_brand(name: str):
@@ -352,33 +564,32 @@ async def create_brand(name: str):
     Creates a product_brand term via WP REST. If it already exists,
     returns the existing term_id from the error body when available.
     """
-    url = f"{WC_BASE_URL}/wp-json/wp/v2/product_brand"
-    auth = (WP_USERNAME, WP_PASSWORD)
+    url = "/wp-json/wp/v2/product_brand"
     payload = {"name": _norm_brand(name)}
-    async with httpx.AsyncClient(timeout=20.0, verify=False, auth=auth) as client:
-        resp = await client.post(url, json=payload)
-
-        # Happy path
-        if resp.status_code in (200, 201):
-            data = resp.json()
-            bid = data.get("id")
-            logger.info("Created Woo brand %r (id=%s)", payload["name"], bid)
-            return bid
-
-        # Many WP installs return {"code":"term_exists", ..., "data":{"term_id": <id>}}
-        term_id = None
-        try:
-            data = resp.json()
-            term_id = (data or {}).get("data", {}).get("term_id")
-        except Exception:
-            pass
-        if term_id:
-            logger.info("Brand %r already exists (id=%s) — using existing.", payload["name"], term_id)
-            return term_id
+    resp = await get_wp_client().post(url, json=payload)
+
+    # Happy path
+    if resp.status_code in (200, 201):
+        invalidate("get_brand_id_map")
+        data = resp.json()
+        bid = data.get("id")
+        logger.info("Created Woo brand %r (id=%s)", payload["name"], bid)
+        return bid
+
+    # Many WP installs return {"code":"term_exists", ..., "data":{"term_id": <id>}}
+    term_id = None
+    try:
+        data = resp.json()
+        term_id = (data or {}).get("data", {}).get("term_id")
+    except Exception:
+        pass
+    if term_id:
+        logger.info("Brand %r already exists (id=%s) — using existing.", payload["name"], term_id)
+        return term_id
 
-        logger.error("Failed to create brand %r (status %s): %s",
-                     payload["name"], resp.status_code, resp.text)
-        return None
+    logger.error("Failed to create brand %r (status %s): %s",
+                 payload["name"], resp.status_code, resp.text)
+    return None
 
 async def ensure_all_erp_brands_exist(erp_items):
     """
@@ -386,49 +597,72 @@ async def ensure_all_erp_brands_exist(erp_items):
     and return {original_brand_name: term_id}.
     """
     # Gather unique, normalized non-empty brand names
-    all_brands = {
-        _norm_brand(item.get("brand") or item.get("Brand"))
-        for item in erp_items
-        if (item.get("brand") or item.get("Brand"))
-    }
-    all_brands = {b for b in all_brands if b}
+    all_brands = {b for item in erp_items if (b := _norm_brand(item.get("brand") or item.get("Brand")))}
 
     existing = await get_brand_id_map()
     existing_lc = {_norm_key(k): v for k, v in existing.items()}
 
     brand_id_map = {}
+    to_create = []
     for b in sorted(all_brands):
         key = _norm_key(b)
         if key in existing_lc:
             brand_id_map[b] = existing_lc[key]
-            continue
-        bid = await create_brand(b)
-        if bid:
+        else:
+            to_create.append(b)
+
+    created = await asyncio.gather(*(_write_bounded(create_brand(b)) for b in to_create), return_exceptions=True)
+    for b, bid in zip(to_create, created):
+        if bid and not isinstance(bid, Exception):
             brand_id_map[b] = bid
         else:
             logger.error("Could not create or map Woo brand for %r", b)
     return brand_id_map
 
+async def _post_product_brands(product_id: int, brand_ids: list[int]) -> bool:
+    """One POST setting the product's full product_brand list. Returns True on success."""
+    url = f"/wp-json/wp/v2/product/{product_id}"
+    payload = {"product_brand": [int(b) for b in brand_ids]}
+    resp = await get_wp_client().post(url, json=payload)
+    if resp.status_code in (200, 201):
+        return True
+    # Log full body to help debug plugin/permission issues
+    try:
+        body = resp.json()
+    except Exception:
+        body = resp.text
+    logger.error("Failed to assign brand(s) %s to product %s: %s %s",
+                 payload["product_brand"], product_id, resp.status_code, body)
+    return False
+
 async def assign_brand_to_product(product_id: int, brand_id: int) -> bool:
     """
     Attach brand term(s) to a product via WP REST (Basic Auth).
     Returns True on success. Uses POST per WP REST conventions.
     """
-    url = f"{WC_BASE_URL}/wp-json/wp/v2/product/{product_id}"
-    auth = (WP_USERNAME, WP_PASSWORD)
-    payload = {"product_brand": [int(brand_id)]}
-    async with httpx.AsyncClient(timeout=20.0, verify=False, auth=auth) as client:
-        resp = await client.post(url, json=payload)
-        if resp.status_code in (200, 201):
-            return True
-        # Log full body to help debug plugin/permission issues
-        try:
-            body = resp.json()
-        except Exception:
-            body = resp.text
-        logger.error("Failed to assign brand %s to product %s: %s %s",
-                     brand_id, product_id, resp.status_code, body)
-        return False
+    return await _post_product_brands(product_id, [brand_id])
+
+async def assign_brands_bulk(product_brand_map: dict[int, list[int]]) -> dict[int, bool]:
+    """
+    Attach brands to many products: accumulate {product_id: [brand_id, ...]} first, then
+    call this once. Sends ONE POST per product with its full brand list, fanned out under
+    a 16-slot semaphore. Returns {product_id: ok}.
+    """
+    sem = asyncio.Semaphore(16)
+
+    async def _one(pid: int, bids: list[int]) -> bool:
+        async with sem:
+            return await _post_product_brands(pid, bids)
+
+    pids = [pid for pid, bids in product_brand_map.items() if bids]
+    results = await asyncio.gather(*(_one(pid, product_brand_map[pid]) for pid in pids), return_exceptions=True)
+    out: dict[int, bool] = {}
+    for pid, res in zip(pids, results):
+        if isinstance(res, Exception):
+            logger.error("Failed to assign brands to product %s: %s", pid, res)
+            res = False
+        out[pid] = res
+    return out
 
 # --- BRAND RECONCILIATION (new) ---
 
@@ -437,23 +671,7 @@ async def list_wp_brands_full():
     Return a full list of product_brand terms with fields like:
     [{id, name, slug, count, ...}, ...]
     """
-    base = f"{WC_BASE_URL}/wp-json/wp/v2/product_brand"
-    auth = (WP_USERNAME, WP_PASSWORD)
-    out, page = [], 1
-    async with httpx.AsyncClient(timeout=20.0, verify=False, auth=auth) as client:
-        while True:
-            resp = await client.get(f"{base}?per_page=100&page={page}")
-            if resp.status_code != 200:
-                logger.error("[Brand] list failed: %s %s", resp.status_code, resp.text)
-                break
-            batch = resp.json() or []
-            if not batch:
-                break
-            out.extend(batch)
-            if len(batch) < 100:
-                break
-            page += 1
-    return out
+    return await fetch_all_pages(get_wp_client(), "/wp-json/wp/v2/product_brand")
 
 async def update_brand(term_id, *, name=None, slug=None):
     """
@@ -462,32 +680,30 @@ async def update_brand(term_id, *, name=None, slug=None):
     """
     if not name and not slug:
         return False
-    url = f"{WC_BASE_URL}/wp-json/wp/v2/product_brand/{int(term_id)}"
-    auth = (WP_USERNAME, WP_PASSWORD)
+    url = f"/wp-json/wp/v2/product_brand/{int(term_id)}"
     payload = {}
     if name is not None:
         payload["name"] = name
     if slug is not None:
         payload["slug"] = slug
-    async with httpx.AsyncClient(timeout=20.0, verify=False, auth=auth) as client:
-        resp = await client.post(url, json=payload)
-        if resp.status_code in (200, 201):
-            return True
-        logger.error("[Brand] update %s failed: %s %s", term_id, resp.status_code, resp.text)
-        return False
+    resp = await get_wp_client().post(url, json=payload)
+    if resp.status_code in (200, 201):
+        invalidate("get_brand_id_map")
+        return True
+    logger.error("[Brand] update %s failed: %s %s", term_id, resp.status_code, resp.text)
+    return False
 
 async def delete_brand(term_id, *, force=True):
     """
     Delete a product_brand term. If force=True, permanently deletes.
     """
-    url = f"{WC_BASE_URL}/wp-json/wp/v2/product_brand/{int(term_id)}?force={'true' if force else 'false'}"
-    auth = (WP_USERNAME, WP_PASSWORD)
-    async with httpx.AsyncClient(timeout=20.0, verify=False, auth=auth) as client:
-        resp = await client.delete(url)
-        if resp.status_code in (200, 410):  # 410 gone is ok
-            return True
-        logger.error("[Brand] delete %s failed: %s %s", term_id, resp.status_code, resp.text)
-        return False
+    url = f"/wp-json/wp/v2/product_brand/{int(term_id)}?force={'true' if force else 'false'}"
+    resp = await get_wp_client().delete(url)
+    if resp.status_code in (200, 410):  # 410 gone is ok
+        invalidate("get_brand_id_map")
+        return True
+    logger.error("[Brand] delete %s failed: %s %s", term_id, resp.status_code, resp.text)
+    return False
 
 def _norm_brand(s):
     return (s or "").strip()
@@ -530,31 +746,17 @@ async def reconcile_woocommerce_brands(
         "delete_missing": delete_missing,
     }
 
-    # ADD or UPDATE (case-only adjustments)
+    # Plan: ADD, UPDATE (case-only adjustments), DELETE (optional)
+    to_create, to_update, to_delete = [], [], []
     for b in sorted(erp_set):
-        lc = _norm_key(b)
-        t = by_lc.get(lc)
+        t = by_lc.get(_norm_key(b))
         if not t:
-            if dry_run:
-                report["created"].append({"name": b})
-            else:
-                tid = await create_brand(b)
-                if tid:
-                    report["created"].append({"id": tid, "name": b})
-                else:
-                    report["skipped"].append({"name": b, "reason": "create_failed"})
+            to_create.append(b)
             continue
-
         # If only case differs, update name to match ERP canonical case
         current_name = t.get("name") or ""
         if current_name != b and current_name.lower() == b.lower():
-            if dry_run:
-                report["updated"].append({"id": t["id"], "from": current_name, "to": b})
-            else:
-                ok = await update_brand(t["id"], name=b)
-                (report["updated"] if ok else report["skipped"]).append(
-                    {"id": t["id"], "from": current_name, "to": b, **({} if ok else {"reason": "update_failed"})}
-                )
+            to_update.append((t["id"], current_name, b))
         else:
             report["skipped"].append({"id": t["id"], "name": current_name, "reason": "exists"})
 
@@ -562,42 +764,70 @@ async def reconcile_woocommerce_brands(
     if delete_missing:
         for t in terms:
             name = t.get("name") or ""
-            lc = _norm_key(name)
-            if lc in erp_lc:
+            if _norm_key(name) in erp_lc:
                 continue
             if skip_in_use and int(t.get("count") or 0) > 0:
                 report["skipped"].append({"id": t["id"], "name": name, "reason": "in_use"})
                 continue
-            if dry_run:
-                report["deleted"].append({"id": t["id"], "name": name})
-            else:
-                ok = await delete_brand(t["id"], force=True)
-                (report["deleted"] if ok else report["skipped"]).append(
-                    {"id": t["id"], "name": name, **({} if ok else {"reason": "delete_failed"})}
-                )
+            to_delete.append((t["id"], name))
+
+    if dry_run:
+        report["created"].extend({"name": b} for b in to_create)
+        report["updated"].extend({"id": tid, "from": cur, "to": b} for tid, cur, b in to_update)
+        report["deleted"].extend({"id": tid, "name": name} for tid, name in to_delete)
+        return report
+
+    # Execute: every write is independent, so fan out (bounded) and report afterwards
+    created, updated, deleted = await asyncio.gather(
+        asyncio.gather(*(_write_bounded(create_brand(b)) for b in to_create), return_exceptions=True),
+        asyncio.gather(*(_write_bounded(update_brand(tid, name=b)) for tid, _, b in to_update), return_exceptions=True),
+        asyncio.gather(*(_write_bounded(delete_brand(tid, force=True)) for tid, _ in to_delete), return_exceptions=True),
+    )
+
+    for b, tid in zip(to_create, created):
+        if tid and not isinstance(tid, Exception):
+            report["created"].append({"id": tid, "name": b})
+        else:
+            report["skipped"].append({"name": b, "reason": "create_failed"})
+
+    for (tid, cur, b), ok in zip(to_update, updated):
+        ok = ok is True
+        (report["updated"] if ok else report["skipped"]).append(
+            {"id": tid, "from": cur, "to": b, **({} if ok else {"reason": "update_failed"})}
+        )
+
+    for (tid, name), ok in zip(to_delete, deleted):
+        ok = ok is True
+        (report["deleted"] if ok else report["skipped"]).append(
+            {"id": tid, "name": name, **({} if ok else {"reason": "delete_failed"})}
+        )
 
     return report
 
 # --- GALLERY LOGIC FOR VARIANTS ---
 
-def get_gallery_images(item, template=None, get_erp_images=None):
+async def get_gallery_images(item, template=None, get_erp_images=None):
     """
     Returns the gallery images for an ERPNext item.
     If item has no gallery, and template is provided, use template's gallery.
-    get_erp_images is the fetch function (if you need to re-fetch).
+    get_erp_images is the fetch function (if you need to re-fetch); when both
+    item and template must be fetched, the two lookups run concurrently.
     """
-    # Prefer variant's own images
-    imgs = []
-    if get_erp_images:
-        imgs = get_erp_image_list(item, get_erp_images)
-    else:
+    if not get_erp_images:
         imgs = item.get("gallery_images", []) or []
-    if not imgs and template:
-        if get_erp_images:
-            imgs = get_erp_image_list(template, get_erp_images)
-        else:
+        if not imgs and template:
             imgs = template.get("gallery_images", []) or []
-    return imgs
+        return imgs
+
+    if template is None:
+        return await get_erp_image_list(item, get_erp_images)
+
+    # Prefer variant's own images; template's are the fallback
+    imgs_item, imgs_tpl = await asyncio.gather(
+        get_erp_image_list(item, get_erp_images),
+        get_erp_image_list(template, get_erp_images),
+    )
+    return imgs_item or imgs_tpl
 
 async def get_variant_gallery_images(variant, template, get_erp_images):
     """Return [variant item image] + variant attached images + template attached images (deduped), NOT template item image."""
@@ -606,14 +836,18 @@ async def get_variant_gallery_images(variant, template, get_erp_images):
     variant_item_img = variant.get("image")
     if variant_item_img:
         images.append(variant_item_img)
-    # Variant's own attached images
-    var_attached_imgs = await get_erp_image_list(variant, get_erp_images)
+    # Variant's + template's attached images, fetched concurrently
+    tasks = [get_erp_image_list(variant, get_erp_images)]
+    if template:
+        tasks.append(get_erp_image_list(template, get_erp_images))
+    results = await asyncio.gather(*tasks)
+    var_attached_imgs = results[0]
+    template_attached_imgs = results[1] if template else []
     for img in var_attached_imgs:
         if img not in images:
             images.append(img)
     # Template's attached images (excluding template Item Image)
     if template:
-        template_attached_imgs = await get_erp_image_list(template, get_erp_images)
         for img in template_attached_imgs:
             if img not in images and img != template.get("image"):
                 images.append(img)
@@ -622,11 +856,46 @@ async def get_variant_gallery_images(variant, template, get_erp_images):
 # --- Partial sync - recording sync_products_preview output for partial sync in JSON file ---
 
 def _atomic_write_json(path: str, obj: dict) -> None:
+    # orjson encodes in C; one bytes write, then atomic replace
+    data = orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
     tmp = path + ".tmp"
-    with open(tmp, "w", encoding="utf-8") as f:
-        json.dump(obj, f, ensure_ascii=False, indent=2)
+    with open(tmp, "wb") as f:
+        f.write(data)
     os.replace(tmp, path)
 
+def save_preview_ndjson(records, path: str = _PREVIEW_PATH) -> None:
+    """
+    Stream preview records to `path` as NDJSON (one orjson-encoded dict per line),
+    written to a tmp file and atomically renamed. `records` may be any iterable.
+    """
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        for rec in records:
+            f.write(orjson.dumps(rec, option=orjson.OPT_NON_STR_KEYS))
+            f.write(b"\n")
+    os.replace(tmp, path)
+
+def _preview_records(sync_report: dict, meta: dict):
+    """
+    Flatten a sync report into NDJSON records:
+      {"_meta": {...}}                                   first line
+      {"section": "to_create", "row": {...}}             one per list item
+      {"section": "mapping", "key": sku, "value": {...}} one per dict entry
+      {"section": "...", "value": ...}                   scalars
+    """
+    yield {"_meta": meta}
+    for section, val in sync_report.items():
+        if section == "_meta":
+            continue
+        if isinstance(val, list):
+            for row in val:
+                yield {"section": section, "row": row}
+        elif isinstance(val, dict):
+            for k, v in val.items():
+                yield {"section": section, "key": k, "value": v}
+        else:
+            yield {"section": section, "value": val}
+
 def save_preview_to_file(
     sync_report: dict,
     *,
@@ -635,45 +904,85 @@ def save_preview_to_file(
     dry_run: bool = True,
     skus: Optional[List[str]] = None
 ) -> None:
-    """Persist the preview EXACTLY as returned by sync_all_templates_and_variants, with a small _meta header."""
-    from copy import deepcopy
-    payload = deepcopy(sync_report)
-    meta = payload.setdefault("_meta", {})
+    """Persist the preview EXACTLY as returned by sync_all_templates_and_variants (NDJSON, _meta line first)."""
+    meta = dict(sync_report.get("_meta") or {})
     meta.update({
         "generated_at": datetime.now(timezone.utc).isoformat(),
         "source": source,                # "full" | "partial" | "manual"
         "dry_run": bool(dry_run),
         "skus": sorted(list(skus)) if skus else [],
-        "schema": 2
+        "schema": 3
     })
-    _atomic_write_json(path, payload)
+    save_preview_ndjson(_preview_records(sync_report, meta), path)
 
-def load_preview_from_file(filename: str = "products_to_sync.json"):
+def load_preview_from_file(filename: str = "products_to_sync.ndjson"):
+    """Yield preview records (dicts) line by line; see _preview_records for the shape."""
     # Always load from app/mapping/
-    file_path = os.path.join(_mapping_dir, filename)
+    file_path = os.path.join(_mapping_dir(), filename)
     #print(f"*** Loading sync preview from: {file_path}")
-    with open(file_path, "r") as f:
-        return json.load(f)
+    with open(file_path, "rb") as f:
+        for line in f:
+            if line.strip():
+                yield orjson.loads(line)
+
+def load_preview_targets() -> set:
+    """
+    SKUs queued in the saved preview (to_create/to_update and variant counterparts).
+    Streams the NDJSON preview; falls back to a legacy products_to_sync.json blob.
+    Returns an empty set when no preview exists or it can't be read.
+    """
+    sections = {"to_create", "to_update", "variant_to_create", "variant_to_update"}
+    targets = set()
+    try:
+        if os.path.exists(_PREVIEW_PATH):
+            with open(_PREVIEW_PATH, "rb") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    rec = orjson.loads(line)
+                    if rec.get("section") in sections:
+                        sku = (rec.get("row") or {}).get("sku")
+                        if sku:
+                            targets.add(sku)
+        elif os.path.exists(_LEGACY_PREVIEW_PATH):
+            with open(_LEGACY_PREVIEW_PATH, "rb") as f:
+                j = orjson.loads(f.read()) or {}
+            for key in sections:
+                for row in (j.get(key) or []):
+                    sku = (row or {}).get("sku")
+                    if sku:
+                        targets.add(sku)
+        else:
+            logger.warning("[PARTIAL] Preview file %s not found; falling back to provided skus_to_sync.", _PREVIEW_PATH)
+    except Exception as e:
+        logger.warning("[PARTIAL] Failed to read preview file: %s; falling back to provided SKUs.", e)
+        return set()
+    return targets
+
+# diff_fields defaults, built once at import (called per SKU on the hot path)
+_WC_SYNC_FIELDS = tuple(get_wc_sync_fields())
+_DIFF_IGNORE = frozenset({"erp_img_sizes", "wc_img_sizes", "image_diff", "images", "has_variants"})
+_DIFF_FIELDS = tuple(k for k in _WC_SYNC_FIELDS if k not in _DIFF_IGNORE)
+_TAG_RE = re.compile(r"<[^>]+>")
+_WS_RE = re.compile(r"\s+")
+
+@lru_cache(maxsize=4096)
+def _strip_html_for_diff(s):
+    """HTML → plain text with whitespace collapsed (selectolax when installed, else tag regex + unescape)."""
+    if not s:
+        return ""
+    if _HTMLParser is not None:
+        return " ".join(_HTMLParser(s).text(separator=" ").split())
+    return _WS_RE.sub(" ", html.unescape(_TAG_RE.sub(" ", s))).strip()
 
 def diff_fields(wc, erp, include=None, ignore=None):
-    import re
-    from app.mapping.field_mapping import get_wc_sync_fields
-    from bs4 import BeautifulSoup
-    import logging
-    logger = logging.getLogger("uvicorn.error")
-
-    def strip_html(s):
-        """Robustly strips HTML, preserving spaces at block boundaries."""
-        return BeautifulSoup(s or "", "html.parser").get_text(separator=" ", strip=True)
-
-    ignore = set(ignore or [])
-    ignore.update({"erp_img_sizes", "wc_img_sizes", "image_diff", "images", "has_variants"})
-    if include is None:
-        include = get_wc_sync_fields()
+    if not ignore and (include is None or include is _DIFF_FIELDS):
+        fields = _DIFF_FIELDS  # common case: nothing to filter per call
+    else:
+        ignore = _DIFF_IGNORE.union(ignore) if ignore else _DIFF_IGNORE
+        fields = [k for k in (_WC_SYNC_FIELDS if include is None else include) if k not in ignore]
     diffs = {}
-    for k in include:
-        if k in ignore:
-            continue
+    for k in fields:
         v1 = wc.get(k)
         v2 = erp.get(k)
         # Normalize
@@ -681,11 +990,17 @@ def diff_fields(wc, erp, include=None, ignore=None):
             v1 = str(v1 or "").strip()
             v2 = str(v2 or "").strip()
         if k == "categories":
-            v1 = [c["id"] for c in v1] if isinstance(v1, list) else []
-            v2 = [c["id"] for c in v2] if isinstance(v2, list) else []
+            # Woo doesn't guarantee category order; compare as sets of ids
+            v1 = frozenset(c["id"] for c in v1) if isinstance(v1, list) else frozenset()
+            v2 = frozenset(c["id"] for c in v2) if isinstance(v2, list) else frozenset()
+            if v1 != v2:
+                diffs[k] = [sorted(v1), sorted(v2)]
+            continue
         if k == "description":
-            v1s = strip_html(v1)
-            v2s = strip_html(v2)
+            if v1 == v2:
+                continue  # byte-identical: skip HTML stripping
+            v1s = _strip_html_for_diff(v1)
+            v2s = _strip_html_for_diff(v2)
 
             #logger.info(f"[DIFF DEBUG] DESC ({k}) ERP:'{v2s}' WOO:'{v1s}' RAW ERP:'{v2}' RAW WOO:'{v1}'")
             
@@ -706,33 +1021,35 @@ async def sync_products_filtered(erp_items, wc_products, dry_run=False):
     """
     logger.info(f"Starting filtered sync with {len(erp_items)} ERP and {len(wc_products)} Woo products (dry_run={dry_run})")
 
-    wc_map = {p.get("sku"): p for p in wc_products if p.get("sku")}
+    wc_map = {sku: p for p in wc_products if (sku := p.get("sku"))}
     stats = {"updated": 0, "created": 0, "skipped": 0, "errors": []}
 
     # Re-fetch price and stock for accuracy
-    from app.erp.erpnext import get_price_map, get_stock_map
-    price_map = await get_price_map()
-    stock_map = await get_stock_map()
+    price_map, stock_map = await asyncio.gather(get_price_map(), get_stock_map())
+
+    # SKU → total qty across warehouses, built once (used when no default_warehouse)
+    sku_totals = defaultdict(int)
+    for (code, wh), qty in stock_map.items():
+        sku_totals[code] += qty
+
+    # variant_of → style key → sibling codes, so family media lookups skip the full scan
+    variant_index = build_variant_index(erp_items)
 
-    for item in erp_items:
-        sku = item.get("item_code") or item.get("Item Code") or item.get("name")
+    async def _process(item):
+        """One SKU → (op, sku, payload). op ∈ create/update/skipped/None (dry run); writes happen in batch later."""
+        sku = _sku(item)
         wc = wc_map.get(sku)
         price = price_map.get(sku, item.get("standard_rate", 0))
         default_wh = item.get("default_warehouse")
-        stock_qty = (
-            stock_map.get((sku, default_wh), 0)
-            if sku and default_wh
-            else sum(qty for (code, wh), qty in stock_map.items() if code == sku)
-        )
+        stock_qty = stock_map.get((sku, default_wh), 0) if sku and default_wh else sku_totals.get(sku, 0)
 
         # === NEW: build featured + gallery according to type ===
         # Variant item?
         is_variant = bool(item.get("variant_of") or item.get("Variant Of"))
         if is_variant:
-            featured, gallery = await erp_get_variant_family_media_from_list(item, erp_items)
+            featured, gallery = await erp_get_variant_family_media_from_list(item, erp_items, variant_index)
         else:
-            featured = await erp_get_item_featured(sku)
-            gallery = await erp_get_item_gallery(sku)
+            featured, gallery = await asyncio.gather(_row_featured(item), erp_get_item_gallery(sku))
 
         image_list = ([featured] if featured else []) + (gallery or [])
 
@@ -744,37 +1061,60 @@ async def sync_products_filtered(erp_items, wc_products, dry_run=False):
         # Create new products in Woo
         if wc is None:
             logger.info(f"SKU {sku}: Creating new WooCommerce product in partial sync.")
-            if not dry_run:
-                try:
-                    resp = await create_wc_product(wc_payload)
-                    if resp.get("status_code", 0) not in (200, 201):
-                        logger.error(f"SKU {sku}: Woo creation failed: {resp}")
-                        stats["errors"].append({"sku": sku, "error": resp})
-                    else:
-                        stats["created"] += 1
-                except Exception as e:
-                    logger.error(f"SKU {sku}: Error creating Woo product: {e}")
-                    stats["errors"].append({"sku": sku, "error": str(e)})
-            continue
+            return ("create" if not dry_run else None), sku, wc_payload
 
         # Update existing
-        fields_changed = diff_fields(wc, wc_payload, include=get_wc_sync_fields())
-        if fields_changed:
-            logger.info(f"SKU {sku}: Updating Woo fields {fields_changed}")
-            if not dry_run:
-                try:
-                    resp = await update_wc_product(wc["id"], wc_payload)
-                    if resp.get("status_code", 0) not in (200, 201):
-                        logger.error(f"SKU {sku}: Woo update failed: {resp}")
-                        stats["errors"].append({"sku": sku, "error": resp})
-                    else:
-                        stats["updated"] += 1
-                except Exception as e:
-                    logger.error(f"SKU {sku}: Error updating Woo: {e}")
-                    stats["errors"].append({"sku": sku, "error": str(e)})
-        else:
+        fields_changed = diff_fields(wc, wc_payload, include=_DIFF_FIELDS)
+        if not fields_changed:
             logger.info(f"SKU {sku}: No fields need update.")
-            stats["skipped"] += 1
+            return "skipped", sku, None
+        logger.info(f"SKU {sku}: Updating Woo fields {fields_changed}")
+        if dry_run:
+            return None, sku, None
+        return "update", sku, {**wc_payload, "id": wc["id"]}
+
+    # Phase 1: build payloads (ERP media lookups) with bounded fan-out
+    sem = asyncio.Semaphore(16)
+
+    async def _guarded(item):
+        async with sem:
+            return await _process(item)
+
+    to_create, to_update = [], []
+    # Family File rows are shared across siblings only within this phase
+    clear_family_files_cache()
+    try:
+        results = await asyncio.gather(*(_guarded(i) for i in erp_items), return_exceptions=True)
+    finally:
+        clear_family_files_cache()
+    for item, res in zip(erp_items, results):
+        if isinstance(res, Exception):
+            sku = _sku(item)
+            logger.error(f"SKU {sku}: Unexpected error in filtered sync: {res}")
+            stats["errors"].append({"sku": sku, "error": str(res)})
+            continue
+        status, sku, payload = res
+        if status == "create":
+            to_create.append((sku, payload))
+        elif status == "update":
+            to_update.append((sku, payload))
+        elif status:
+            stats[status] += 1
+
+    # Phase 2: write through Woo's batch endpoint (100 ops per request instead of one per SKU)
+    if to_create or to_update:
+        written = await batch_wc_products(
+            create=[p for _, p in to_create],
+            update=[p for _, p in to_update],
+        )
+        for op, status, planned in (("create", "created", to_create), ("update", "updated", to_update)):
+            for (sku, _), row in zip(planned, written[op]):
+                err = (row or {}).get("error") if isinstance(row, dict) else "empty batch row"
+                if err or not (row or {}).get("id"):
+                    logger.error(f"SKU {sku}: Woo {op} failed: {err or row}")
+                    stats["errors"].append({"sku": sku, "error": err or row})
+                else:
+                    stats[status] += 1
 
     logger.info(f"Partial sync: {stats['updated']} updated, {stats['skipped']} skipped, {len(stats['errors'])} errors.")
     return stats
@@ -783,8 +1123,26 @@ def strip_html_tags(text):
     """
     Naive HTML tag stripper (for comparing descriptions). Replace with a more robust solution if needed.
     """
-    import re
-    return re.sub(r"<[^>]+>", "", text or "")
+    return _TAG_RE.sub("", text or "")
+
+# File-list query for one Item's attachments; the constant parts are encoded once and
+# httpx builds the query string from params. Rows attached to the image/website_image
+# fields are dropped server-side.
+_GALLERY_FIELD_FILTER = ["attached_to_field", "not in", ["image", "website_image"]]
+_ITEM_FILE_FIELDS = orjson.dumps(["file_url", "attached_to_name"]).decode()
+_FAMILY_FILE_FIELDS = orjson.dumps(["file_url", "attached_to_name", "creation"]).decode()
+
+def _item_files_params(item_code: str) -> dict:
+    return {
+        "fields": _ITEM_FILE_FIELDS,
+        "filters": orjson.dumps([
+            ["attached_to_doctype", "=", "Item"],
+            ["attached_to_name", "=", item_code],
+            _GALLERY_FIELD_FILTER,
+        ]).decode(),
+        "order_by": "creation asc",
+        "limit_page_length": 1000,
+    }
 
 async def erp_get_variant_family_media(variant_codes: list[str]) -> tuple[str | None, list[str]]:
     """
@@ -796,28 +1154,25 @@ async def erp_get_variant_family_media(variant_codes: list[str]) -> tuple[str |
     if not variant_codes:
         return None, []
 
-    # Featured from first variant
-    featured = await erp_get_item_featured(variant_codes[0])
+    client = get_erp_client()
+
+    # Featured (first variant) and every variant's File list in one concurrent burst
+    featured, *responses = await asyncio.gather(
+        erp_get_item_featured(variant_codes[0]),
+        *(_bounded(client.get("/api/resource/File", params=_item_files_params(code))) for code in variant_codes),
+        return_exceptions=True,
+    )
+    if isinstance(featured, Exception):
+        featured = None
 
-    # Gather per-variant galleries (excluding image/website_image & excluding featured)
+    # Per-variant galleries (excluding image/website_image & excluding featured)
     per_variant_lists = []
-    for code in variant_codes:
-        fields = quote(json.dumps(["file_url", "attached_to_field", "attached_to_name"]))
-        filters = quote(json.dumps([
-            ["attached_to_doctype", "=", "Item"],
-            ["attached_to_name", "=", code],
-        ]))
-        url = f"{ERP_URL}/api/resource/File?fields={fields}&filters={filters}&order_by=creation%20asc&limit_page_length=1000"
-        headers = {"Authorization": f"token {ERP_API_KEY}:{ERP_API_SECRET}"}
-        async with httpx.AsyncClient(timeout=20.0, verify=False) as client:
-            r = await client.get(url, headers=headers)
-            data = r.json().get("data", []) if r.status_code == 200 else []
-        # filter this variant’s list
+    for r in responses:
+        data = orjson.loads(r.content).get("data", []) if not isinstance(r, Exception) and r.status_code == 200 else []
         seen, this_list = set(), []
         for row in data:
             fu = row.get("file_url")
-            fld = (row.get("attached_to_field") or "").lower()
-            if not fu or fld in {"image", "website_image"}:
+            if not fu:
                 continue
             if featured and fu == featured:
                 continue
@@ -829,9 +1184,15 @@ async def erp_get_variant_family_media(variant_codes: list[str]) -> tuple[str |
     # Intersection, with order preserved from the first variant
     if not per_variant_lists:
         return featured, []
-    common = set(per_variant_lists[0])
-    for lst in per_variant_lists[1:]:
-        common &= set(lst)
+    # Smallest list first so the working set starts minimal; stop once it empties
+    common = None
+    for lst in sorted(per_variant_lists, key=len):
+        if common is None:
+            common = set(lst)
+        else:
+            common.intersection_update(lst)
+        if not common:
+            return featured, []
     gallery = [fu for fu in per_variant_lists[0] if fu in common]
     return featured, gallery
 
@@ -841,35 +1202,32 @@ async def erp_get_item_featured(item_code: str) -> str | None:
     """
     ERPNext: return Item.image (file_url) for an item code.
     """
-    headers = {"Authorization": f"token {ERP_API_KEY}:{ERP_API_SECRET}"}
-    filters = quote(json.dumps({"name": item_code}))
-    url = f"{ERP_URL}/api/method/frappe.client.get_value?doctype=Item&fieldname=image&filters={filters}"
-    async with httpx.AsyncClient(timeout=20.0, verify=False) as client:
-        r = await client.get(url, headers=headers)
-        if r.status_code == 200:
-            return (r.json().get("message") or {}).get("image") or None
+    params = {"doctype": "Item", "fieldname": "image", "filters": orjson.dumps({"name": item_code}).decode()}
+    r = await get_erp_client().get("/api/method/frappe.client.get_value", params=params)
+    if r.status_code == 200:
+        return (orjson.loads(r.content).get("message") or {}).get("image") or None
     return None
 
+async def _row_featured(item: dict) -> str | None:
+    """
+    Item.image for an ERP item row. get_erpnext_items always lists `image`, so the
+    row already carries it; only rows without the column cost a get_value call.
+    """
+    if "image" in item:
+        return item.get("image") or None
+    return await erp_get_item_featured(_sku(item))
+
 async def erp_get_item_gallery(item_code: str) -> list[str]:
     """
     ERPNext: for a simple item, return all File.file_url attached to that Item
     excluding rows attached to fields 'image' or 'website_image' and excluding duplicates.
     """
-    headers = {"Authorization": f"token {ERP_API_KEY}:{ERP_API_SECRET}"}
-    fields = quote(json.dumps(["file_url", "attached_to_field"]))
-    filters = quote(json.dumps([
-        ["attached_to_doctype", "=", "Item"],
-        ["attached_to_name", "=", item_code],
-    ]))
-    url = f"{ERP_URL}/api/resource/File?fields={fields}&filters={filters}&order_by=creation%20asc&limit_page_length=1000"
-    async with httpx.AsyncClient(timeout=20.0, verify=False) as client:
-        r = await client.get(url, headers=headers)
-        data = r.json().get("data", []) if r.status_code == 200 else []
+    r = await get_erp_client().get("/api/resource/File", params=_item_files_params(item_code))
+    data = orjson.loads(r.content).get("data", []) if r.status_code == 200 else []
     seen, out = set(), []
     for row in data:
         fu = row.get("file_url")
-        fld = (row.get("attached_to_field") or "").lower()
-        if not fu or fld in {"image", "website_image"}:
+        if not fu:
             continue
         if fu not in seen:
             seen.add(fu)
@@ -882,116 +1240,170 @@ def _attrs_dict(item: dict) -> dict:
     """
     d = {}
     # pair form
-    a_col = "Attribute (Variant Attributes)"
-    v_col = "Attribute Value (Variant Attributes)"
-    if a_col in item and v_col in item and item.get(a_col) and item.get(v_col):
-        d[item[a_col]] = item[v_col]
+    n = item.get(_ATTR_COL)
+    v = item.get(_ATTR_VAL_COL)
+    if n and v:
+        d[n] = v
     # list form
-    if "attributes" in item and isinstance(item["attributes"], list):
-        for row in item["attributes"]:
-            n = row.get("attribute")
-            v = row.get("attribute_value")
-            if n and v:
-                d[n] = v
-    if "variant_attributes" in item and isinstance(item["variant_attributes"], list):
-        for row in item["variant_attributes"]:
+    for key in ("attributes", "variant_attributes"):
+        rows = item.get(key)
+        if type(rows) is not list:
+            continue
+        for row in rows:
             n = row.get("attribute")
             v = row.get("attribute_value")
             if n and v:
                 d[n] = v
     return d
 
+_SIZE_EXCLUDE = frozenset({"sheet size"})
+
+
 def _style_key(item: dict) -> tuple:
     """
     Build a 'style' key for a variant family (exclude size-ish attributes).
     We explicitly ignore 'Sheet Size' and any attribute whose name contains 'size' (case-insensitive).
     """
-    attrs = _attrs_dict(item)
     style = []
-    for k, v in attrs.items():
-        if k.lower() in {"sheet size"} or "size" in k.lower():
+    for k, v in _attrs_dict(item).items():
+        k_lower = k.lower()
+        if k_lower in _SIZE_EXCLUDE or "size" in k_lower:
             continue
         style.append((k, v))
     style.sort()
     return tuple(style)
 
-async def erp_get_variant_family_media_from_list(item: dict, erp_items: list[dict]) -> tuple[str | None, list[str]]:
+# File rows per variant family (sorted item codes). Every sibling of a family asks for the
+# same rows, so the first caller's query is shared. Kept for one sync run: the sync clears
+# it on entry and exit; failed fetches are dropped at once so the next caller retries.
+_family_files: Dict[tuple, asyncio.Future] = {}
+
+def clear_family_files_cache() -> None:
+    _family_files.clear()
+
+async def _fetch_family_file_rows(family: tuple) -> list[dict]:
+    params = {
+        "fields": _FAMILY_FILE_FIELDS,
+        "filters": orjson.dumps([
+            ["attached_to_doctype", "=", "Item"],
+            ["attached_to_name", "in", list(family)],
+            _GALLERY_FIELD_FILTER,
+        ]).decode(),
+        "order_by": "creation asc",
+    }
+    return [row async for row in _erp_paged("/api/resource/File", params, page_size=1000)]
+
+async def _family_file_rows(family: list[str]) -> list[dict]:
+    key = tuple(sorted(set(family)))
+    fut = _family_files.get(key)
+    if fut is None:
+        fut = asyncio.ensure_future(_fetch_family_file_rows(key))
+        _family_files[key] = fut
+
+        def _drop_failed(f, key=key):
+            if f.cancelled() or f.exception() is not None:
+                _family_files.pop(key, None)
+
+        fut.add_done_callback(_drop_failed)
+    return await asyncio.shield(fut)
+
+def build_variant_index(erp_items: list[dict]) -> dict[str, dict[tuple, list[str]]]:
+    """
+    Group ERP item codes by variant_of, then by _style_key, in one pass.
+    Build once per sync and pass to erp_get_variant_family_media_from_list so
+    each family lookup is a dict hit instead of a scan over every item.
+    """
+    index: dict[str, dict[tuple, list[str]]] = {}
+    for it in erp_items:
+        variant_of = it.get("variant_of") or it.get("Variant Of")
+        code = _sku(it)
+        if not variant_of or not code:
+            continue
+        index.setdefault(variant_of, {}).setdefault(_style_key(it), []).append(code)
+    return index
+
+
+async def erp_get_variant_family_media_from_list(
+    item: dict,
+    erp_items: list[dict],
+    variant_index: dict[str, dict[tuple, list[str]]] | None = None,
+) -> tuple[str | None, list[str]]:
     """
     For a single variant item and the list of all ERP items:
       - featured = that variant's Item.image
       - gallery  = intersection of File.file_url across all sibling variants in the family
                    (same variant_of and same non-size attributes), excluding image/website_image and the featured.
+    Pass `variant_index` (from build_variant_index) to skip the scan over erp_items.
     Returns (featured:str|None, gallery:list[str]).
     """
-    headers = {"Authorization": f"token {ERP_API_KEY}:{ERP_API_SECRET}"}
 
     # Collect family
     variant_of = item.get("variant_of") or item.get("Variant Of")
     if not variant_of:
         # Not a variant row
-        return await erp_get_item_featured(item.get("item_code") or item.get("Item Code") or item.get("name")), []
+        return await _row_featured(item), []
 
     key = _style_key(item)
-    family = []
-    for it in erp_items:
-        if (it.get("variant_of") or it.get("Variant Of")) != variant_of:
-            continue
-        if _style_key(it) == key:
-            code = it.get("item_code") or it.get("Item Code") or it.get("name")
-            if code:
-                family.append(code)
+    if variant_index is not None:
+        family = list(variant_index.get(variant_of, {}).get(key, ()))
+    else:
+        family = []
+        for it in erp_items:
+            if (it.get("variant_of") or it.get("Variant Of")) != variant_of:
+                continue
+            if _style_key(it) == key:
+                code = _sku(it)
+                if code:
+                    family.append(code)
 
     # Featured is the current variant's image (we expect it to be same across family)
-    this_code = item.get("item_code") or item.get("Item Code") or item.get("name")
-    featured = await erp_get_item_featured(this_code)
-
     if not family:
-        return featured, []
+        return await _row_featured(item), []
 
-    # Fetch all File rows for the family in one query
-    fields = quote(json.dumps(["file_url", "attached_to_field", "attached_to_name", "creation"]))
-    filters = quote(json.dumps([
-        ["attached_to_doctype", "=", "Item"],
-        ["attached_to_name", "in", family],
-    ]))
-    url = f"{ERP_URL}/api/resource/File?fields={fields}&filters={filters}&order_by=creation%20asc&limit_page_length=1000"
-    async with httpx.AsyncClient(timeout=20.0, verify=False) as client:
-        r = await client.get(url, headers=headers)
-        data = r.json().get("data", []) if r.status_code == 200 else []
+    # Featured (usually straight from the row) and the family's File rows (one paged query,
+    # shared by every sibling of the family)
+    featured, data = await asyncio.gather(_row_featured(item), _family_file_rows(family))
 
     # Count per file_url across distinct items; filter to those present for ALL family members
-    per_file = {}
+    family_size = len(set(family))
+    per_file: dict[str, int] = {}
+    seen_pairs = set()  # (file_url, item) guard so duplicate attachments count once
     order_hint = {}
     for row in data:
         fu = row.get("file_url")
-        fld = (row.get("attached_to_field") or "").lower()
         name = row.get("attached_to_name")
         crt = row.get("creation")
-        if not fu or fld in {"image", "website_image"}:
+        if not fu:
             continue
-        per_file.setdefault(fu, set()).add(name)
+        if (fu, name) not in seen_pairs:
+            seen_pairs.add((fu, name))
+            per_file[fu] = per_file.get(fu, 0) + 1
         # remember earliest creation for ordering
-        if fu not in order_hint or (crt and str(crt) < str(order_hint[fu])):
+        # Frappe serialises creation as an ISO string, so plain string comparison orders it
+        if crt and (fu not in order_hint or crt < order_hint[fu]):
             order_hint[fu] = crt
 
-    gallery = []
-    for fu, names in per_file.items():
-        if len(names) == len(set(family)):
-            if not featured or fu != featured:
-                gallery.append(fu)
+    gallery = [
+        fu for fu, count in per_file.items()
+        if count == family_size and (not featured or fu != featured)
+    ]
 
     # Order by earliest creation for stability
-    gallery.sort(key=lambda fu: str(order_hint.get(fu, "")) or fu)
+    gallery.sort(key=lambda fu: order_hint.get(fu) or fu)
     return featured, gallery
 
 async def erp_head_sizes(file_urls: list[str]) -> list[int]:
     """
     HEAD each file URL (ERP private or public) and return content-lengths.
     """
-    out = []
-    for fu in file_urls or []:
-        size, _, _ = await get_image_size_with_fallback(fu)  # returns (size, full_url, headers)
-        if size is not None:
-            out.append(size)
-    return out
+    sem = asyncio.Semaphore(16)
+
+    async def _one(fu):
+        async with sem:
+            size, _, _ = await get_image_size_with_fallback(fu)  # returns (size, full_url, headers)
+            return size
+
+    sizes = await asyncio.gather(*(_one(fu) for fu in file_urls or []))
+    flush_img_size_cache()
+    return [s for s in sizes if s is not None]
 
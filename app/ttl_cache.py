@@ -0,0 +1,50 @@
+#=================================================================
+# app/ttl_cache.py
+# Tiny in-process TTL cache for async lookups (Woo attribute/term/brand/
+# category listings) that rarely change during a sync run.
+# - Entries keyed by (function name, args); concurrent callers for the
+#   same key wait on one lock, so only one request goes out
+# - Empty results are not cached (a failed listing must not stick)
+# - invalidate("<function name>") drops every entry of that function;
+#   creators call it after a successful mutation
+#=================================================================
+
+import asyncio
+import copy
+import functools
+import time
+from typing import Any, Dict, Tuple
+
+_entries: Dict[Tuple, Tuple[float, Any]] = {}
+_locks: Dict[Tuple, asyncio.Lock] = {}
+
+
+def async_ttl_cache(ttl_seconds: float):
+    """Cache an async function's result per argument tuple for `ttl_seconds`."""
+    def decorator(fn):
+        name = fn.__name__
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            key = (name, args, tuple(sorted(kwargs.items())))
+            hit = _entries.get(key)
+            if hit and hit[0] > time.monotonic():
+                return copy.copy(hit[1])
+            lock = _locks.setdefault(key, asyncio.Lock())
+            async with lock:
+                hit = _entries.get(key)
+                if hit and hit[0] > time.monotonic():
+                    return copy.copy(hit[1])
+                value = await fn(*args, **kwargs)
+                if value:
+                    _entries[key] = (time.monotonic() + ttl_seconds, value)
+                return copy.copy(value)
+
+        return wrapper
+    return decorator
+
+
+def invalidate(name: str) -> None:
+    """Drop all cached entries for the function called `name`."""
+    for key in [k for k in _entries if k[0] == name]:
+        _entries.pop(key, None)
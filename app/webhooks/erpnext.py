@@ -0,0 +1,115 @@
+# app/webhooks/erpnext.py
+# ERPNext → middleware push hook for Item / Item Price changes.
+# Instead of polling the whole catalog, ERPNext posts the changed doc here and
+# we partial-sync only the affected SKUs. Bursts are coalesced: a single drainer
+# task consumes the pending set and loops once more if new codes arrived mid-run.
+import asyncio, base64, hmac, hashlib, json, logging
+from fastapi import APIRouter, Request, Response
+from fastapi.responses import JSONResponse
+from app.config import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+router = APIRouter(prefix="/webhooks/erpnext", tags=["ERPNext Webhooks"])
+
+# Seconds to wait after the first hook so a burst of saves lands in one sync
+_DEBOUNCE_SECONDS = 2.0
+
+# A batch whose sync raises goes back into _pending, retried with exponential
+# backoff up to _MAX_RETRIES times per code before being dropped (and logged)
+_MAX_RETRIES = 5
+_MAX_BACKOFF_SECONDS = 300.0
+
+_pending: set[str] = set()
+_attempts: dict[str, int] = {}
+_lock = asyncio.Lock()
+_drainer: asyncio.Task | None = None
+
+
+def _verify_signature(request: Request, body: bytes) -> bool:
+    """Frappe signs with base64(HMAC-SHA256(secret, body)) in X-Frappe-Webhook-Signature."""
+    secret = getattr(settings, "ERP_WEBHOOK_SECRET", "") or ""
+    if not secret:
+        return False
+    received = request.headers.get("X-Frappe-Webhook-Signature") or ""
+    expected = base64.b64encode(hmac.new(secret.encode("utf-8"), body, hashlib.sha256).digest()).decode("utf-8")
+    return hmac.compare_digest(received, expected)
+
+
+def _item_codes_from_payload(data) -> set[str]:
+    """Accept an Item / Item Price doc, a list of them, or {"item_codes": [...]}."""
+    docs = data if isinstance(data, list) else [data]
+    codes: set[str] = set()
+    for doc in docs:
+        if not isinstance(doc, dict):
+            continue
+        for code in doc.get("item_codes") or []:
+            if code:
+                codes.add(str(code).strip())
+        code = doc.get("item_code") or (doc.get("name") if doc.get("doctype", "Item") == "Item" else None)
+        if code:
+            codes.add(str(code).strip())
+    codes.discard("")
+    return codes
+
+
+async def _drain() -> None:
+    """Consume pending item codes until the set stays empty (loop-once-more on arrivals)."""
+    global _drainer
+    from app.sync.product_sync import sync_products_partial
+
+    await asyncio.sleep(_DEBOUNCE_SECONDS)
+    while True:
+        async with _lock:
+            batch = sorted(_pending)
+            _pending.clear()
+            if not batch:
+                _drainer = None
+                return
+        logger.info("[ERP-HOOK] syncing %d changed SKU(s): %s", len(batch), ", ".join(batch[:10]))
+        try:
+            await sync_products_partial(batch, dry_run=False, respect_preview=False)
+        except Exception as e:
+            logger.error("[ERP-HOOK] partial sync failed for %s: %s", batch, e)
+            retry, dropped = [], []
+            for code in batch:
+                _attempts[code] = _attempts.get(code, 0) + 1
+                if _attempts[code] > _MAX_RETRIES:
+                    _attempts.pop(code)
+                    dropped.append(code)
+                else:
+                    retry.append(code)
+            if dropped:
+                logger.error("[ERP-HOOK] giving up on %d SKU(s) after %d attempts: %s",
+                             len(dropped), _MAX_RETRIES + 1, ", ".join(dropped[:10]))
+            if retry:
+                async with _lock:
+                    _pending.update(retry)
+                delay = min(_DEBOUNCE_SECONDS * 2 ** max(_attempts[c] for c in retry), _MAX_BACKOFF_SECONDS)
+                logger.info("[ERP-HOOK] re-queued %d SKU(s); retrying in %.0fs", len(retry), delay)
+                await asyncio.sleep(delay)
+        else:
+            for code in batch:
+                _attempts.pop(code, None)
+
+
+@router.post("/item")
+async def erpnext_item_hook(request: Request) -> Response:
+    body = await request.body()
+    if not _verify_signature(request, body):
+        logger.warning("[ERP-HOOK] signature mismatch; returning 401")
+        return JSONResponse(status_code=401, content={"ok": False, "reason": "invalid_signature"})
+
+    try:
+        codes = _item_codes_from_payload(json.loads(body or b"{}"))
+    except Exception as e:
+        return JSONResponse(status_code=422, content={"ok": False, "reason": "invalid_payload", "error": str(e)})
+
+    global _drainer
+    async with _lock:
+        _pending.update(codes)
+        if codes and _drainer is None:
+            _drainer = asyncio.create_task(_drain())
+        queued = len(_pending)
+
+    return JSONResponse({"ok": True, "accepted": sorted(codes), "pending": queued})
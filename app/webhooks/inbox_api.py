@@ -1,12 +1,21 @@
 # app/webhooks/inbox_api.py
 from __future__ import annotations
-import json
+import base64
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import orjson
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Response
+from fastapi.responses import FileResponse, ORJSONResponse
 import asyncio
 
+from app.woo_handlers import handle_woo_webhook
+
 try:
     from app.config import settings
     _RAW_BASE = getattr(settings, "WOO_INBOX_BASE", "").strip()
@@ -15,117 +24,230 @@ except Exception:
 
 BASE_RAW = Path(_RAW_BASE or "/code/data/inbox/woo_raw")
 BASE_ORD = Path("/code/data/inbox/woo_orders")  # worker output (audit)
+INBOX_ROOT = Path("/code/data/inbox")
 
-router = APIRouter(prefix="/api/integration/webhooks", tags=["Webhooks Admin"])
+# Sandbox roots for the path-taking endpoints, resolved once rather than per request
+_INBOX_ROOT_RESOLVED = INBOX_ROOT.resolve()
+_BASE_RAW_RESOLVED = BASE_RAW.resolve()
 
-def _ls(dirpath: Path) -> List[Dict[str, Any]]:
-    import logging
-    logger = logging.getLogger("uvicorn.error")
+logger = logging.getLogger("uvicorn.error")
 
-    if not dirpath.exists():
-        return []
-    out: List[Dict[str, Any]] = []
-    def extract_fields(obj):
-        found = {"id": None, "customer": None, "total": None}
-        def _set_if_valid(field, value):
-            if found[field] is None and value not in (None, "", []):
-                found[field] = value
-        def _search(o):
-            if not isinstance(o, dict):
+def _write_json_atomic(path: Path, obj: dict) -> None:
+    """
+    Write `obj` to `path` so readers see the old file or the new one, never a partial.
+    First writes on Linux use an unnamed O_TMPFILE inode linked into place (no .tmp
+    name ever appears). linkat cannot replace an existing file, so rewrites, and
+    filesystems without O_TMPFILE, go through <path>.tmp + os.replace().
+    """
+    data = orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    o_tmpfile = getattr(os, "O_TMPFILE", 0)
+    if o_tmpfile and not path.exists():
+        dir_fd = os.open(path.parent, os.O_DIRECTORY)
+        try:
+            fd = os.open(".", o_tmpfile | os.O_WRONLY, 0o644, dir_fd=dir_fd)
+        except OSError:
+            fd = None  # EOPNOTSUPP/EISDIR: filesystem has no O_TMPFILE
+        try:
+            if fd is not None:
+                os.write(fd, data)
+                # dst_dir_fd makes os.link use linkat(AT_SYMLINK_FOLLOW), which
+                # follows the /proc fd link to the unnamed inode
+                os.link(f"/proc/self/fd/{fd}", path.name, dst_dir_fd=dir_fd)
                 return
+        except OSError:
+            pass  # created concurrently, or no /proc: fall back to replace below
+        finally:
+            if fd is not None:
+                os.close(fd)
+            os.close(dir_fd)
+    tmp_file = str(path) + ".tmp"
+    with open(tmp_file, "wb") as f:
+        f.write(data)
+    os.replace(tmp_file, path)
+
+def _safe_under(path: str, root: Path, root_resolved: Path) -> Optional[Path]:
+    """
+    `path` as a Path when it lies under `root`, else None. A normalised string-prefix
+    test rejects `..` escapes cheaply; realpath() then follows symlinks in every
+    component, so a linked directory inside the inbox can't point outside it.
+    """
+    norm = os.path.normpath(path)
+    if not os.path.isabs(norm):
+        return None
+    if not any(norm.startswith(os.path.join(str(r), "")) for r in (root, root_resolved)):
+        return None
+    if not os.path.realpath(norm).startswith(os.path.join(str(root_resolved), "")):
+        return None
+    return Path(norm)
+
+# ORJSONResponse: /inbox/list returns every inbox row on each poll; orjson encodes it in C
+router = APIRouter(
+    prefix="/api/integration/webhooks",
+    tags=["Webhooks Admin"],
+    default_response_class=ORJSONResponse,
+)
+
+# The admin UI polls /inbox/list. Listings are cached per directory keyed by the
+# directory mtime (archive writes and status os.replace() both bump it); fields
+# extracted from each payload are cached by (mtime_ns, size) so a relist only
+# parses new or changed files. A directory touched within the last
+# _LS_SETTLE_NS is always rescanned: its mtime may not have ticked yet.
+_LS_CACHE: Dict[str, tuple] = {}
+_PAYLOAD_FIELDS: Dict[str, tuple] = {}
+_LS_SETTLE_NS = 2_000_000_000
+_LS_WORKERS = 8
+_ls_lock = threading.Lock()
+
+def _extract_fields(obj, body_obj=None):
+    found = {"id": None, "customer": None, "total": None}
+    _empty = (None, "", [])
+    def _search(root):
+        # Iterative pre-order walk (same visiting order as recursion); stops as soon
+        # as id, customer and total are all filled
+        stack = [root]
+        while stack and not (found["id"] is not None and found["customer"] is not None
+                             and found["total"] is not None):
+            o = stack.pop()
+            if not isinstance(o, dict):
+                continue
             # ID: Use customer id for customer payloads, order id for order payloads
-            if o.get("resource") == "customer" or o.get("topic", "").startswith("customer"):
-                cid = o.get("id")
-                _set_if_valid("id", cid)
-            elif o.get("resource") == "order" or o.get("topic", "").startswith("order"):
-                oid = o.get("order_id") or o.get("id") or o.get("number")
-                _set_if_valid("id", oid)
+            if found["id"] is None:
+                if o.get("resource") == "customer" or o.get("topic", "").startswith("customer"):
+                    cid = o.get("id")
+                    if cid not in _empty:
+                        found["id"] = cid
+                elif o.get("resource") == "order" or o.get("topic", "").startswith("order"):
+                    oid = o.get("order_id") or o.get("id") or o.get("number")
+                    if oid not in _empty:
+                        found["id"] = oid
             # Customer name
-            cust = o.get("customer") or o.get("billing") or o.get("shipping") or {}
-            customer = None
-            if isinstance(cust, dict):
-                first = cust.get("first_name") or ""
-                last = cust.get("last_name") or ""
-                if first or last:
-                    customer = f"{first} {last}".strip()
-                else:
-                    customer = cust.get("full_name") or cust.get("name") or cust.get("email")
-            _set_if_valid("customer", customer)
+            if found["customer"] is None:
+                cust = o.get("customer") or o.get("billing") or o.get("shipping") or {}
+                customer = None
+                if isinstance(cust, dict):
+                    first = cust.get("first_name") or ""
+                    last = cust.get("last_name") or ""
+                    if first or last:
+                        customer = f"{first} {last}".strip()
+                    else:
+                        customer = cust.get("full_name") or cust.get("name") or cust.get("email")
+                if customer not in _empty:
+                    found["customer"] = customer
             # Total
-            total = o.get("total") or o.get("amount") or o.get("line_total")
-            _set_if_valid("total", total)
-            # Recurse
+            if found["total"] is None:
+                total = o.get("total") or o.get("amount") or o.get("line_total")
+                if total not in _empty:
+                    found["total"] = total
+            # Children in reverse so the first value is popped first
+            children = []
             for v in o.values():
                 if isinstance(v, dict):
-                    _search(v)
+                    children.append(v)
                 elif isinstance(v, list):
-                    for item in v:
-                        if isinstance(item, dict):
-                            _search(item)
-
-        # Try to parse and search inside 'body_preview' if present
-        import base64
-        if isinstance(obj, dict):
-            if 'body_preview' in obj and obj['body_preview']:
-                try:
-                    body_obj = json.loads(obj['body_preview'])
-                    _search(body_obj)
-                except Exception:
-                    pass
-            if not all(found.values()) and 'body_b64' in obj and obj['body_b64']:
-                try:
-                    decoded = base64.b64decode(obj['body_b64']).decode('utf-8')
-                    body_obj = json.loads(decoded)
-                    _search(body_obj)
-                except Exception:
-                    pass
-        # Fallback: search the original object
-        if not all(found.values()):
-            _search(obj)
-        return found["id"], found["customer"], found["total"]
-
-    for p in sorted(dirpath.glob("*.json")):
-        # Skip .status.json files
-        if p.name.endswith('.status.json'):
-            continue
-        st = p.stat()
-        meta_path = p.with_suffix('.status.json')
-        status = None
-        if meta_path.exists():
+                    children.extend(item for item in v if isinstance(item, dict))
+            stack.extend(reversed(children))
+
+    # Try to parse and search inside 'body_preview' if present, then the full
+    # body (decoded once by the caller from body_b64)
+    if isinstance(obj, dict):
+        if 'body_preview' in obj and obj['body_preview']:
             try:
-                status = json.loads(meta_path.read_text(encoding="utf-8"))
+                _search(orjson.loads(obj['body_preview']))
             except Exception:
-                status = None
-        order_id = None
-        customer = None
-        total = None
-        webshot_action = None
-        try:
-            with open(p, "r", encoding="utf-8") as f:
-                payload = json.load(f)
-            order_id, customer, total = extract_fields(payload)
-            # Extract original webhook status for webshot_action
-            webshot_action = None
-            # Try to decode body_b64 if present
-            if isinstance(payload, dict):
-                raw_status = None
-                if "body_b64" in payload and payload["body_b64"]:
-                    import base64
-                    try:
-                        decoded = base64.b64decode(payload["body_b64"]).decode("utf-8")
-                        decoded_json = json.loads(decoded)
-                        raw_status = decoded_json.get("status")
-                    except Exception:
-                        pass
-                # Fallback to top-level status if not found in decoded body
-                if not raw_status:
-                    raw_status = payload.get("status")
-                webshot_action = raw_status
-        except Exception:
-            pass
+                pass
+        if not all(found.values()) and body_obj is not None:
+            _search(body_obj)
+    # Fallback: search the original object
+    if not all(found.values()):
+        _search(obj)
+    return found["id"], found["customer"], found["total"]
+
+def _payload_fields(path: str) -> tuple:
+    """(order_id, customer, total, webshot_action) for one inbox payload file."""
+    order_id = None
+    customer = None
+    total = None
+    webshot_action = None
+    try:
+        with open(path, "rb") as f:
+            payload = orjson.loads(f.read())
+        # Decode body_b64 once; both field extraction and webshot_action use it
+        body_obj = None
+        if isinstance(payload, dict) and payload.get("body_b64"):
+            try:
+                body_obj = orjson.loads(base64.b64decode(payload["body_b64"]))
+            except Exception:
+                body_obj = None
+        order_id, customer, total = _extract_fields(payload, body_obj)
+        # Extract original webhook status for webshot_action
+        if isinstance(payload, dict):
+            raw_status = body_obj.get("status") if isinstance(body_obj, dict) else None
+            # Fallback to top-level status if not found in decoded body
+            if not raw_status:
+                raw_status = payload.get("status")
+            webshot_action = raw_status
+    except Exception:
+        pass
+    return order_id, customer, total, webshot_action
+
+def _status_name(name: str) -> str:
+    """<name>.json → <name>.status.json by slicing (no Path allocation / suffix parse)."""
+    if name.endswith(".json"):
+        return name[:-5] + ".status.json"
+    return str(Path(name).with_suffix(".status.json"))
+
+def _read_status(path: str) -> Optional[dict]:
+    try:
+        with open(path, "rb") as f:
+            return orjson.loads(f.read())
+    except Exception:
+        return None
+
+def _scan(dirpath: Path) -> tuple:
+    """
+    One readdir: payload entries (sorted by name) with their stats, plus the names of
+    the .status.json sidecars so sidecar presence is a set lookup, not an exists() stat.
+    """
+    entries = []
+    status_names = set()
+    with os.scandir(dirpath) as it:
+        for e in it:
+            if e.name.endswith('.status.json'):
+                status_names.add(e.name)
+            elif e.name.endswith('.json'):
+                entries.append(e)
+    entries.sort(key=lambda e: e.name)
+    stats = [e.stat(follow_symlinks=False) for e in entries]
+    return entries, stats, status_names
+
+def _rows(entries: list, stats: list, status_names: set) -> List[Dict[str, Any]]:
+    """Listing rows for the given entries; only new/changed payloads are parsed."""
+    misses = [
+        e.path for e, st in zip(entries, stats)
+        if (_PAYLOAD_FIELDS.get(e.path) or (None,))[0] != (st.st_mtime_ns, st.st_size)
+    ]
+    # New/changed payloads are read on a small pool: file reads overlap (NFS-mounted
+    # inboxes are latency-bound) while the bounded worker count caps open fds
+    if len(misses) > 1:
+        with ThreadPoolExecutor(max_workers=min(_LS_WORKERS, len(misses))) as pool:
+            fresh = dict(zip(misses, pool.map(_payload_fields, misses)))
+    else:
+        fresh = {path: _payload_fields(path) for path in misses}
+
+    out: List[Dict[str, Any]] = []
+    for entry, st in zip(entries, stats):
+        status = None
+        if _status_name(entry.name) in status_names:
+            status = _read_status(_status_name(entry.path))
+        if entry.path in fresh:
+            fields = fresh[entry.path]
+            _PAYLOAD_FIELDS[entry.path] = ((st.st_mtime_ns, st.st_size), fields)
+        else:
+            fields = _PAYLOAD_FIELDS[entry.path][1]
+        order_id, customer, total, webshot_action = fields
         out.append({
-            "name": p.name,
-            "path": str(p),
+            "name": entry.name,
+            "path": entry.path,
             "mtime": int(st.st_mtime),
             "size": st.st_size,
             "status": status or {},
@@ -134,125 +256,189 @@ def _ls(dirpath: Path) -> List[Dict[str, Any]]:
             "total": total,
             "webshot_action": webshot_action
         })
+    return out
 
+def _ls(dirpath: Path) -> List[Dict[str, Any]]:
+    # Serialised: concurrent polls wait here and then usually hit the listing cache
+    with _ls_lock:
+        return _ls_locked(dirpath)
+
+def _ls_locked(dirpath: Path) -> List[Dict[str, Any]]:
+    try:
+        dir_mtime = os.stat(dirpath).st_mtime_ns
+    except FileNotFoundError:
+        return []
+    key = str(dirpath)
+    hit = _LS_CACHE.get(key)
+    if hit and hit[0] == dir_mtime:
+        return hit[1]
+    settled = time.time_ns() - dir_mtime > _LS_SETTLE_NS
+
+    entries, stats, status_names = _scan(dirpath)
+    out = _rows(entries, stats, status_names)
+
+    # Forget extracted fields for payloads that are gone from this directory
+    live = {entry.path for entry in entries}
+    prefix = os.path.join(key, "")
+    for path in [k for k in _PAYLOAD_FIELDS if k.startswith(prefix) and k not in live]:
+        del _PAYLOAD_FIELDS[path]
+    if settled:
+        _LS_CACHE[key] = (dir_mtime, out)
+    else:
+        _LS_CACHE.pop(key, None)
     return out
 
+_LS_SORTS = {
+    "name_asc": (lambda e, st: e.name, False),
+    "name_desc": (lambda e, st: e.name, True),
+    "mtime_asc": (lambda e, st: (st.st_mtime_ns, e.name), False),
+    "mtime_desc": (lambda e, st: (st.st_mtime_ns, e.name), True),
+}
+
+def _ls_page(dirpath: Path, offset: int, limit: int, sort: str) -> Dict[str, Any]:
+    """
+    One page of the listing: names and stats for every file (cheap), but payloads
+    and sidecars are read only for the rows inside [offset, offset + limit).
+    """
+    with _ls_lock:
+        try:
+            entries, stats, status_names = _scan(dirpath)
+        except FileNotFoundError:
+            entries, stats, status_names = [], [], set()
+        keyfn, reverse = _LS_SORTS[sort]
+        pairs = sorted(zip(entries, stats), key=lambda es: keyfn(*es), reverse=reverse)
+        window = pairs[offset:offset + limit]
+        items = _rows([e for e, _ in window], [st for _, st in window], status_names)
+    return {"items": items, "total": len(pairs), "offset": offset, "limit": limit}
+
 # List inbox files (raw)
 @router.get("/inbox/list")
-async def list_inbox(kind: str = Query("raw", description="Type of inbox to list: raw or orders")):
+async def list_inbox(
+    kind: str = Query("raw", description="Type of inbox to list: raw or orders"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Page size; omit for the full list"),
+    offset: int = Query(0, ge=0),
+    sort: str = Query("name_asc", description="name_asc, name_desc, mtime_asc or mtime_desc"),
+):
+    """
+    Without `limit`: the full listing as a plain list (what the admin UI reads).
+    With `limit`: {"items", "total", "offset", "limit"}, parsing only that page.
+    """
     if kind == "raw":
         base = BASE_RAW
     elif kind == "orders":
         base = BASE_ORD
     else:
         raise HTTPException(status_code=400, detail=f"Unknown kind: {kind}")
-    out = _ls(base)
-    return out
+    if sort not in _LS_SORTS:
+        raise HTTPException(status_code=400, detail=f"Unknown sort: {sort}")
+    # File reads and parsing run off the event loop
+    if limit is None:
+        return await asyncio.to_thread(_ls, base)
+    return await asyncio.to_thread(_ls_page, base, offset, limit, sort)
 
-# Replay archived webhook payload (internal re-processing)
-# ----------------------------------------------------------------------
-@router.post("/inbox/replay")
-async def replay_inbox(path: str = Query(..., description="Absolute path under /code/data/inbox/*")):
-    """Re-process an archived webhook payload as if it just arrived."""
-    import logging
-    logger = logging.getLogger("uvicorn.error")
-    from app.woo_handlers import handle_woo_webhook
-    p = Path(path)
-    root = Path("/code/data/inbox")
-    try:
-        p.resolve().relative_to(root.resolve())
-    except Exception:
-        logger.error(f"[INBOX][REPLAY] Path not under /code/data/inbox: {path}")
-        raise HTTPException(status_code=400, detail="Path not under /code/data/inbox")
+def _inbox_file(path: str, root: Path, root_resolved: Path, tag: str, outside_detail: str) -> Path:
+    """Validated Path for an inbox endpoint: 400 outside `root`, 404 when missing."""
+    p = _safe_under(path, root, root_resolved)
+    if p is None:
+        logger.error(f"[INBOX][{tag}] Path not under {root}: {path}")
+        raise HTTPException(status_code=400, detail=outside_detail)
     if not p.exists():
-        logger.error(f"[INBOX][REPLAY] File not found: {path}")
-        raise HTTPException(status_code=404, detail="Not found")
+        logger.error(f"[INBOX][{tag}] File not found: {path}")
+        raise HTTPException(status_code=404, detail="Not Found")
+    return p
+
+def _load_inbox_json(p: Path, tag: str) -> Any:
     try:
-        payload = json.loads(p.read_text(encoding="utf-8"))
+        return orjson.loads(p.read_bytes())
     except Exception as e:
-        logger.error(f"[INBOX][REPLAY] Invalid JSON in {path}: {e}")
+        logger.error(f"[INBOX][{tag}] Invalid JSON in {p}: {e}")
         raise HTTPException(status_code=400, detail=f"Invalid JSON: {e}")
 
+def _write_status(p: Path, tag: str, **changes) -> dict:
+    """
+    Merge `changes` into the payload's .status.json sidecar and write it atomically.
+    A None value removes that key. Write errors propagate to the caller.
+    """
+    meta_path = Path(_status_name(str(p)))
+    meta = {}
+    if meta_path.exists():
+        try:
+            meta = orjson.loads(meta_path.read_bytes())
+        except Exception as e:
+            logger.error(f"[INBOX][{tag}] Failed to read {meta_path}: {e}")
+            meta = {}
+    for k, v in changes.items():
+        if v is None:
+            meta.pop(k, None)
+        else:
+            meta[k] = v
+    _write_json_atomic(meta_path, meta)
+    logger.info(f"[INBOX][{tag}] Wrote status '{meta.get('status')}' to {meta_path}")
+    return meta
 
-    # If this is a wrapper (from get_inbox), unwrap to .json field
-    if isinstance(payload, dict) and "json" in payload and isinstance(payload["json"], dict):
-        logger.info(f"[INBOX][REPLAY] Unwrapping payload['json'] for handler")
-        payload = payload["json"]
-        logger.info(f"[INBOX][REPLAY] After unwrap, payload type: {type(payload).__name__}, keys: {list(payload.keys()) if isinstance(payload, dict) else 'n/a'}")
-
-    # If payload is still missing resource/event, try decoding body_b64
-    resource = payload.get("resource") if isinstance(payload, dict) else None
-    event = payload.get("event") if isinstance(payload, dict) else None
-    if resource is None and event is None and isinstance(payload, dict) and "body_b64" in payload:
-        import base64
-        decoded = base64.b64decode(payload["body_b64"])
-        decoded_json = json.loads(decoded)
-        logger.info(f"[INBOX][REPLAY] Decoded body_b64, keys: {list(decoded_json.keys()) if isinstance(decoded_json, dict) else 'n/a'}")
-        logger.info(f"[INBOX][REPLAY] Decoded body_b64 full payload: {json.dumps(decoded_json, indent=2, ensure_ascii=False)}")
-        payload = decoded_json
-        resource = payload.get("resource") if isinstance(payload, dict) else None
-        event = payload.get("event") if isinstance(payload, dict) else None
-        
-    # removed verbose replay log
+def _unwrap_payload(payload: Any) -> Any:
+    """
+    Shape an archived file for handle_woo_webhook: unwrap a get_inbox-style {"json": {...}}
+    wrapper, then, when resource and event are both absent, replace it with the decoded
+    body_b64.
+    """
+    if not isinstance(payload, dict):
+        return payload
+    inner = payload.get("json")
+    if isinstance(inner, dict):
+        logger.info("[INBOX][REPLAY] Unwrapping payload['json'] for handler")
+        payload = inner
+    if payload.get("resource") is None and payload.get("event") is None and "body_b64" in payload:
+        payload = orjson.loads(base64.b64decode(payload["body_b64"]))
+        logger.info(f"[INBOX][REPLAY] Decoded body_b64, keys: {list(payload.keys()) if isinstance(payload, dict) else 'n/a'}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"[INBOX][REPLAY] Decoded body_b64 full payload: {orjson.dumps(payload, option=orjson.OPT_INDENT_2).decode()}")
+    return payload
+
+# Replay archived webhook payload (internal re-processing)
+# ----------------------------------------------------------------------
+@router.post("/inbox/replay")
+async def replay_inbox(path: str = Query(..., description="Absolute path under /code/data/inbox/*")):
+    """Re-process an archived webhook payload as if it just arrived."""
+    p = _inbox_file(path, INBOX_ROOT, _INBOX_ROOT_RESOLVED, "REPLAY", "Path not under /code/data/inbox")
+    payload = _unwrap_payload(_load_inbox_json(p, "REPLAY"))
 
     # Call the internal handler (async) and check result
     try:
         result = await handle_woo_webhook(payload)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Handler error: {e}")
-    # If replay succeeded, mark status as completed
-    import logging
-    logger = logging.getLogger("uvicorn.error")
-    meta_path = p.with_suffix('.status.json')
-    meta = {}
-    if meta_path.exists():
-        try:
-            meta = json.loads(meta_path.read_text(encoding="utf-8"))
-        except Exception as e:
-            logger.error(f"[STATUS] Failed to read {meta_path}: {e}")
-            meta = {}
     logger.info(f"[STATUS][DEBUG] replay_inbox result: {result!r}")
-    import os
+    # Record the outcome on the sidecar: failed (with error) or completed
     if result is not None:
         if isinstance(result, dict) and not result.get("success", False):
-            meta["status"] = "failed"
-            meta["error"] = result.get("error", "Unknown error")
-            logger.info(f"[STATUS][DEBUG] Attempting to write status 'failed' to {meta_path}")
+            changes = {"status": "failed", "error": result.get("error", "Unknown error")}
         else:
-            meta["status"] = "completed"
-            meta.pop("error", None)
-            logger.info(f"[STATUS][DEBUG] Attempting to write status 'completed' to {meta_path}")
-        tmp_file = str(meta_path) + ".tmp"
+            changes = {"status": "completed", "error": None}
         try:
-            with open(tmp_file, "w", encoding="utf-8") as f:
-                json.dump(meta, f, indent=2, ensure_ascii=False)
-            os.replace(tmp_file, meta_path)
-            logger.info(f"[STATUS] Wrote status '{meta['status']}' to {meta_path}")
+            _write_status(p, "REPLAY", **changes)
         except Exception as e:
-            logger.error(f"[STATUS] Failed to write {meta_path}: {e}")
+            logger.error(f"[INBOX][REPLAY] Failed to write status for {p}: {e}")
     return {"ok": True, "path": str(p)}
 
 # Get raw JSON file content for Inbox 'View' button
 @router.get("/inbox/get")
 async def get_inbox_payload(path: str = Query(..., description="Absolute path under /code/data/inbox/woo_raw/*")):
-    import logging
-    logger = logging.getLogger("uvicorn.error")
-    base = BASE_RAW
-    p = Path(path)
+    """The archived JSON, validated but sent as the stored bytes (no re-serialisation)."""
+    p = _inbox_file(path, BASE_RAW, _BASE_RAW_RESOLVED, "GET", "Path not under inbox base")
+    raw = p.read_bytes()
     try:
-        p.resolve().relative_to(base.resolve())
-    except Exception:
-        logger.error(f"[INBOX][GET] Path not under {base}: {path}")
-        raise HTTPException(status_code=400, detail="Path not under inbox base")
-    if not p.exists():
-        logger.error(f"[INBOX][GET] File not found: {path}")
-        raise HTTPException(status_code=404, detail="Not Found")
-    try:
-        payload = json.loads(p.read_text(encoding="utf-8"))
+        orjson.loads(raw)
     except Exception as e:
-        logger.error(f"[INBOX][GET] Invalid JSON in {path}: {e}")
+        logger.error(f"[INBOX][GET] Invalid JSON in {p}: {e}")
         raise HTTPException(status_code=400, detail=f"Invalid JSON: {e}")
-    return payload
+    return Response(content=raw, media_type="application/json")
+
+# Same file streamed as-is (sendfile), without the JSON validity check
+@router.get("/inbox/get/raw")
+async def get_inbox_payload_raw(path: str = Query(..., description="Absolute path under /code/data/inbox/woo_raw/*")):
+    p = _inbox_file(path, BASE_RAW, _BASE_RAW_RESOLVED, "GET", "Path not under inbox base")
+    return FileResponse(p, media_type="application/json")
 
 # Set status for an inbox file (archive/unarchive)
 @router.post("/inbox/set_status")
@@ -260,35 +446,10 @@ async def set_inbox_status(
     path: str = Query(..., description="Absolute path under /code/data/inbox/woo_raw/*"),
     status: str = Query(..., description="Status to set (archived, unarchived, etc.)")
 ):
-    import logging
-    logger = logging.getLogger("uvicorn.error")
-    base = BASE_RAW
-    p = Path(path)
-    try:
-        p.resolve().relative_to(base.resolve())
-    except Exception:
-        logger.error(f"[INBOX][SET_STATUS] Path not under {base}: {path}")
-        raise HTTPException(status_code=400, detail="Path not under inbox base")
-    if not p.exists():
-        logger.error(f"[INBOX][SET_STATUS] File not found: {path}")
-        raise HTTPException(status_code=404, detail="Not Found")
-    meta_path = p.with_suffix('.status.json')
-    meta = {}
-    if meta_path.exists():
-        try:
-            meta = json.loads(meta_path.read_text(encoding="utf-8"))
-        except Exception as e:
-            logger.error(f"[INBOX][SET_STATUS] Failed to read {meta_path}: {e}")
-            meta = {}
-    meta["status"] = status
-    import os
-    tmp_file = str(meta_path) + ".tmp"
+    p = _inbox_file(path, BASE_RAW, _BASE_RAW_RESOLVED, "SET_STATUS", "Path not under inbox base")
     try:
-        with open(tmp_file, "w", encoding="utf-8") as f:
-            json.dump(meta, f, indent=2, ensure_ascii=False)
-        os.replace(tmp_file, meta_path)
-        logger.info(f"[INBOX][SET_STATUS] Wrote status '{status}' to {meta_path}")
+        _write_status(p, "SET_STATUS", status=status)
     except Exception as e:
-        logger.error(f"[INBOX][SET_STATUS] Failed to write {meta_path}: {e}")
+        logger.error(f"[INBOX][SET_STATUS] Failed to write status for {p}: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to write status: {e}")
-    return {"ok": True, "path": str(p), "status": status}
\ No newline at end of file
+    return {"ok": True, "path": str(p), "status": status}
@@ -3,9 +3,13 @@
 # WooCommerce API interface module.
 # Functions to interact with WooCommerce for products, categories, images, and maintenance.
 #==========================================================================================
-import httpx, os, logging, hashlib
+import asyncio, httpx, os, json, logging, hashlib
+from collections import OrderedDict
+import orjson
 from urllib.parse import urlparse
 from app.config import settings
+from app.http_client import get_client, get_wp_client
+from app.ttl_cache import async_ttl_cache, invalidate
 from typing import Any, Dict, List
 
 WC_BASE_URL = settings.WC_BASE_URL
@@ -18,8 +22,95 @@ WC_BASIC_PASS = settings.WC_BASIC_PASS
 
 logger = logging.getLogger("uvicorn.error")
 
+# ---- Pagination ----
+
+# Conditional-GET cache for list pages: (base_url, url, params) → (etag, body, total_pages).
+# Unchanged pages come back as 304 with no body and are served from here. LRU-bounded:
+# room for the taxonomy listings (categories, attributes + terms per attribute, brands)
+# without growing with every one-off filtered query. The raw body is kept and decoded
+# again on a hit, so callers never share (or mutate) cached rows.
+_PAGE_ETAGS_MAX = 512
+_page_etags: "OrderedDict[tuple, tuple]" = OrderedDict()
+
+async def _fetch_page(client: httpx.AsyncClient, url: str, params: dict, kwargs: dict):
+    """One list page with If-None-Match. Returns (status_code, rows, total_pages)."""
+    key = (str(client.base_url), url, tuple(sorted((k, str(v)) for k, v in params.items())))
+    hit = _page_etags.get(key)
+    if hit:
+        _page_etags.move_to_end(key)
+    headers = dict(kwargs.get("headers") or {})
+    if hit:
+        headers["If-None-Match"] = hit[0]
+    resp = await client.get(url, params=params, **{**kwargs, "headers": headers})
+    if resp.status_code == 304 and hit:
+        return 200, list(orjson.loads(hit[1]) or []), hit[2]
+    if resp.status_code != 200:
+        return resp.status_code, resp.text[:300], 1
+    rows = list(orjson.loads(resp.content) or [])
+    try:
+        total_pages = int(resp.headers.get("X-WP-TotalPages") or 1)
+    except ValueError:
+        total_pages = 1
+    if resp.headers.get("etag"):
+        _page_etags[key] = (resp.headers["etag"], resp.content, total_pages)
+        _page_etags.move_to_end(key)
+        while len(_page_etags) > _PAGE_ETAGS_MAX:
+            _page_etags.popitem(last=False)
+    return 200, rows, total_pages
+
+async def fetch_all_pages(client: httpx.AsyncClient, url: str, *, params: dict | None = None, **kwargs) -> list:
+    """
+    GET every page of a WP/WC collection endpoint: page 1 first, read X-WP-TotalPages,
+    then fetch pages 2..N concurrently. Extra kwargs (auth, headers) go to each request.
+    Pages are revalidated with their last ETag, so unchanged pages cost a 304.
+    Pages that fail are logged and skipped; a failed first page returns [].
+    """
+    base = {"per_page": 100, **(params or {})}
+    status, first, total_pages = await _fetch_page(client, url, {**base, "page": 1}, kwargs)
+    if status != 200:
+        logger.error("[WC] list %s failed: %s %s", url, status, first)
+        return []
+    items = list(first)
+    if total_pages <= 1:
+        return items
+
+    rest = await asyncio.gather(
+        *(_fetch_page(client, url, {**base, "page": p}, kwargs) for p in range(2, total_pages + 1)),
+        return_exceptions=True,
+    )
+    for p, res in enumerate(rest, start=2):
+        if isinstance(res, Exception) or res[0] != 200:
+            logger.error("[WC] list %s page %d failed: %s", url, p, res if isinstance(res, Exception) else res[0])
+            continue
+        items.extend(res[1])
+    return items
+
 # ---- Products ----
 
+async def get_wc_products_by_skus(skus):
+    """
+    Fetch only the WooCommerce products for the given SKUs
+    (comma-separated `sku` filter, chunked to keep URLs short).
+    """
+    auth = (WC_API_KEY, WC_API_SECRET)
+    wanted = sorted({s for s in (skus or []) if s})
+    products = []
+    for i in range(0, len(wanted), 50):
+        chunk = ",".join(wanted[i:i + 50])
+        try:
+            resp = await get_client().get(
+                f"{WC_BASE_URL}/wp-json/wc/v3/products",
+                auth=auth,
+                params={"sku": chunk, "per_page": 100},
+            )
+        except Exception as e:
+            logger.error(f"[WC] get_wc_products_by_skus error: {e}")
+            continue
+        if resp.status_code == 200:
+            products.extend(orjson.loads(resp.content) or [])
+    return products
+
+
 async def get_wc_products():
     """Fetch all WooCommerce products (paginated, unlimited)."""
     auth = (WC_API_KEY, WC_API_SECRET)
@@ -27,15 +118,14 @@ async def get_wc_products():
     page = 1
     while True:
         url = f"{WC_BASE_URL}/wp-json/wc/v3/products?per_page=100&page={page}"
-        async with httpx.AsyncClient(timeout=20.0, verify=False) as client:
-            try:
-                resp = await client.get(url, auth=auth)
-            except Exception as e:
-                print(f"Error fetching WooCommerce products: {e}")
-                break
+        try:
+            resp = await get_client().get(url, auth=auth)
+        except Exception as e:
+            print(f"Error fetching WooCommerce products: {e}")
+            break
         if resp.status_code != 200:
             break
-        batch = resp.json()
+        batch = orjson.loads(resp.content)
         if not batch:
             break
         products.extend(batch)
@@ -48,47 +138,82 @@ async def get_wc_products():
 async def create_wc_product(product_data):
     url = f"{WC_BASE_URL}/wp-json/wc/v3/products"
     auth = (WC_API_KEY, WC_API_SECRET)
-    async with httpx.AsyncClient(timeout=20.0, verify=False) as client:
-        try:
-            resp = await client.post(url, auth=auth, json=product_data)
-            if resp.status_code not in (200, 201):
-                ctype = (resp.headers.get("content-type") or "").lower()
-                body = resp.text
-                try:
-                    if "application/json" in ctype:
-                        body = resp.json()
-                except Exception:
-                    pass
-                logger.error(f"[WC] create product {resp.status_code} {ctype} body={str(body)[:800]}")
-            return {"status_code": resp.status_code, "data": resp.json() if resp.content else None, "raw": resp.text}
-        except Exception as e:
-            return {"error": str(e)}
+    try:
+        resp = await get_client().post(url, auth=auth, json=product_data)
+        if resp.status_code not in (200, 201):
+            ctype = (resp.headers.get("content-type") or "").lower()
+            body = resp.text
+            try:
+                if "application/json" in ctype:
+                    body = resp.json()
+            except Exception:
+                pass
+            logger.error(f"[WC] create product {resp.status_code} {ctype} body={str(body)[:800]}")
+        return {"status_code": resp.status_code, "data": resp.json() if resp.content else None, "raw": resp.text}
+    except Exception as e:
+        return {"error": str(e)}
 
 
 async def update_wc_product(product_id, product_data):
     """Update a WooCommerce product by ID."""
     url = f"{WC_BASE_URL}/wp-json/wc/v3/products/{product_id}"
     auth = (WC_API_KEY, WC_API_SECRET)
-    async with httpx.AsyncClient(timeout=20.0, verify=False) as client:
-        try:
-            resp = await client.put(url, auth=auth, json=product_data)
-            return {"status_code": resp.status_code, "data": resp.json() if resp.content else None}
-        except Exception as e:
-            return {"error": str(e)}
+    try:
+        resp = await get_client().put(url, auth=auth, json=product_data)
+        return {"status_code": resp.status_code, "data": resp.json() if resp.content else None}
+    except Exception as e:
+        return {"error": str(e)}
+
+async def batch_wc_products(create=None, update=None, chunk_size=100):
+    """
+    Create/update many products through POST /products/batch (Woo caps a batch at 100
+    operations). Chunks go out concurrently, a few at a time. Returns
+    {"create": [...], "update": [...]} aligned with the inputs; each entry is the product
+    dict Woo returned or {"error": ...} for that operation.
+    """
+    url = f"{WC_BASE_URL}/wp-json/wc/v3/products/batch"
+    auth = (WC_API_KEY, WC_API_SECRET)
+    create, update = list(create or []), list(update or [])
+    ops = [("create", i, p) for i, p in enumerate(create)] + [("update", i, p) for i, p in enumerate(update)]
+    out = {"create": [None] * len(create), "update": [None] * len(update)}
+    sem = asyncio.Semaphore(4)
+
+    async def _send(chunk):
+        body = {"create": [p for op, _, p in chunk if op == "create"],
+                "update": [p for op, _, p in chunk if op == "update"]}
+        async with sem:
+            try:
+                resp = await get_client().post(url, auth=auth, json=body, timeout=120.0)
+                if resp.status_code not in (200, 201):
+                    logger.error(f"[WC] batch products {resp.status_code} body={resp.text[:800]}")
+                    err = {"error": {"status_code": resp.status_code, "body": resp.text[:800]}}
+                    return {op: [err] * len(body[op]) for op in body}
+                data = resp.json() or {}
+                return {op: list(data.get(op) or []) for op in body}
+            except Exception as e:
+                return {op: [{"error": str(e)}] * len(body[op]) for op in body}
+
+    chunks = [ops[i:i + chunk_size] for i in range(0, len(ops), chunk_size)]
+    for chunk, res in zip(chunks, await asyncio.gather(*(_send(c) for c in chunks))):
+        for op in ("create", "update"):
+            idxs = [i for o, i, _ in chunk if o == op]
+            rows = res.get(op) or []
+            for pos, i in enumerate(idxs):
+                out[op][i] = rows[pos] if pos < len(rows) else {"error": "missing from batch response"}
+    return out
 
 # ---- Categories ----
 
+@async_ttl_cache(30)
 async def get_wc_categories():
-    """Fetch all WooCommerce product categories."""
-    url = f"{WC_BASE_URL}/wp-json/wc/v3/products/categories?per_page=100"
+    """Fetch all WooCommerce product categories (cached 30s; create_wc_category busts it)."""
+    url = f"{WC_BASE_URL}/wp-json/wc/v3/products/categories"
     auth = (WC_API_KEY, WC_API_SECRET)
-    async with httpx.AsyncClient(timeout=20.0, verify=False) as client:
-        try:
-            resp = await client.get(url, auth=auth)
-            return resp.json() if resp.status_code == 200 else []
-        except Exception as e:
-            print("Error fetching WooCommerce categories:", e)
-            return []
+    try:
+        return await fetch_all_pages(get_client(), url, auth=auth)
+    except Exception as e:
+        print("Error fetching WooCommerce categories:", e)
+        return []
 
 
 async def create_wc_category(name, parent_id=None):
@@ -98,12 +223,12 @@ async def create_wc_category(name, parent_id=None):
     payload = {"name": name}
     if parent_id:
         payload["parent"] = parent_id
-    async with httpx.AsyncClient(timeout=20.0, verify=False) as client:
-        try:
-            resp = await client.post(url, auth=auth, json=payload)
-            return resp.json()
-        except Exception as e:
-            return {"error": str(e)}
+    try:
+        resp = await get_client().post(url, auth=auth, json=payload)
+        invalidate("get_wc_categories")
+        return resp.json()
+    except Exception as e:
+        return {"error": str(e)}
 
 # ---- Maintenance Utilities ----
 
@@ -112,14 +237,13 @@ async def purge_wc_bin_products():
     url = f"{WC_BASE_URL}/wp-json/wc/v3/products?status=trash&per_page=100"
     auth = (WC_API_KEY, WC_API_SECRET)
     try:
-        async with httpx.AsyncClient(timeout=20.0, verify=False) as client:
-            resp = await client.get(url, auth=auth)
+        client = get_client()
+        resp = await client.get(url, auth=auth)
         trashed = resp.json() if resp.status_code == 200 else []
         results = []
         for product in trashed:
             del_url = f"{WC_BASE_URL}/wp-json/wc/v3/products/{product['id']}?force=true"
-            async with httpx.AsyncClient(timeout=20.0, verify=False) as client:
-                del_resp = await client.delete(del_url, auth=auth)
+            del_resp = await client.delete(del_url, auth=auth)
             results.append({
                 "id": product["id"],
                 "name": product.get("name"),
@@ -137,11 +261,11 @@ async def purge_all_wc_products():
     try:
         products = await get_wc_products()
         auth = (WC_API_KEY, WC_API_SECRET)
+        client = get_client()
         results = []
         for product in products:
             del_url = f"{WC_BASE_URL}/wp-json/wc/v3/products/{product['id']}?force=true"
-            async with httpx.AsyncClient(timeout=20.0, verify=False) as client:
-                del_resp = await client.delete(del_url, auth=auth)
+            del_resp = await client.delete(del_url, auth=auth)
             results.append({
                 "id": product["id"],
                 "name": product.get("name"),
@@ -158,19 +282,19 @@ async def purge_wc_product_variations(product_id):
     url = f"{WC_BASE_URL}/wp-json/wc/v3/products/{product_id}/variations?per_page=100"
     auth = (WC_API_KEY, WC_API_SECRET)
     try:
-        async with httpx.AsyncClient(timeout=20.0, verify=False) as client:
-            resp = await client.get(url, auth=auth)
-            variations = resp.json() if resp.status_code == 200 else []
-            results = []
-            for var in variations:
-                del_url = f"{WC_BASE_URL}/wp-json/wc/v3/products/{product_id}/variations/{var['id']}?force=true"
-                del_resp = await client.delete(del_url, auth=auth)
-                results.append({
-                    "id": var["id"],
-                    "deleted": del_resp.status_code == 200,
-                    "status_code": del_resp.status_code
-                })
-            return {"count_deleted": len(results), "results": results}
+        client = get_client()
+        resp = await client.get(url, auth=auth)
+        variations = resp.json() if resp.status_code == 200 else []
+        results = []
+        for var in variations:
+            del_url = f"{WC_BASE_URL}/wp-json/wc/v3/products/{product_id}/variations/{var['id']}?force=true"
+            del_resp = await client.delete(del_url, auth=auth)
+            results.append({
+                "id": var["id"],
+                "deleted": del_resp.status_code == 200,
+                "status_code": del_resp.status_code
+            })
+        return {"count_deleted": len(results), "results": results}
     except Exception as e:
         return {"error": str(e)}
 
@@ -180,9 +304,9 @@ async def list_wc_bin_products():
     url = f"{WC_BASE_URL}/wp-json/wc/v3/products?status=trash&per_page=100"
     auth = (WC_API_KEY, WC_API_SECRET)
     try:
-        async with httpx.AsyncClient(timeout=20.0, verify=False) as client:
-            resp = await client.get(url, auth=auth)
-            return resp.json() if resp.status_code == 200 else []
+        client = get_client()
+        resp = await client.get(url, auth=auth)
+        return resp.json() if resp.status_code == 200 else []
     except Exception as e:
         return {"error": str(e)}
 
@@ -204,30 +328,29 @@ async def upload_wc_image_from_erpnext(image_url: str, filename: str,
     if not image_url.lower().startswith(("http://", "https://")):
         image_url = settings.ERP_URL.rstrip("/") + image_url
 
-    async with httpx.AsyncClient(timeout=30.0, verify=False) as erp_client:
-        img_resp = await erp_client.get(image_url, headers=headers_erp)
-        if img_resp.status_code != 200:
-            return {"error": "Failed to download image", "status": img_resp.status_code}
-        img_bytes    = img_resp.content
-        content_type = img_resp.headers.get("Content-Type", "application/octet-stream")
+    erp_client = get_client()
+    img_resp = await erp_client.get(image_url, headers=headers_erp, timeout=30.0)
+    if img_resp.status_code != 200:
+        return {"error": "Failed to download image", "status": img_resp.status_code}
+    img_bytes    = img_resp.content
+    content_type = img_resp.headers.get("Content-Type", "application/octet-stream")
 
     # 2) Upload to WP
     media_url = f"{WC_BASE_URL}/wp-json/wp/v2/media"
-    auth      = (WP_USERNAME, WP_PASSWORD)
     upload_headers = {
         "Content-Disposition": f'attachment; filename="{filename}"',
         "Content-Type": content_type,
     }
 
-    async with httpx.AsyncClient(timeout=20.0, verify=False, auth=auth) as wp:
-        up_resp = await wp.post(media_url, content=img_bytes, headers=upload_headers)
-        if up_resp.status_code not in (200, 201):
-            return {
-                "error": "Failed to upload image",
-                "status": up_resp.status_code,
-                "detail": up_resp.text
-            }
-        return up_resp.json()
+    wp = get_wp_client()
+    up_resp = await wp.post(media_url, content=img_bytes, headers=upload_headers)
+    if up_resp.status_code not in (200, 201):
+        return {
+            "error": "Failed to upload image",
+            "status": up_resp.status_code,
+            "detail": up_resp.text
+        }
+    return up_resp.json()
     
 # -------------------------------------------------------------------
 # 2) List all WP media (with size details) using site-Basic Auth + App Password
@@ -240,95 +363,259 @@ async def wp_list_media():
     Returns list of media dicts.
     """
     media_url = f"{WC_BASE_URL}/wp-json/wp/v2/media?per_page=100"
-    auth      = (WP_USERNAME, WP_PASSWORD)
 
     media = []
     page  = 1
-    async with httpx.AsyncClient(timeout=20.0, verify=False, auth=auth) as wp:
-        while True:
-            resp = await wp.get(f"{media_url}&page={page}")
-            if resp.status_code != 200:
-                break
-            batch = resp.json()
-            if not batch:
-                break
-            media.extend(batch)
-            if len(batch) < 100:
-                break
-            page += 1
+    wp = get_wp_client()
+    while True:
+        resp = await wp.get(f"{media_url}&page={page}")
+        if resp.status_code != 200:
+            break
+        batch = resp.json()
+        if not batch:
+            break
+        media.extend(batch)
+        if len(batch) < 100:
+            break
+        page += 1
 
     return media
 
+# -------------------------------------------------------------------
+# 2b) Media index for a sync run: one paged listing instead of per-image lookups
+# -------------------------------------------------------------------
+
+_media_index: dict | None = None      # source_url -> (id, filesize)
+_media_by_size: dict | None = None    # filesize -> (id, source_url)
+_media_ids: set | None = None         # every media id in the index
+
+
+_MEDIA_FIELDS = "id,source_url,media_details"
+_MEDIA_INCLUDE_MAX = 300  # ids; past this one paged library listing is cheaper than include= lookups
+
+
+def _media_rows_to_index(rows: list) -> dict:
+    """{source_url: (media_id, filesize)} for WP media rows."""
+    return {
+        m["source_url"]: (m["id"], int((m.get("media_details") or {}).get("filesize") or 0))
+        for m in rows if m.get("source_url")
+    }
+
+
+async def get_wc_media_index(refresh: bool = False) -> dict:
+    """
+    Return {source_url: (media_id, filesize)} for the whole WP media library.
+    Fetched once (id/source_url/media_details only) and cached until reset_wc_media_index().
+    """
+    global _media_index, _media_by_size, _media_ids
+    if _media_index is not None and not refresh:
+        return _media_index
+
+    rows = await fetch_all_pages(get_wp_client(), "/wp-json/wp/v2/media", params={"_fields": _MEDIA_FIELDS})
+    index = _media_rows_to_index(rows)
+    by_size: dict = {}
+    for url, (mid, size) in index.items():
+        if size:
+            by_size.setdefault(size, (mid, url))
+
+    _media_index, _media_by_size = index, by_size
+    _media_ids = {mid for mid, _ in index.values()}
+    logger.info(f"[IMG] WP media index loaded: {len(index)} items")
+    return index
+
+
+async def get_wc_media_sizes(media_ids) -> dict:
+    """
+    {source_url: (media_id, filesize)} for the given WP media ids. A small set is looked up
+    with /wp/v2/media?include=<ids>; a large one (or an already-loaded index) uses the
+    per-run library index instead.
+    """
+    ids = sorted({int(i) for i in (media_ids or []) if i})
+    if not ids:
+        return {}
+    if _media_index is not None or len(ids) > _MEDIA_INCLUDE_MAX:
+        return await get_wc_media_index()
+    chunks = await asyncio.gather(*(
+        fetch_all_pages(
+            get_wp_client(),
+            "/wp-json/wp/v2/media",
+            params={"include": ",".join(map(str, ids[i:i + 100])), "_fields": _MEDIA_FIELDS},
+        )
+        for i in range(0, len(ids), 100)
+    ))
+    return _media_rows_to_index([m for rows in chunks for m in rows])
+
+
+def reset_wc_media_index() -> None:
+    """Drop the cached media index (call at the start of a sync run)."""
+    global _media_index, _media_by_size, _media_ids
+    _media_index = None
+    _media_by_size = None
+    _media_ids = None
+
+
+def _remember_media(media: dict, size: int) -> None:
+    if _media_index is not None and media.get("source_url"):
+        _media_index[media["source_url"]] = (media["id"], size)
+    if _media_by_size is not None and size:
+        _media_by_size.setdefault(size, (media["id"], media.get("source_url")))
+    if _media_ids is not None:
+        _media_ids.add(media["id"])
+
+
+async def _media_exists(media_id: int) -> bool:
+    """True when `media_id` is still in the WP library (per-run index, else one GET)."""
+    if _media_ids is not None:
+        return int(media_id) in _media_ids
+    try:
+        resp = await get_wp_client().get(f"/wp-json/wp/v2/media/{int(media_id)}", params={"_fields": "id"})
+    except Exception as e:
+        logger.debug(f"[IMG] Media {media_id} check failed: {e}")
+        return False
+    return resp.status_code == 200
+
+
+async def _same_content(url: str | None, digest: str) -> bool:
+    """True when the bytes at `url` hash to `digest` (guards a filesize-only match)."""
+    if not url:
+        return False
+    try:
+        resp = await get_client().get(url)
+    except Exception as e:
+        logger.debug(f"[IMG] Content check failed for {url}: {e}")
+        return False
+    return resp.status_code == 200 and hashlib.sha256(resp.content).hexdigest() == digest
+
 # -------------------------------------------------------------------
 # 3) Upload an arbitrary URL to WP media library (same auth pattern)
 # -------------------------------------------------------------------
 
+async def _wp_upload_bytes(img_bytes: bytes, filename: str, content_type: str) -> dict:
+    """Upload raw bytes to WP media (Basic auth). Returns the WP media dict."""
+    media_url = f"{WC_BASE_URL}/wp-json/wp/v2/media"
+    upload_headers = {
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "Content-Type": content_type,
+    }
+    wp = get_wp_client()
+    upload_resp = await wp.post(media_url, content=img_bytes, headers=upload_headers)
+    upload_resp.raise_for_status()
+    return upload_resp.json()
+
+
 async def wp_upload_image_from_url(url: str, filename: str):
     """
     Download a public URL then upload to WP media (Basic auth).
     Returns the new image's WP media dict.
     """
-    media_url = f"{WC_BASE_URL}/wp-json/wp/v2/media"
-    auth      = (WP_USERNAME, WP_PASSWORD)
-
     # 1) Download source
-    async with httpx.AsyncClient(timeout=20.0, verify=False) as down:
-        img_resp = await down.get(url)
-        if img_resp.status_code == 404:
-            logger.warning(f"[IMG] Source missing (404): {url}")
-            return None
-        img_resp.raise_for_status()
-        img_bytes    = img_resp.content
-        content_type = img_resp.headers.get("Content-Type", "application/octet-stream")
+    down = get_client()
+    img_resp = await down.get(url)
+    if img_resp.status_code == 404:
+        logger.warning(f"[IMG] Source missing (404): {url}")
+        return None
+    img_resp.raise_for_status()
+    img_bytes    = img_resp.content
+    content_type = img_resp.headers.get("Content-Type", "application/octet-stream")
 
     # 2) Upload to WP
-    upload_headers = {
-        "Content-Disposition": f'attachment; filename="{filename}"',
-        "Content-Type": content_type,
+    data = await _wp_upload_bytes(img_bytes, filename, content_type)
+    return {
+        "id":         data["id"],
+        "source_url": data["source_url"],
+        "size":       len(img_bytes),
     }
-    async with httpx.AsyncClient(timeout=20.0, verify=False, auth=auth) as wp:
-        upload_resp = await wp.post(media_url, content=img_bytes, headers=upload_headers)
-        upload_resp.raise_for_status()
-        data = upload_resp.json()
-        return {
-            "id":         data["id"],
-            "source_url": data["source_url"],
-            "size":       len(img_bytes),
-        }
+
+# -------------------------------------------------------------------
+# 4) Content-addressed media index: sha256(ERP bytes) -> WP media id
+# -------------------------------------------------------------------
+
+MEDIA_HASH_INDEX_PATH = os.path.join(settings.DATA_DIR, "wp_media_sha256.json")
+_media_hash_index: dict | None = None
+
+
+def _load_media_hash_index() -> dict:
+    global _media_hash_index
+    if _media_hash_index is None:
+        try:
+            with open(MEDIA_HASH_INDEX_PATH, "r", encoding="utf-8") as f:
+                _media_hash_index = json.load(f) or {}
+        except Exception:
+            _media_hash_index = {}
+    return _media_hash_index
+
+
+def _remember_media_hash(digest: str, media_id: int | None) -> None:
+    """Record (or, with media_id=None, forget) the WP media id for a content hash."""
+    index = _load_media_hash_index()
+    if media_id is None:
+        if index.pop(digest, None) is None:
+            return
+    else:
+        index[digest] = int(media_id)
+    try:
+        os.makedirs(os.path.dirname(MEDIA_HASH_INDEX_PATH), exist_ok=True)
+        tmp = MEDIA_HASH_INDEX_PATH + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(tmp, MEDIA_HASH_INDEX_PATH)
+    except Exception as e:
+        logger.warning(f"[IMG] Could not persist media hash index: {e}")
+
+
+_ERP_HOST = urlparse(settings.ERP_URL or "").netloc
+_ERP_AUTH_HEADER = {"Authorization": f"token {settings.ERP_API_KEY}:{settings.ERP_API_SECRET}"}
+
+
+def _erp_auth_headers_for(url: str) -> dict | None:
+    if _ERP_HOST and urlparse(url).netloc == _ERP_HOST:
+        return _ERP_AUTH_HEADER
+    return None
 
 
 async def ensure_wp_image_uploaded(erp_img_url, filename, size_hint=None):
     """
-    Checks WP media for an image matching ERPNext's (by size or SHA256 hash).
-    If not found, uploads it. Returns WP media ID.
+    Returns the WP media ID for an ERPNext image, uploading it only when needed.
+    Match order: SHA256 of the ERP bytes (local index, id confirmed still in WP) →
+    WP media of the same filesize whose bytes hash the same → upload.
+    The ERP image is downloaded once; the same bytes are hashed and uploaded.
+    Only content-verified or freshly uploaded ids are recorded under the hash.
     """
     if not filename:
         filename = os.path.basename(urlparse(erp_img_url).path) or "image.jpg"
-        
-    media = await wp_list_media()
+
+    # Download ERPNext image (token auth for ERP-hosted/private files)
+    img_resp = await get_client().get(erp_img_url, headers=_erp_auth_headers_for(erp_img_url))
+    if img_resp.status_code == 404:
+        logger.warning(f"[IMG] Source missing (404): {erp_img_url}")
+        return None
+    img_resp.raise_for_status()
+    img_bytes = img_resp.content
+    img_size = len(img_bytes)
+    digest = hashlib.sha256(img_bytes).hexdigest()
+
+    cached_id = _load_media_hash_index().get(digest)
+    if cached_id:
+        if await _media_exists(cached_id):
+            return cached_id
+        logger.info(f"[IMG] Media {cached_id} for {filename} is gone from WP; dropping hash entry")
+        _remember_media_hash(digest, None)
+
+    await get_wc_media_index()
     found_id = None
+    candidate = _media_by_size.get(img_size)
+    if candidate and await _same_content(candidate[1], digest):
+        found_id = candidate[0]
 
-    # Download ERPNext image
-    async with httpx.AsyncClient(timeout=20.0, verify=False) as client:
-        img_resp = await client.get(erp_img_url)
-        img_bytes = img_resp.content
-        img_size = len(img_bytes)
-        _ = hashlib.sha256(img_bytes).hexdigest()
-        
-    for m in media:
-        m_size = m.get("media_details", {}).get("filesize")
-        if m_size and int(m_size) == img_size:
-            found_id = m["id"]
-            break
+    if not found_id:
+        content_type = img_resp.headers.get("Content-Type", "application/octet-stream")
+        data = await _wp_upload_bytes(img_bytes, filename, content_type)
+        found_id = data.get("id")
+        _remember_media(data, img_size)
 
     if found_id:
-        return found_id
-    # Not found, upload
-    result = await wp_upload_image_from_url(erp_img_url, filename)
-    if result and "id" in result:
-        return result["id"]
-    else:
-        return None
+        _remember_media_hash(digest, found_id)
+    return found_id
 
 
 async def set_wc_variant_image(parent_id, variant_id, media_id):
@@ -338,13 +625,13 @@ async def set_wc_variant_image(parent_id, variant_id, media_id):
     url = f"{WC_BASE_URL}/wp-json/wc/v3/products/{parent_id}/variations/{variant_id}"
     auth = (WC_API_KEY, WC_API_SECRET)
     payload = {"image": {"id": media_id}}
-    async with httpx.AsyncClient(timeout=15.0, verify=False) as client:
-        try:
-            resp = await client.put(url, auth=auth, json=payload)
-            resp.raise_for_status()
-            return resp.json()
-        except Exception as e:
-            return {"error": str(e)}
+    client = get_client()
+    try:
+        resp = await client.put(url, auth=auth, json=payload)
+        resp.raise_for_status()
+        return resp.json()
+    except Exception as e:
+        return {"error": str(e)}
 
 
 async def get_wc_variations(parent_id):
@@ -354,13 +641,13 @@ async def get_wc_variations(parent_id):
     """
     url = f"{WC_BASE_URL}/wp-json/wc/v3/products/{parent_id}/variations?per_page=100"
     auth = (WC_API_KEY, WC_API_SECRET)
-    async with httpx.AsyncClient(timeout=15.0, verify=False) as client:
-        try:
-            resp = await client.get(url, auth=auth)
-            resp.raise_for_status()
-            return resp.json()
-        except Exception as e:
-            return []
+    client = get_client()
+    try:
+        resp = await client.get(url, auth=auth)
+        resp.raise_for_status()
+        return resp.json()
+    except Exception as e:
+        return []
 
 # =========================
 # Attribute utilities
@@ -391,27 +678,13 @@ async def get_wc_attributes():
     Fetch all global product attributes (paginated).
     Endpoint: /wp-json/wc/v3/products/attributes
     """
+    url = f"{WC_BASE_URL}/wp-json/wc/v3/products/attributes"
     auth = (WC_API_KEY, WC_API_SECRET)
-    all_attrs = []
-    page = 1
-    while True:
-        url = f"{WC_BASE_URL}/wp-json/wc/v3/products/attributes?per_page=100&page={page}"
-        async with httpx.AsyncClient(timeout=20.0, verify=False) as client:
-            try:
-                resp = await client.get(url, auth=auth)
-            except Exception as e:
-                logger.error(f"[WC] get_wc_attributes error: {e}")
-                break
-        if resp.status_code != 200:
-            break
-        batch = resp.json()
-        if not batch:
-            break
-        all_attrs.extend(batch)
-        if len(batch) < 100:
-            break
-        page += 1
-    return all_attrs
+    try:
+        return await fetch_all_pages(get_client(), url, auth=auth)
+    except Exception as e:
+        logger.error(f"[WC] get_wc_attributes error: {e}")
+        return []
 
 
 async def create_wc_attribute(name: str, slug: str | None = None,
@@ -431,13 +704,14 @@ async def create_wc_attribute(name: str, slug: str | None = None,
         "order_by": order_by,
         "has_archives": has_archives,
     }
-    async with httpx.AsyncClient(timeout=20.0, verify=False) as client:
-        try:
-            resp = await client.post(url, auth=auth, json=payload)
-            return resp.json() if resp.content else None
-        except Exception as e:
-            logger.error(f"[WC] create_wc_attribute error: {e}")
-            return {"error": str(e)}
+    client = get_client()
+    try:
+        resp = await client.post(url, auth=auth, json=payload)
+        invalidate("get_attribute_id_map")
+        return resp.json() if resp.content else None
+    except Exception as e:
+        logger.error(f"[WC] create_wc_attribute error: {e}")
+        return {"error": str(e)}
 
 
 async def ensure_wc_global_attribute(name: str, slug: str | None = None):
@@ -466,27 +740,13 @@ async def get_wc_attribute_terms(attribute_id: int):
     List all terms for a given global attribute (paginated).
     Endpoint: /wp-json/wc/v3/products/attributes/{id}/terms
     """
+    url = f"{WC_BASE_URL}/wp-json/wc/v3/products/attributes/{attribute_id}/terms"
     auth = (WC_API_KEY, WC_API_SECRET)
-    terms = []
-    page = 1
-    while True:
-        url = f"{WC_BASE_URL}/wp-json/wc/v3/products/attributes/{attribute_id}/terms?per_page=100&page={page}"
-        async with httpx.AsyncClient(timeout=20.0, verify=False) as client:
-            try:
-                resp = await client.get(url, auth=auth)
-            except Exception as e:
-                logger.error(f"[WC] get_wc_attribute_terms error: {e}")
-                break
-        if resp.status_code != 200:
-            break
-        batch = resp.json()
-        if not batch:
-            break
-        terms.extend(batch)
-        if len(batch) < 100:
-            break
-        page += 1
-    return terms
+    try:
+        return await fetch_all_pages(get_client(), url, auth=auth)
+    except Exception as e:
+        logger.error(f"[WC] get_wc_attribute_terms error: {e}")
+        return []
 
 
 async def create_wc_attribute_term(attribute_id: int, name: str, slug: str | None = None):
@@ -497,13 +757,14 @@ async def create_wc_attribute_term(attribute_id: int, name: str, slug: str | Non
     url = f"{WC_BASE_URL}/wp-json/wc/v3/products/attributes/{attribute_id}/terms"
     auth = (WC_API_KEY, WC_API_SECRET)
     payload = {"name": name, "slug": slug or _slugify(name)}
-    async with httpx.AsyncClient(timeout=20.0, verify=False) as client:
-        try:
-            resp = await client.post(url, auth=auth, json=payload)
-            return resp.json() if resp.content else None
-        except Exception as e:
-            logger.error(f"[WC] create_wc_attribute_term error: {e}")
-            return {"error": str(e)}
+    client = get_client()
+    try:
+        resp = await client.post(url, auth=auth, json=payload)
+        invalidate("get_attribute_term_id_map")
+        return resp.json() if resp.content else None
+    except Exception as e:
+        logger.error(f"[WC] create_wc_attribute_term error: {e}")
+        return {"error": str(e)}
 
 
 async def ensure_wc_attribute_terms(attribute_id: int, values: list[str] | set[str]):
@@ -610,10 +871,10 @@ async def fetch_order(order_id: int) -> Dict[str, Any]:
     params = {"consumer_key": key, "consumer_secret": secret}
     timeout = httpx.Timeout(30.0, connect=10.0, read=30.0)
 
-    async with httpx.AsyncClient(timeout=timeout, verify=False) as client:
-        r = await client.get(url, params=params)
-        r.raise_for_status()
-        return r.json()
+    client = get_client()
+    r = await client.get(url, params=params, timeout=timeout)
+    r.raise_for_status()
+    return r.json()
 
 
 async def fetch_order_refunds(order_id: int) -> List[Dict[str, Any]]:
@@ -630,11 +891,11 @@ async def fetch_order_refunds(order_id: int) -> List[Dict[str, Any]]:
     params = {"consumer_key": key, "consumer_secret": secret, "per_page": 100}
     timeout = httpx.Timeout(30.0, connect=10.0, read=30.0)
 
-    async with httpx.AsyncClient(timeout=timeout, verify=False) as client:
-        r = await client.get(url, params=params)
-        # Woo returns [] if none; 200 OK
-        if r.status_code == 404:
-            return []
-        r.raise_for_status()
-        data = r.json()
-        return data if isinstance(data, list) else []
+    client = get_client()
+    r = await client.get(url, params=params, timeout=timeout)
+    # Woo returns [] if none; 200 OK
+    if r.status_code == 404:
+        return []
+    r.raise_for_status()
+    data = r.json()
+    return data if isinstance(data, list) else []